@@ -0,0 +1,69 @@
+"""Benchmark payload hashing with a cold and a warm hash cache.
+
+Writes ``--files`` files totalling ``--size-mb`` MB to a temporary
+directory, then hashes them with :func:`hash_files` three times: on one
+thread without a cache, on the thread pool while filling a fresh SQLite
+cache, and again from that cache (no file is read).
+
+Usage:
+  python benchmarks/bench_hash.py [--size-mb 2048] [--files 64] [--algorithm sha256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ypack.converters.payload_hash import HASH_ALGORITHMS, HashCache, hash_files  # noqa: E402
+
+_BLOCK = 1 << 20
+
+
+def make_files(root: str, n_files: int, size_mb: int) -> list:
+    block = os.urandom(_BLOCK)
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(root, f"file{i}.bin")
+        with open(path, "wb") as fh:
+            for _ in range(max(1, size_mb // n_files)):
+                fh.write(block)
+        paths.append(path)
+    return paths
+
+
+def timed(label: str, total_mb: float, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18}: {elapsed:.3f}s ({total_mb / elapsed:,.0f} MB/s)")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--algorithm", choices=HASH_ALGORITHMS, default="sha256")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_files(tmp, args.files, args.size_mb)
+        total = sum(os.path.getsize(p) for p in paths) / 1e6
+        db = os.path.join(tmp, "hashes.db")
+        single = timed("one thread", total, lambda: hash_files(paths, args.algorithm, threads=1))
+        with HashCache(db) as cache:
+            cold = timed("cold cache", total, lambda: hash_files(paths, args.algorithm, args.threads, cache))
+        with HashCache(db) as cache:
+            warm = timed("warm cache", total, lambda: hash_files(paths, args.algorithm, args.threads, cache))
+            print(f"cache hits        : {cache.hits}/{len(paths)}")
+        assert single == cold == warm
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark parsing and emitting very wide and very deep package trees.
+
+Builds a ``packages`` mapping with ``--components`` leaf components
+hanging off a chain of ``--depth`` nested groups (spread evenly over the
+levels), then times :meth:`PackageConfig.from_dict`, the package index
+and :meth:`YamlToNsisConverter.convert`.  ``--depth`` beyond the
+interpreter's recursion limit is supported.
+
+Usage:
+  python benchmarks/bench_packages.py [--components 10000] [--depth 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ypack.config import PackageConfig  # noqa: E402
+from ypack.converters import YamlToNsisConverter  # noqa: E402
+
+
+def build_data(n_components: int, depth: int) -> Dict[str, Any]:
+    per_level = max(1, n_components // depth)
+    packages: Dict[str, Any] = {}
+    level = packages
+    made = 0
+    for d in range(depth):
+        count = per_level if d < depth - 1 else n_components - made
+        for i in range(max(0, count)):
+            level[f"C{d}_{i}"] = {
+                "sources": [f"data/l{d}/c{i}.dll"],
+                "destination": f"$INSTDIR\\l{d}",
+                "optional": i % 3 == 0,
+                "default": i % 2 == 0,
+            }
+        made += max(0, count)
+        if d < depth - 1:
+            group: Dict[str, Any] = {"children": {}}
+            level[f"Level{d + 1}"] = group
+            level = group["children"]
+    return {
+        "app": {"name": "Bench", "version": "1.0", "publisher": "Bench"},
+        "install": {},
+        "files": [],
+        "packages": packages,
+    }
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<12}: {time.perf_counter() - start:.3f}s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--components", type=int, default=10_000)
+    parser.add_argument("--depth", type=int, default=50)
+    args = parser.parse_args()
+
+    data = build_data(args.components, args.depth)
+    print(f"{args.components} components, depth {args.depth} (recursion limit {sys.getrecursionlimit()})")
+
+    cfg = timed("parse", lambda: PackageConfig.from_dict(data))
+    conv = YamlToNsisConverter(cfg)
+    index = timed("index", lambda: conv.ctx.packages)
+    script = timed("convert", conv.convert)
+
+    # Peak allocations of a fresh conversion (timed runs above stay
+    # free of tracemalloc overhead).
+    tracemalloc.start()
+    YamlToNsisConverter(cfg).convert()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"packages    : {len(index)} ({len(index.leaves)} sections)")
+    print(f"script size : {len(script.encode('utf-8')) / 1e6:.1f} MB")
+    print(f"peak memory : {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark serial vs. parallel NSIS generation on a synthetic payload.
+
+Creates a temporary tree with ``--files`` real files spread over
+``--packages`` components, lists every file as an explicit package
+source, and times :meth:`YamlToNsisConverter.convert` with ``jobs=1``
+and ``jobs=N``.  The outputs are compared byte for byte.
+
+Usage:
+  python benchmarks/bench_parallel.py [--files 100000] [--packages 20] [--jobs 0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ypack.config import PackageConfig  # noqa: E402
+from ypack.converters import YamlToNsisConverter  # noqa: E402
+from ypack.converters.parallel import resolve_jobs  # noqa: E402
+
+
+def build_config(root: str, n_files: int, n_packages: int) -> PackageConfig:
+    packages = {}
+    per_pkg = max(1, n_files // n_packages)
+    for p in range(n_packages):
+        pkg_dir = os.path.join(root, f"pkg{p}")
+        os.makedirs(pkg_dir)
+        sources = []
+        for i in range(per_pkg):
+            name = f"file{i:06d}.dat"
+            with open(os.path.join(pkg_dir, name), "wb"):
+                pass
+            sources.append({"source": f"pkg{p}/{name}", "destination": f"$INSTDIR\\pkg{p}"})
+        packages[f"Component{p}"] = {"sources": sources, "optional": p > 0}
+    cfg = PackageConfig.from_dict({
+        "app": {"name": "Bench", "version": "1.0", "publisher": "Bench"},
+        "install": {},
+        "files": [],
+        "packages": packages,
+    })
+    cfg._config_dir = root
+    return cfg
+
+
+def timed(cfg: PackageConfig, jobs: int) -> tuple:
+    start = time.perf_counter()
+    script = YamlToNsisConverter(cfg, jobs=jobs).convert()
+    return time.perf_counter() - start, script
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--packages", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=0, help="parallel workers (0 = one per CPU)")
+    args = parser.parse_args()
+    jobs = resolve_jobs(args.jobs)
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Creating {args.files} files in {args.packages} packages …")
+        cfg = build_config(root, args.files, args.packages)
+
+        timed(cfg, 1)  # warm the OS stat cache so both runs see the same FS state
+        serial_s, serial = timed(cfg, 1)
+        parallel_s, parallel = timed(cfg, jobs)
+
+    assert serial == parallel, "parallel output differs from serial output"
+    print(f"script size : {len(serial.encode('utf-8')) / 1e6:.1f} MB")
+    print(f"serial      : {serial_s:.2f}s")
+    print(f"jobs={jobs:<6} : {parallel_s:.2f}s  (speed-up x{serial_s / parallel_s:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 """Run SigVNA conversion: read tmp/sigvna_installer.yaml, validate icon/license,
-split app_deploy into packages, generate NSIS and inject components (app + PXI).
+split app_deploy into packages, generate NSIS and inject components (app + PXI)
+through the converter's hook points.
 
 Usage:
   python examples/run_sigvna_converter.py [-c tmp/sigvna_installer.yaml] [-v]
@@ -46,17 +47,14 @@ def split_into_packages(src_dir: Path, out_root: Path):
     return app_pkg, pxi_pkg
 
 
-def build_package_config(cfg: dict, app_pkg: Path, license_path: str = None):
+def build_package_config(cfg: dict, license_path: str = None):
     # Normalize icon/license to exist
     app = cfg.get('app', {})
     install = cfg.get('install', {})
 
+    # Application payload is installed by the injected component sections,
+    # so only the license goes into the main install section.
     files = []
-    files.append({
-        'source': str(app_pkg / '*'),
-        'destination': '$INSTDIR',
-        'recursive': True
-    })
     if license_path:
         # Include license into installer files so MUI license page can use it
         files.append({
@@ -75,80 +73,36 @@ def build_package_config(cfg: dict, app_pkg: Path, license_path: str = None):
     return PackageConfig.from_dict(package_dict)
 
 
-def insert_components_and_sections(base_nsi: Path, out_nsi: Path, app_pkg: Path, pxi_pkg: Path):
-    with open(base_nsi, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    # Insert components page before directory page
-    for idx, line in enumerate(lines):
-        if '!insertmacro MUI_PAGE_DIRECTORY' in line:
-            lines.insert(idx, '!insertmacro MUI_PAGE_COMPONENTS\n')
-            break
-
-    # Remove File lines inside the generated Section "Install" to avoid duplication
-    out_lines = []
-    in_install_section = False
-    for line in lines:
-        if line.strip().startswith('Section "Install"'):
-            in_install_section = True
-            out_lines.append(line)
-            continue
-        if in_install_section:
-            if line.strip().startswith('SectionEnd'):
-                in_install_section = False
-                out_lines.append(line)
-            else:
-                if line.strip().startswith('File '):
-                    continue
-                else:
-                    out_lines.append(line)
-        else:
-            out_lines.append(line)
-
-    # Prepare injected component sections
-    injection = []
-    injection.append('\n; --- Component Sections (injected by examples/run_sigvna_converter.py) ---\n')
-    injection.append('Section "App" SEC_APP\n')
-    injection.append('  SetOutPath $INSTDIR\n')
-    injection.append(f'  File /r "{os.path.join(str(Path('app_installer'), 'packages', 'app', '*'))}"\n')
-    injection.append('SectionEnd\n\n')
-    injection.append('Section "PXI Driver" SEC_PXI\n')
-    injection.append('  SetOutPath "$INSTDIR\\drivers\\PXI"\n')
-    injection.append(f'  File /r "{os.path.join(str(Path('app_installer'), 'packages', 'PXI_driver', '*'))}"\n')
-    injection.append('SectionEnd\n\n')
-
-    # Insert before Uninstaller section
-    final_lines = []
-    inserted = False
-    for line in out_lines:
-        if (not inserted) and line.strip().startswith('Section "Uninstall"'):
-            final_lines.extend(injection)
-            inserted = True
-        final_lines.append(line)
-
-    # Add PXI cleanup in Uninstaller before SectionEnd
-    result = []
-    in_uninstall = False
-    for line in final_lines:
-        if line.strip().startswith('Section "Uninstall"'):
-            in_uninstall = True
-            result.append(line)
-            continue
-        if in_uninstall:
-            if line.strip().startswith('SectionEnd'):
-                result.append('  ; Remove PXI driver files\n')
-                result.append('  RMDir /r "$INSTDIR\\drivers\\PXI"\n\n')
-                in_uninstall = False
-                result.append(line)
-            else:
-                result.append(line)
-        else:
-            result.append(line)
-
-    with open(out_nsi, 'w', encoding='utf-8') as f:
-        f.writelines(result)
-
-    print(f'Wrote final NSIS script to {out_nsi}')
+def add_component_hooks(converter: YamlToNsisConverter, app_pkg: Path, pxi_pkg: Path):
+    """Register the App / PXI components through the converter's hook points."""
+    # Components page before the directory page
+    converter.add_hook('pages', '!insertmacro MUI_PAGE_COMPONENTS')
+
+    # Component sections before the uninstaller section; paths are made
+    # relative to the output directory when the script is written.
+    def component_sections(ctx):
+        return [
+            '; --- Component Sections (injected by examples/run_sigvna_converter.py) ---',
+            'Section "App" SEC_APP',
+            '  SetOutPath $INSTDIR',
+            f'  File /r "{ctx.relative_to_output(str(app_pkg.resolve() / "*"))}"',
+            'SectionEnd',
+            '',
+            'Section "PXI Driver" SEC_PXI',
+            '  SetOutPath "$INSTDIR\\drivers\\PXI"',
+            f'  File /r "{ctx.relative_to_output(str(pxi_pkg.resolve() / "*"))}"',
+            'SectionEnd',
+            '',
+        ]
+
+    converter.add_hook('before:uninstaller_section', component_sections)
+
+    # PXI cleanup at the end of the uninstaller section
+    converter.add_hook('uninstall', [
+        '  ; Remove PXI driver files',
+        '  RMDir /r "$INSTDIR\\drivers\\PXI"',
+        '',
+    ])
 
 
 def main():
@@ -214,16 +168,14 @@ def main():
 
     # Build PackageConfig
     license_path = cfg['app'].get('license') if cfg['app'].get('license') else None
-    package_config = build_package_config(cfg, app_pkg, license_path)
+    package_config = build_package_config(cfg, license_path)
 
-    # Convert and save base NSIS
+    # Convert with the components injected during emission
     converter = YamlToNsisConverter(package_config)
-    base_nsi = Path(args.work) / 'installer_base.nsi'
-    converter.save(str(base_nsi))
-    print(f'Generated base NSIS: {base_nsi}')
-
-    # Inject components and produce final NSIS
-    insert_components_and_sections(base_nsi, Path(args.output), app_pkg, pxi_pkg)
+    add_component_hooks(converter, app_pkg, pxi_pkg)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    converter.save(args.output)
+    print(f'Wrote final NSIS script to {args.output}')
     print('Done.')
 
 
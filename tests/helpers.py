@@ -0,0 +1,63 @@
+"""Shared helpers for tests that build from an in-memory filesystem."""
+
+from __future__ import annotations
+
+import copy
+import os
+from typing import Any, Dict, Type, Union
+
+from ypack.config import PackageConfig
+from ypack.converters.context import BuildContext, SharedBuild
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.fs import FileSystem, MemoryFileSystem
+
+#: Config directory of the in-memory builds (no such directory on disk).
+ROOT = os.path.abspath(os.sep + "build")
+
+
+def build_path(rel: str) -> str:
+    """Absolute path of *rel* (``/``-separated) below :data:`ROOT`."""
+    return os.path.join(ROOT, *rel.split("/"))
+
+
+def memory_fs(files: Dict[str, bytes]) -> MemoryFileSystem:
+    """A filesystem holding *files*, keyed by path relative to :data:`ROOT`."""
+    return MemoryFileSystem({build_path(rel): data for rel, data in files.items()})
+
+
+def app_config(name: str, **sections: Any) -> Dict[str, Any]:
+    """Configuration data for app *name* with the given top-level *sections*."""
+    data: Dict[str, Any] = {"app": {"name": name, "version": "1.0", "publisher": "Pub"}, "install": {}}
+    data.update(sections)
+    return data
+
+
+def build_config(data: Dict[str, Any], **overrides: Any) -> PackageConfig:
+    """Parse *data* with top-level *overrides*, rooted at :data:`ROOT`."""
+    data = copy.deepcopy(data)
+    data.update(overrides)
+    cfg = PackageConfig.from_dict(data)
+    cfg._config_dir = ROOT
+    return cfg
+
+
+class MemoryBuild:
+    """A configuration and the in-memory payload it is built from.
+
+    *payload* is either a filesystem or the contents for :func:`memory_fs`.
+    Every :meth:`context` / :meth:`convert` starts a new
+    :class:`SharedBuild`, so files added to :attr:`fs` in between are seen.
+    """
+
+    def __init__(self, data: Dict[str, Any], payload: Union[FileSystem, Dict[str, bytes]], **overrides: Any) -> None:
+        self.config = build_config(data, **overrides)
+        self.fs = payload if isinstance(payload, FileSystem) else memory_fs(payload)
+
+    def shared(self) -> SharedBuild:
+        return SharedBuild(self.config, fs=self.fs)
+
+    def context(self, **options: Any) -> BuildContext:
+        return BuildContext(self.config, shared=self.shared(), **options)
+
+    def convert(self, converter_cls: Type[Any] = YamlToNsisConverter, **options: Any) -> str:
+        return converter_cls(self.config, shared=self.shared(), **options).convert()
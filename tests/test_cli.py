@@ -8,6 +8,7 @@ import textwrap
 import pytest
 
 from ypack.cli import main
+from ypack.converters import CONVERTER_REGISTRY, BaseConverter
 
 
 @pytest.fixture()
@@ -54,6 +55,14 @@ class TestConvertSubcommand:
         assert "Loading" in captured.out or "Converting" in captured.out or "NSIS" in captured.out
 
 
+    def test_compact_reports_size(self, yaml_file, tmp_path, capsys):
+        out = str(tmp_path / "c.nsi")
+        main(["convert", yaml_file, "-o", out, "--compact"])
+        assert "Compact output:" in capsys.readouterr().out
+        content = (tmp_path / "c.nsi").read_text(encoding="utf-8-sig")
+        assert "\n;" not in content and not content.startswith(";")
+
+
 class TestFormatOption:
     def test_default_format_nsis(self, yaml_file, tmp_path):
         out = str(tmp_path / "out.nsi")
@@ -70,6 +79,92 @@ class TestFormatOption:
         with pytest.raises(SystemExit):
             main(["convert", yaml_file, "-f", "unknown"])
 
+    def test_unknown_format_in_list_exits(self, yaml_file):
+        with pytest.raises(SystemExit):
+            main(["convert", yaml_file, "-f", "nsis,unknown"])
+
+
+class _InnoStub(BaseConverter):
+    """Minimal second backend used to exercise multi-format builds."""
+
+    tool_name = "inno"
+    output_extension = ".iss"
+    instances: list = []
+
+    def __init__(self, config, raw_config=None, shared=None):
+        super().__init__(config, raw_config, shared)
+        _InnoStub.instances.append(self)
+
+    def convert(self):
+        return f"; {self.ctx.resolve('${app.name}')} {self.ctx.resolve('$INSTDIR')}\n"
+
+    def save(self, output_path):
+        self.packages = self.ctx.packages
+        with open(output_path, "w", encoding="utf-8") as fh:
+            fh.write(self.convert())
+
+
+class TestMultiFormat:
+    @pytest.fixture(autouse=True)
+    def _register_stub(self, monkeypatch):
+        _InnoStub.instances = []
+        monkeypatch.setitem(CONVERTER_REGISTRY, "inno", _InnoStub)
+
+    def test_writes_one_script_per_format(self, yaml_file, tmp_path, capsys):
+        out = str(tmp_path / "setup.nsi")
+        main(["convert", yaml_file, "-f", "nsis,inno", "-o", out])
+        assert "CLIApp" in (tmp_path / "setup.nsi").read_text(encoding="utf-8")
+        assert (tmp_path / "setup.iss").read_text(encoding="utf-8") == "; CLIApp {app}\n"
+        stdout = capsys.readouterr().out
+        assert "Generated NSIS script" in stdout and "Generated INNO script" in stdout
+
+    def test_parses_config_once_and_shares_state(self, yaml_file, tmp_path, monkeypatch):
+        from ypack.config import PackageConfig
+        from ypack.converters import YamlToNsisConverter
+
+        loads = []
+        original = PackageConfig.from_yaml.__func__
+        monkeypatch.setattr(
+            PackageConfig, "from_yaml",
+            classmethod(lambda cls, path: loads.append(path) or original(cls, path)),
+        )
+        nsis = []
+        monkeypatch.setattr(
+            YamlToNsisConverter, "save",
+            lambda self, path: nsis.append(self),
+        )
+        main(["convert", yaml_file, "-f", "nsis,inno,nsis", "-o", str(tmp_path / "x")])
+        assert len(loads) == 1
+        assert len(nsis) == 1 and len(_InnoStub.instances) == 1
+        (stub,) = _InnoStub.instances
+        assert stub.ctx.shared is nsis[0].ctx.shared
+        assert stub.config is nsis[0].config
+        assert stub.packages is nsis[0].ctx.packages
+
+    def test_creates_missing_output_directory(self, yaml_file, tmp_path):
+        out = tmp_path / "new" / "sub" / "setup.nsi"
+        main(["convert", yaml_file, "-f", "nsis,wix,inno", "-o", str(out)])
+        assert "CLIApp" in out.read_text(encoding="utf-8")
+        assert "CLIApp" in (out.parent / "setup.wxs").read_text(encoding="utf-8")
+        assert (out.parent / "setup.iss").exists()
+
+    def test_nsis_options_apply_to_nsis_only(self, yaml_file, tmp_path, capsys):
+        main(["convert", yaml_file, "-f", "inno,nsis", "--compact", "-o", str(tmp_path / "x.nsi")])
+        captured = capsys.readouterr()
+        assert "Compact output:" in captured.out
+        assert "Warning" not in captured.err
+        assert "; CLIApp" in (tmp_path / "x.iss").read_text(encoding="utf-8")
+
+    def test_pipe_rejects_several_formats(self, yaml_file):
+        with pytest.raises(SystemExit):
+            main(["convert", yaml_file, "-f", "nsis,inno", "--pipe"])
+
+    def test_dry_run_prints_every_script(self, yaml_file, capsys):
+        main(["convert", yaml_file, "-f", "nsis,inno", "--dry-run"])
+        captured = capsys.readouterr()
+        assert "Unicode true" in captured.out and "; CLIApp {app}" in captured.out
+        assert "==> NSIS <==" in captured.err and "==> INNO <==" in captured.err
+
 
 class TestInitSubcommand:
     def test_creates_template(self, tmp_path):
@@ -126,3 +221,115 @@ class TestBuildInstallerName:
         main(["convert", yaml_file, "-o", out, "--build", "--installer-name", "MySetup-2.0.exe"])
         captured = capsys.readouterr()
         assert "Built installer: MySetup-2.0.exe" in captured.out
+
+
+class TestPipeBuild:
+    def test_pipe_streams_script_without_file(self, yaml_file, tmp_path, monkeypatch, capsys):
+        import io
+
+        calls = {}
+
+        class _Sink(io.BytesIO):
+            def close(self):
+                calls["script"] = self.getvalue().decode("utf-8")
+                super().close()
+
+        class FakePopen:
+            def __init__(self, cmd, stdin, stdout, stderr, cwd):
+                calls["cmd"] = cmd
+                calls["cwd"] = cwd
+                self.stdin = _Sink()
+                self.stdout = io.BytesIO(b"")
+                self.stderr = io.BytesIO(b"")
+
+            def wait(self):
+                return 0
+
+        monkeypatch.setattr("subprocess.Popen", FakePopen)
+
+        main(["convert", yaml_file, "--pipe"])
+        assert calls["cmd"][-1] == "-"
+        assert calls["cwd"] == str(tmp_path)
+        assert "CLIApp" in calls["script"]
+        assert not os.path.exists(tmp_path / "installer.nsi")
+        assert "Built installer: CLIApp-1.0-Setup.exe" in capsys.readouterr().out
+
+    def test_pipe_runs_in_the_output_directory(self, yaml_file, tmp_path, monkeypatch):
+        import io
+
+        calls = {}
+
+        class _Sink(io.BytesIO):
+            def close(self):
+                calls["script"] = self.getvalue().decode("utf-8")
+                super().close()
+
+        class FakePopen:
+            def __init__(self, cmd, stdin, stdout, stderr, cwd):
+                calls["cwd"] = cwd
+                self.stdin = _Sink()
+                self.stdout = io.BytesIO(b"")
+                self.stderr = io.BytesIO(b"")
+
+            def wait(self):
+                return 0
+
+        monkeypatch.setattr("subprocess.Popen", FakePopen)
+        (tmp_path / "app.exe").write_bytes(b"MZ")
+        (tmp_path / "out").mkdir()
+
+        main(["convert", yaml_file, "--pipe", "-o", str(tmp_path / "out" / "setup.nsi")])
+        assert calls["cwd"] == str(tmp_path / "out")
+        assert 'File "..\\app.exe"' in calls["script"]
+        assert not os.path.exists(tmp_path / "out" / "setup.nsi")
+
+    def test_pipe_saves_payload_index(self, yaml_file, tmp_path, monkeypatch):
+        import io
+
+        class FakePopen:
+            def __init__(self, cmd, stdin, stdout, stderr, cwd):
+                self.stdin = io.BytesIO()
+                self.stdout = io.BytesIO(b"")
+                self.stderr = io.BytesIO(b"")
+
+            def wait(self):
+                return 0
+
+        monkeypatch.setattr("subprocess.Popen", FakePopen)
+        (tmp_path / "app.exe").write_bytes(b"MZ")
+        index = tmp_path / "payload.idx"
+
+        main(["convert", yaml_file, "--pipe", "--payload-index", str(index)])
+        assert index.exists()
+
+    def test_pipe_saves_hash_cache(self, tmp_path, monkeypatch):
+        import io
+        import sqlite3
+
+        class FakePopen:
+            def __init__(self, cmd, stdin, stdout, stderr, cwd):
+                self.stdin = io.BytesIO()
+                self.stdout = io.BytesIO(b"")
+                self.stderr = io.BytesIO(b"")
+
+            def wait(self):
+                return 0
+
+        monkeypatch.setattr("subprocess.Popen", FakePopen)
+        for rel in ("bin/a.dll", "lib/a.dll"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_bytes(b"same" * 100)
+        cfg = tmp_path / "installer.yaml"
+        cfg.write_text(
+            "app:\n  name: D\n  version: '1'\ninstall: {}\nfiles:\n"
+            "  - source: bin/*\n  - source: lib/*\n    destination: $INSTDIR\\lib\n",
+            encoding="utf-8",
+        )
+        db = tmp_path / "h.db"
+
+        main(["convert", str(cfg), "--pipe", "--dedupe", "--hash-cache", str(db)])
+        conn = sqlite3.connect(str(db))
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0] == 2
+        finally:
+            conn.close()
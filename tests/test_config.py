@@ -13,6 +13,7 @@ from ypack.config import (
     EnvVarEntry,
     FileAssociation,
     FileEntry,
+    FilterConfig,
     InstallConfig,
     LoggingConfig,
     PackageConfig,
@@ -21,6 +22,7 @@ from ypack.config import (
     SigningConfig,
     SystemRequirements,
     UpdateConfig,
+    parse_size,
 )
 
 
@@ -63,6 +65,22 @@ class TestFileEntry:
         fe = FileEntry.from_dict({"source": "f.bin", "download_url": "https://x.com/f.bin"})
         assert fe.is_remote
 
+    def test_filters(self):
+        fe = FileEntry.from_dict({"source": "bin/**", "exclude": "*.pdb", "include": ["*.dll"], "max_size": "2MB"})
+        assert fe.filters == FilterConfig(exclude=["*.pdb"], include=["*.dll"], max_size=2 << 20)
+        assert FileEntry.from_dict("a.exe").filters == FilterConfig()
+
+    @pytest.mark.parametrize("value, expected", [
+        (1024, 1024), ("512", 512), ("512K", 512 << 10), ("10MB", 10 << 20), ("1.5 GiB", 3 << 29),
+    ])
+    def test_parse_size(self, value, expected):
+        assert parse_size(value) == expected
+
+    @pytest.mark.parametrize("value", ["ten", "5 PB", True])
+    def test_parse_size_rejects(self, value):
+        with pytest.raises(ValueError, match="Invalid size"):
+            parse_size(value)
+
 
 # -----------------------------------------------------------------------
 # InstallConfig (depends on FileAssociation, SystemRequirements)
@@ -19,7 +19,9 @@ from ypack.config import (
     SystemRequirements,
     UpdateConfig,
 )
+from ypack.converters.context import SharedBuild
 from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.fs import MemoryFileSystem
 
 
 def _simple_config(**overrides) -> PackageConfig:
@@ -111,6 +113,14 @@ class TestInstallerSection:
         assert "VerifyChecksum" in script
         assert "ExtractArchive" in script
 
+    def test_remote_files_call_shared_download_function(self):
+        cfg = _simple_config()
+        cfg.files = [FileEntry(source=f"https://x.com/f{i}.bin") for i in range(3)]
+        script = YamlToNsisConverter(cfg).convert()
+        assert script.count('!insertmacro YPackDownloadFile ""') == 1
+        assert script.count("Call _DownloadFile") == 3
+        assert script.count('!include "ypack_download.nsh"') == 1
+
     def test_file_associations(self):
         cfg = _simple_config()
         cfg.install.file_associations = [
@@ -183,9 +193,33 @@ class TestEnvVars:
         cfg = _simple_config()
         cfg.install.env_vars = [EnvVarEntry(name="PATH", value="$INSTDIR\\bin", scope="system", append=True)]
         script = YamlToNsisConverter(cfg).convert()
-        assert "Function _StrContains" in script
-        assert "Function un._RemovePathEntry" in script
-        assert "Call _StrContains" in script
+        assert '!include "ypack_path.nsh"' in script
+        assert '!insertmacro YPackStrContains ""' in script
+        assert '!insertmacro YPackRemovePathEntry "un."' in script
+        assert "Call _AppendPathEntry" in script
+
+    def test_multiple_path_appends_share_one_function(self):
+        cfg = _simple_config()
+        cfg.install.env_vars = [
+            EnvVarEntry(name="PATH", value="$INSTDIR\\bin", scope="system", append=True),
+            EnvVarEntry(name="PATH", value="$INSTDIR\\tools", scope="user", append=True),
+        ]
+        script = YamlToNsisConverter(cfg).convert()
+        assert script.count('!insertmacro YPackAppendPathEntry ""') == 1
+        assert script.count("Call _AppendPathEntry") == 2
+        assert script.count('!include "ypack_path.nsh"') == 1
+        # No section-level labels that could collide between entries
+        assert "_skip_path_append" not in script
+
+    def test_uninstall_helpers_only_when_removing(self):
+        cfg = _simple_config()
+        cfg.install.env_vars = [
+            EnvVarEntry(name="PATH", value="$INSTDIR\\bin", append=True, remove_on_uninstall=False),
+        ]
+        script = YamlToNsisConverter(cfg).convert()
+        assert '!insertmacro YPackAppendPathEntry ""' in script
+        assert '"un."' not in script
+        assert "un._RemovePathEntry" not in script
 
 
 class TestRegistryEntries:
@@ -224,6 +258,29 @@ class TestPackageSections:
         assert 'Section "app"' in script
         assert 'Section "drv"' in script
 
+    def test_section_sizes_from_payload(self, tmp_path):
+        cfg = PackageConfig.from_dict({
+            "app": {"name": "M", "version": "2"},
+            "install": {},
+            "files": ["main.exe"],
+            "packages": {
+                "app": {"sources": [{"source": ["app", "extra.dat"], "destination": "$INSTDIR"}]},
+                "drv": {"sources": [{"source": "drv/*", "destination": "$INSTDIR\\drv"}]},
+            },
+        })
+        cfg._config_dir = str(tmp_path)
+        fs = MemoryFileSystem({
+            str(tmp_path / "main.exe"): b"x" * 100,
+            str(tmp_path / "app" / "a.dll"): b"x" * 2048,
+            str(tmp_path / "app" / "sub" / "b.dll"): b"x" * 2048,
+            str(tmp_path / "extra.dat"): b"x" * 1,
+        })
+        script = YamlToNsisConverter(cfg, shared=SharedBuild(cfg, fs=fs)).convert()
+        assert 'Section "Install" SEC_INSTALL' in script
+        oninit = script.split("Function .onInit", 1)[1].split("FunctionEnd", 1)[0]
+        assert "  SectionSetSize ${SEC_INSTALL} 1\n  SectionSetSize ${SEC_PKG_0} 5\n" in oninit
+        assert "SectionSetSize ${SEC_PKG_1}" not in oninit  # drv/* matches nothing
+
     def test_post_install(self):
         cfg = PackageConfig.from_dict({
             "app": {"name": "P", "version": "1"},
@@ -275,10 +332,9 @@ class TestLogging:
         assert '!ifdef NSIS_CONFIG_LOG' in script
         # LOG_FILE define should be set
         assert '!define LOG_FILE' in script
-        # Logging macros should be present
-        assert '!macro LogInit' in script
-        assert '!macro LogWrite' in script
-        assert '!macro LogClose' in script
+        # Logging macros should be included from the helper library
+        assert '!include "ypack_log.nsh"' in script
+        assert '!addincludedir "${YPACK_INCLUDE_DIR}"' in script
         # Install section should use the logging macros
         assert '!insertmacro LogInit "Install"' in script
         assert '!insertmacro LogWrite' in script
@@ -290,7 +346,7 @@ class TestLogging:
         cfg = _simple_config()
         cfg.logging = LoggingConfig(enabled=False)
         script = YamlToNsisConverter(cfg).convert()
-        assert '!macro LogInit' not in script
+        assert 'ypack_log.nsh' not in script
         assert '!insertmacro LogInit' not in script
 
 
@@ -513,6 +569,54 @@ class TestARPRegistry:
         script = YamlToNsisConverter(cfg).convert()
         assert '"DisplayIcon"' in script
 
+    def test_estimated_size_from_payload(self, tmp_path):
+        cfg = _simple_config(packages={
+            "Core": {"sources": [{"source": "core/*"}]},
+            "Empty": {"sources": [{"source": "empty.dll"}]},
+        })
+        cfg._config_dir = str(tmp_path)
+        fs = MemoryFileSystem({
+            str(tmp_path / "test.exe"): b"x" * 3000,
+            str(tmp_path / "empty.dll"): b"",
+            str(tmp_path / "core" / "a.dll"): b"x" * 1024,
+            str(tmp_path / "core" / "b.dll"): b"x" * 1025,
+        })
+        script = YamlToNsisConverter(cfg, shared=SharedBuild(cfg, fs=fs)).convert()
+        assert "GetSize" not in script
+        section = script.split('Section "-EstimatedSize"', 1)[1].split("SectionEnd", 1)[0]
+        assert section.splitlines()[1:6] == [
+            "  StrCpy $0 3",
+            "  SectionGetFlags ${SEC_PKG_0} $1",
+            "  IntOp $1 $1 & ${SF_SELECTED}",
+            "  IntCmp $1 0 +2",
+            "  IntOp $0 $0 + 3",
+        ]
+        assert "SEC_PKG_1" not in section
+        assert section.rstrip().endswith('"EstimatedSize" $0\n  SetRegView lastused')
+        assert script.index('Section "-EstimatedSize"') > script.index('Section "Empty"')
+
+    def test_estimated_size_without_packages_is_constant(self, tmp_path):
+        cfg = _simple_config()
+        cfg._config_dir = str(tmp_path)
+        fs = MemoryFileSystem({str(tmp_path / "test.exe"): b"x" * 2048})
+        script = YamlToNsisConverter(cfg, shared=SharedBuild(cfg, fs=fs)).convert()
+        assert '"EstimatedSize" 2\n' in script
+
+    def test_estimated_size_measured_when_payload_is_missing(self):
+        script = YamlToNsisConverter(_simple_config()).convert()
+        section = script.split('Section "-EstimatedSize"', 1)[1].split("SectionEnd", 1)[0]
+        assert '${GetSize} "$INSTDIR" "/S=0K" $0 $1 $2' in section
+        assert '"EstimatedSize" $0' in section
+        assert '"EstimatedSize" 0' not in script
+
+    def test_estimated_size_measured_with_downloads(self, tmp_path):
+        cfg = _simple_config(files=["test.exe", {"source": "https://example.com/x.zip"}])
+        cfg._config_dir = str(tmp_path)
+        fs = MemoryFileSystem({str(tmp_path / "test.exe"): b"x" * 2048})
+        script = YamlToNsisConverter(cfg, shared=SharedBuild(cfg, fs=fs)).convert()
+        assert '"EstimatedSize" $0' in script
+        assert '"EstimatedSize" 2' not in script
+
 
 class TestRegistryKey:
     """Tests for configurable REG_KEY."""
@@ -595,3 +699,131 @@ class TestConverterRegistry:
     def test_output_extension(self):
         from ypack.converters import OUTPUT_EXTENSIONS
         assert OUTPUT_EXTENSIONS["nsis"] == ".nsi"
+
+
+class TestParallelGeneration:
+    def _big_config(self) -> PackageConfig:
+        sources = [{"source": f"data/f{i}.bin", "destination": f"$INSTDIR\\d{i % 7}"} for i in range(2500)]
+        return PackageConfig.from_dict({
+            "app": {"name": "Par", "version": "1"},
+            "install": {"env_vars": [{"name": "PATH", "value": "$INSTDIR", "append": True}]},
+            "files": ["a.exe"],
+            "logging": {"enabled": True},
+            "packages": {
+                "Big": {"sources": sources},
+                "Group": {"children": {"Leaf": {"sources": ["x/*"], "optional": True}}},
+            },
+        })
+
+    def test_parallel_output_is_byte_identical(self):
+        cfg = self._big_config()
+        serial = YamlToNsisConverter(cfg).convert()
+        assert YamlToNsisConverter(cfg, jobs=2).convert() == serial
+
+    def test_parallel_with_fragment_cache(self):
+        from ypack.converters.fragments import FragmentCache
+
+        cfg = self._big_config()
+        cache = FragmentCache()
+        first = YamlToNsisConverter(cfg, fragment_cache=cache, jobs=2).convert()
+        second = YamlToNsisConverter(cfg, fragment_cache=cache).convert()
+        assert first == second == YamlToNsisConverter(cfg).convert()
+        assert cache.hits == cache.misses
+
+
+class TestCompactOutput:
+    def _config(self) -> PackageConfig:
+        return _simple_config(
+            install={
+                "env_vars": [
+                    {"name": "PATH", "value": "$INSTDIR\\bin", "append": True, "remove_on_uninstall": True},
+                ],
+                "registry_entries": [{"hive": "HKLM", "key": "Software\\T", "name": "Dirs", "value": "a;b"}],
+                "existing_install": {"mode": "prompt_uninstall"},
+            },
+            logging={"enabled": True},
+        )
+
+    def test_comments_blank_lines_and_indent_removed(self):
+        script = YamlToNsisConverter(self._config(), compact=True).convert()
+        lines = script.split("\n")
+        assert all(line.strip() for line in lines)
+        assert not any(line.startswith((";", "#", " ")) for line in lines)
+        assert "; already present" not in script
+
+    def test_semicolon_inside_string_is_kept(self):
+        script = YamlToNsisConverter(self._config(), compact=True).convert()
+        assert '"Dirs" "a;b"' in script
+
+    def test_labels_shortened_consistently(self):
+        script = YamlToNsisConverter(self._config(), compact=True).convert()
+        assert "_ei_done" not in script
+        assert "\n_0:" in script
+        assert "Call _AppendPathEntry" in script
+        assert "!insertmacro LogInit" in script
+
+    def test_converter_tracks_size(self):
+        conv = YamlToNsisConverter(self._config(), compact=True)
+        script = conv.convert()
+        plain = YamlToNsisConverter(self._config()).convert()
+        assert conv.bytes_after < conv.bytes_before
+        assert len(script) < len(plain)
+
+
+class TestHooks:
+    def _section(self, script: str, start: str, end: str) -> str:
+        i = script.index(start)
+        return script[i:script.index(end, i)]
+
+    def test_points_inside_sections_and_functions(self):
+        conv = YamlToNsisConverter(_simple_config())
+        conv.add_hook("pages", "!insertmacro MUI_PAGE_COMPONENTS")
+        conv.add_hook("install", ["  ; install hook"])
+        conv.add_hook("oninit", "  ; oninit hook")
+        conv.add_hook("uninit", "  ; uninit hook")
+        conv.add_hook("uninstall", ["  ; uninstall hook"])
+        script = conv.convert()
+        assert "MUI_PAGE_COMPONENTS\n!insertmacro MUI_PAGE_DIRECTORY" in script
+        assert "; install hook" in self._section(script, 'Section "Install"', "SectionEnd")
+        assert "; oninit hook" in self._section(script, "Function .onInit", "FunctionEnd")
+        assert "; uninit hook" in self._section(script, "Function un.onInit", "FunctionEnd")
+        assert "; uninstall hook" in self._section(script, 'Section "Uninstall"', "SectionEnd")
+
+    def test_before_and_after_fragments(self):
+        conv = YamlToNsisConverter(_simple_config())
+        conv.add_hook("before:uninstaller_section", lambda ctx: f'Section "Extra_{ctx.config.app.name}"\nSectionEnd\n')
+        conv.add_hook("after:installer_section", "; first")
+        conv.add_hook("after:installer_section", "; second")
+        script = conv.convert()
+        assert script.index("; first") < script.index("; second") < script.index('Section "Extra_TestApp"')
+        assert script.index('Section "Extra_TestApp"') < script.index('Section "Uninstall"')
+        assert script.index('Section "Install"') < script.index("; first")
+
+    def test_unknown_point_rejected(self):
+        conv = YamlToNsisConverter(_simple_config())
+        with pytest.raises(ValueError, match="Unknown hook point"):
+            conv.add_hook("after:nope", "x")
+        with pytest.raises(ValueError, match="Unknown hook point"):
+            conv.add_hook("postinstall", "x")
+
+    def test_cached_fragment_sees_changed_hook(self):
+        from ypack.converters.fragments import FragmentCache
+
+        cache = FragmentCache()
+        marker = ["  ; one"]
+        conv = YamlToNsisConverter(_simple_config(), fragment_cache=cache)
+        conv.add_hook("oninit", lambda ctx: marker)
+        assert "; one" in conv.convert()
+        marker[:] = ["  ; two"]
+        script = conv.convert()
+        assert "; two" in script and "; one" not in script
+
+    def test_callable_hooks_in_parallel_mode(self):
+        cfg = _simple_config()
+        outputs = []
+        for jobs in (1, 2):
+            conv = YamlToNsisConverter(cfg, jobs=jobs)
+            conv.add_hook("oninit", lambda ctx: [f"  ; {ctx.config.app.name}"])
+            outputs.append(conv.convert())
+        assert outputs[0] == outputs[1]
+        assert "  ; TestApp" in outputs[0]
@@ -0,0 +1,137 @@
+"""Tests for payload content deduplication (``--dedupe``)."""
+
+from __future__ import annotations
+
+from ypack.cli import main
+from ypack.converters.dedupe import STAGE_DIR
+from ypack.converters.fragments import FragmentCache
+from ypack.converters.ir import CopyFile, CopyInstalled, SetOutPath, iter_components
+
+from .helpers import MemoryBuild, app_config, build_path
+
+RUNTIME = b"r" * 4000
+QT = b"q" * 3000
+
+
+FILES = {
+    "bin/app.exe": b"app",
+    "bin/vcruntime.dll": RUNTIME,
+    "qt/vcruntime.dll": RUNTIME,
+    "qt/core.dll": QT,
+    "qt/plugins/core2.dll": QT,
+    "tools/core.dll": QT,
+    "tools/other.dll": b"o" * 3000,  # same size, other content
+    "tools/empty1.txt": b"",
+    "tools/empty2.txt": b"",
+}
+
+CONFIG = app_config(
+    "DedupeApp",
+    files=[{"source": "bin/*"}],
+    packages={
+        "Qt": {"optional": True, "sources": [{"source": "qt/**", "destination": "$INSTDIR\\qt"}]},
+        "Tools": {"optional": True, "sources": [{"source": "tools/*", "destination": "$INSTDIR\\tools"}]},
+    },
+)
+
+
+class TestDuplicates:
+    def test_groups_identical_content(self):
+        shared = MemoryBuild(CONFIG, FILES).shared()
+        assert shared.duplicates == [
+            [build_path("bin/vcruntime.dll"), build_path("qt/vcruntime.dll")],
+            [build_path("qt/core.dll"), build_path("qt/plugins/core2.dll"), build_path("tools/core.dll")],
+        ]
+
+
+class TestDedupePlan:
+    def test_copies_from_top_level_files(self):
+        ctx = MemoryBuild(CONFIG, FILES).context(expand_sources=True, dedupe="copy")
+        qt = iter_components(ctx.plan.components)[0]
+        assert CopyInstalled("$INSTDIR\\vcruntime.dll", "$INSTDIR\\qt\\vcruntime.dll") in qt.ops
+        assert CopyFile(build_path("qt/vcruntime.dll")) not in qt.ops
+
+    def test_blob_shared_by_components_is_staged_once(self):
+        ctx = MemoryBuild(CONFIG, FILES).context(expand_sources=True, dedupe="copy")
+        staged = f"{STAGE_DIR}\\0\\core.dll"
+        assert ctx.plan.files[-2:] == [SetOutPath(f"{STAGE_DIR}\\0"), CopyFile(build_path("qt/core.dll"))]
+        qt, tools = iter_components(ctx.plan.components)
+        assert CopyInstalled(staged, "$INSTDIR\\qt\\core.dll") in qt.ops
+        assert CopyInstalled(staged, "$INSTDIR\\qt\\plugins\\core2.dll") in qt.ops
+        assert CopyInstalled(staged, "$INSTDIR\\tools\\core.dll") in tools.ops
+        assert CopyFile(build_path("tools/other.dll")) in tools.ops
+        stats = ctx.dedupe_stats
+        assert (stats.files, stats.staged) == (4, 1)
+        assert stats.bytes_saved == len(RUNTIME) + 2 * len(QT)
+
+    def test_within_one_component_copies_from_the_first(self):
+        packages = {"Qt": {"sources": [{"source": "qt/**", "destination": "$INSTDIR\\qt"}]}}
+        ctx = MemoryBuild(CONFIG, FILES, packages=packages).context(expand_sources=True, dedupe="copy")
+        qt = iter_components(ctx.plan.components)[0]
+        assert CopyFile(build_path("qt/core.dll")) in qt.ops
+        assert CopyInstalled("$INSTDIR\\qt\\core.dll", "$INSTDIR\\qt\\plugins\\core2.dll") in qt.ops
+        assert not any(isinstance(op, SetOutPath) and op.path.startswith(STAGE_DIR) for op in ctx.plan.files)
+
+    def test_off_by_default(self):
+        ctx = MemoryBuild(CONFIG, FILES).context(expand_sources=True)
+        assert ctx.dedupe_stats is None
+        assert not any(isinstance(op, CopyInstalled) for c in iter_components(ctx.plan.components) for op in c.ops)
+
+
+class TestNsisOutput:
+    def test_copy_and_staging(self):
+        script = MemoryBuild(CONFIG, FILES).convert(dedupe="copy")
+        install = script.split('Section "Install"', 1)[1].split("SectionEnd", 1)[0]
+        assert "  InitPluginsDir\n" in install
+        assert f'  SetOutPath "{STAGE_DIR}\\0"\n  File "qt\\core.dll"' in install
+        assert '  CopyFiles /SILENT "$INSTDIR\\vcruntime.dll" "$INSTDIR\\qt\\vcruntime.dll"' in script
+        assert "CreateHardLinkW" not in script
+        cleanup = script.split('Section "-DedupeCleanup"', 1)[1].split("SectionEnd", 1)[0]
+        assert cleanup == f'\n  RMDir /r "{STAGE_DIR}"\n'
+        assert script.index('Section "-DedupeCleanup"') > script.index('Section "Tools"')
+        # The uninstaller still removes every copy.
+        assert 'Delete "$INSTDIR\\qt\\plugins\\core2.dll"' in script.split('Section "Uninstall"', 1)[1]
+
+    def test_hardlink_falls_back_to_copy(self):
+        script = MemoryBuild(CONFIG, FILES).convert(dedupe="hardlink")
+        link = (
+            "  Push $0\n"
+            "  System::Call 'kernel32::CreateHardLinkW("
+            'w "$INSTDIR\\qt\\vcruntime.dll", w "$INSTDIR\\vcruntime.dll", p 0) i .r0\'\n'
+            "  IntCmp $0 0 0 +2 +2\n"
+            '  CopyFiles /SILENT "$INSTDIR\\vcruntime.dll" "$INSTDIR\\qt\\vcruntime.dll"\n'
+            "  Pop $0\n"
+        )
+        assert link in script
+
+    def test_no_cleanup_without_staging(self):
+        script = MemoryBuild(CONFIG, FILES, packages={}).convert(dedupe="copy")
+        assert "DedupeCleanup" not in script
+
+    def test_fragment_cache_sees_content_changes(self):
+        build = MemoryBuild(CONFIG, FILES)
+        cache = FragmentCache()
+        build.convert(dedupe="copy", fragment_cache=cache)
+        # Same size and names, different content: no longer a duplicate.
+        build.fs.add_file(build_path("qt/vcruntime.dll"), b"x" * len(RUNTIME))
+        script = build.convert(dedupe="copy", fragment_cache=cache)
+        assert 'CopyFiles /SILENT "$INSTDIR\\vcruntime.dll"' not in script
+        assert 'File "qt\\vcruntime.dll"' in script
+
+
+class TestCli:
+    def test_reports_bytes_saved(self, tmp_path, capsys):
+        for rel in ("bin/a.dll", "lib/a.dll"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_bytes(b"same" * 100)
+        cfg = tmp_path / "installer.yaml"
+        cfg.write_text(
+            "app:\n  name: D\n  version: '1'\ninstall: {}\nfiles:\n"
+            "  - source: bin/*\n  - source: lib/*\n    destination: $INSTDIR\\lib\n",
+            encoding="utf-8",
+        )
+        main(["convert", str(cfg), "--dedupe", "--hash-cache", str(tmp_path / "h.db"), "-o", str(tmp_path / "o.nsi")])
+        assert "Dedupe stored 1 duplicate files once: 400 bytes less" in capsys.readouterr().out
+        script = (tmp_path / "o.nsi").read_text(encoding="utf-8-sig")
+        assert 'CopyFiles /SILENT "$INSTDIR\\a.dll" "$INSTDIR\\lib\\a.dll"' in script
+        assert (tmp_path / "h.db").exists()
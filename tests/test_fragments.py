@@ -0,0 +1,103 @@
+"""Tests for fragment-level caching of generated script sections."""
+
+from __future__ import annotations
+
+import sys
+
+from ypack.config import PackageConfig, RegistryEntry
+from ypack.converters.context import BuildContext
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.fragments import FragmentCache, FragmentSpec
+
+
+def _config(version: str = "1.0", **extra) -> PackageConfig:
+    data = {
+        "app": {"name": "CacheApp", "version": version, "publisher": "Pub"},
+        "install": {},
+        "files": ["app.exe"],
+        "packages": {"Core": {"sources": [{"source": "core/*", "destination": "$INSTDIR\\core"}]}},
+    }
+    data.update(extra)
+    return PackageConfig.from_dict(data)
+
+
+class TestFragmentCache:
+    def test_cached_output_matches_uncached(self):
+        cache = FragmentCache()
+        first = YamlToNsisConverter(_config(), fragment_cache=cache).convert()
+        second = YamlToNsisConverter(_config(), fragment_cache=cache).convert()
+        assert first == second == YamlToNsisConverter(_config()).convert()
+        assert cache.misses > 0
+        assert cache.hits == cache.misses
+
+    def test_version_bump_only_regenerates_header(self):
+        cache = FragmentCache()
+        YamlToNsisConverter(_config("1.0"), fragment_cache=cache).convert()
+        cache.hits = cache.misses = 0
+        script = YamlToNsisConverter(_config("2.0"), fragment_cache=cache).convert()
+        assert cache.misses == 1
+        assert '!define APP_VERSION "2.0"' in script
+
+    def test_registry_change_invalidates_installer_section(self):
+        cache = FragmentCache()
+        YamlToNsisConverter(_config(), fragment_cache=cache).convert()
+        cfg = _config()
+        cfg.install.registry_entries = [RegistryEntry(hive="HKCU", key="Software\\X", name="n", value="v")]
+        script = YamlToNsisConverter(cfg, fragment_cache=cache).convert()
+        assert 'WriteRegStr HKCU "Software\\X" "n" "v"' in script
+
+    def test_referenced_variable_change_invalidates(self):
+        cache = FragmentCache()
+
+        def _with_var(value: str) -> PackageConfig:
+            return _config(
+                variables={"DATA": value},
+                install={"registry_entries": [
+                    {"hive": "HKCU", "key": "Software\\X", "name": "data", "value": "${variables.DATA}"},
+                ]},
+            )
+
+        YamlToNsisConverter(_with_var("one"), _with_var("one")._raw_dict, fragment_cache=cache).convert()
+        cfg = _with_var("two")
+        script = YamlToNsisConverter(cfg, cfg._raw_dict, fragment_cache=cache).convert()
+        assert '"data" "two"' in script
+
+    def test_persisted_between_runs(self, tmp_path):
+        path = str(tmp_path / "fragments.json")
+        cache = FragmentCache(path)
+        expected = YamlToNsisConverter(_config(), fragment_cache=cache).convert()
+        cache.save()
+
+        reloaded = FragmentCache(path)
+        assert YamlToNsisConverter(_config(), fragment_cache=reloaded).convert() == expected
+        assert reloaded.misses == 0
+
+    def test_filesystem_change_invalidates(self, tmp_path):
+        cache = FragmentCache()
+        cfg = _config(packages={"Core": {"sources": [{"source": "core.dll"}]}})
+        cfg._config_dir = str(tmp_path)
+        (tmp_path / "app.exe").write_bytes(b"x")
+        YamlToNsisConverter(cfg, fragment_cache=cache).convert()
+        (tmp_path / "core.dll").write_bytes(b"x")
+        cache.hits = cache.misses = 0
+        YamlToNsisConverter(cfg, fragment_cache=cache).convert()
+        assert cache.misses == 3  # only the package sections, section sizes and installed size looked at core.dll
+
+    def test_deep_package_tree(self):
+        depth = sys.getrecursionlimit() * 2
+        tree: dict = {"sources": [{"source": "leaf.dll"}]}
+        for i in range(depth):
+            tree = {"children": {f"P{i}": tree}}
+        cfg = _config(packages={"Root": tree})
+        spec = FragmentSpec("deep", lambda ctx: ["deep"], ("packages",))
+        cache = FragmentCache()
+        assert cache.render(BuildContext(cfg), spec) == ["deep"]
+        assert cache.render(BuildContext(cfg), spec) == ["deep"]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        leaf = cfg.packages[0]
+        while leaf.children:
+            leaf = leaf.children[0]
+        leaf.sources[0]["source"] = "other.dll"
+        cache.render(BuildContext(cfg), spec)
+        assert cache.misses == 2
@@ -0,0 +1,138 @@
+"""Tests for the converters' filesystem layer."""
+
+from __future__ import annotations
+
+import os
+import pickle
+
+import pytest
+
+from ypack.converters.convert_wix import YamlToWixConverter
+from ypack.converters.fragments import FragmentCache
+from ypack.converters.fs import CachedFileSystem, FileSystem, LocalFileSystem, MemoryFileSystem
+
+from .helpers import ROOT, MemoryBuild, app_config, build_path, memory_fs
+
+FILES = {
+    "app.ico": b"ico",
+    "bin/app.exe": b"MZ",
+    "bin/sub/b.dll": b"dll",
+    "docs/readme.txt": b"read me",
+}
+
+CONFIG = app_config("FsApp", files=[{"source": "bin/**"}, "docs/readme.txt", "missing.exe"])
+CONFIG["app"]["install_icon"] = "app.ico"
+
+
+class CountingFileSystem(MemoryFileSystem):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = 0
+
+    def stat(self, path):
+        self.stats += 1
+        return super().stat(path)
+
+
+class TestMemoryFileSystem:
+    def test_base_class_is_abstract(self):
+        with pytest.raises(TypeError):
+            FileSystem()  # type: ignore[abstract]
+
+    def test_files_and_parent_dirs(self):
+        fs = memory_fs(FILES)
+        assert fs.isfile(build_path("bin/app.exe"))
+        assert fs.isdir(build_path("bin/sub"))
+        assert fs.isdir(ROOT)
+        assert not fs.exists(build_path("bin/missing"))
+        assert fs.stat(build_path("docs/readme.txt")).size == 7
+
+    def test_scan(self):
+        subdirs, files = memory_fs(FILES).scan(build_path("bin"))
+        assert subdirs == ["sub"]
+        assert list(files) == ["app.exe"]
+        assert memory_fs(FILES).scan(build_path("bin/app.exe")) is None
+
+    def test_open(self):
+        with memory_fs(FILES).open(build_path("bin/app.exe")) as fh:
+            assert fh.read() == b"MZ"
+
+
+class TestLocalFileSystem:
+    def test_matches_os(self, tmp_path):
+        (tmp_path / "d").mkdir()
+        (tmp_path / "f.txt").write_bytes(b"abc")
+        fs = LocalFileSystem()
+        assert fs.isdir(str(tmp_path / "d"))
+        assert fs.stat(str(tmp_path / "f.txt")).size == 3
+        assert fs.stat(str(tmp_path / "nope")) is None
+        assert fs.scan(str(tmp_path)) == (["d"], {"f.txt": fs.stat(str(tmp_path / "f.txt"))})
+
+
+class TestCachedFileSystem:
+    def test_stats_each_path_once(self):
+        inner = CountingFileSystem({build_path("a.txt"): b"a"})
+        fs = CachedFileSystem(inner)
+        for _ in range(3):
+            assert fs.exists(build_path("a.txt"))
+            assert not fs.exists(build_path("b.txt"))
+        assert inner.stats == 2
+        assert (fs.hits, fs.misses) == (4, 2)
+
+    def test_scan_fills_the_cache(self):
+        inner = CountingFileSystem({build_path("bin/app.exe"): b"MZ"})
+        fs = CachedFileSystem(inner)
+        fs.scan(build_path("bin"))
+        assert fs.isfile(build_path("bin/app.exe"))
+        assert inner.stats == 0
+
+    def test_pickles(self):
+        fs = CachedFileSystem(memory_fs(FILES))
+        fs.exists(build_path("app.ico"))
+        copy = pickle.loads(pickle.dumps(fs))
+        assert copy.exists(build_path("app.ico")) and copy.hits == 1
+
+
+class TestConversionInMemory:
+    def test_resolve_path_stats_once(self):
+        inner = CountingFileSystem({build_path("app.ico"): b"ico"})
+        ctx = MemoryBuild(CONFIG, inner).context()
+        for _ in range(3):
+            assert ctx.resolve_path("app.ico") == build_path("app.ico")
+            assert ctx.exists(ctx.resolve_path("app.ico"))
+        assert inner.stats == 1
+
+    def test_nsis_script_from_memory(self, monkeypatch):
+        def no_disk(*args, **kwargs):
+            raise AssertionError("touched the disk")
+
+        monkeypatch.setattr(os, "stat", no_disk)
+        monkeypatch.setattr(os, "scandir", no_disk)
+        script = MemoryBuild(CONFIG, FILES).convert(expand_sources=True)
+        assert '!define MUI_ICON "app.ico"' in script
+        assert "WARNING: Install icon not found" not in script
+        assert 'File "bin\\app.exe"' in script
+        assert 'File "bin\\sub\\b.dll"' in script
+        assert 'File "docs\\readme.txt"' in script
+        assert 'File "missing.exe"' in script
+
+    def test_wix_harvests_from_memory(self):
+        script = MemoryBuild(CONFIG, FILES).convert(YamlToWixConverter)
+        assert 'Source="bin\\sub\\b.dll"' in script
+        assert "No files match" not in script
+
+    def test_hashes_read_through_fs(self):
+        digests = MemoryBuild(CONFIG, FILES).shared().hashes("sha1")
+        assert set(digests) == {build_path("bin/app.exe"), build_path("bin/sub/b.dll"), build_path("docs/readme.txt")}
+
+    def test_fragment_cache_rechecks_existence(self):
+        # An absolute icon path resolves to itself whether or not it
+        # exists, so only the existence check tells the builds apart.
+        icon = os.path.abspath(os.sep + "icons" + os.sep + "app.ico")
+        build = MemoryBuild(CONFIG, FILES, app={**CONFIG["app"], "install_icon": icon})
+        cache = FragmentCache()
+        first = build.convert(fragment_cache=cache)
+        assert "WARNING: Install icon not found" in first
+        build.fs.add_file(icon, b"ico")
+        second = build.convert(fragment_cache=cache)
+        assert "WARNING: Install icon not found" not in second
@@ -182,8 +182,8 @@ class TestFullIntegration:
 
         # Env vars
         assert '"FULLAPP_HOME"' in nsi
-        assert "Function _StrContains" in nsi  # PATH append helper
-        assert "Function un._RemovePathEntry" in nsi
+        assert '!insertmacro YPackAppendPathEntry ""' in nsi  # PATH append helper
+        assert '!insertmacro YPackRemovePathEntry "un."' in nsi
 
         # File associations
         assert 'WriteRegStr HKCR ".fa"' in nsi
@@ -249,3 +249,119 @@ class TestVariableResolution:
         nsi = conv.convert()
         # ${app.name} should be resolved to VarApp where the converter resolves it
         assert "VarApp" in nsi
+
+
+class TestReproducibleOutput:
+    _YAML = textwrap.dedent("""\
+        app:
+          name: ReproApp
+          version: "1.0"
+          install_icon: "res/app.ico"
+          license: "LICENSE.txt"
+        install: {}
+        files:
+          - ReproApp.exe
+        packages:
+          Core:
+            sources:
+              - source: "bin/core.dll"
+                destination: "$INSTDIR\\\\bin"
+        logging:
+          enabled: true
+    """)
+
+    def _checkout(self, root):
+        (root / "res").mkdir(parents=True)
+        (root / "bin").mkdir()
+        (root / "res" / "app.ico").write_bytes(b"ico")
+        (root / "bin" / "core.dll").write_bytes(b"dll")
+        (root / "LICENSE.txt").write_text("MIT", encoding="utf-8")
+        (root / "installer.yaml").write_text(self._YAML, encoding="utf-8")
+        cfg = PackageConfig.from_yaml(str(root / "installer.yaml"))
+        out = root / "installer.nsi"
+        YamlToNsisConverter(cfg, cfg._raw_dict).save(str(out))
+        return out.read_bytes()
+
+    def test_identical_bytes_from_different_checkouts(self, tmp_path):
+        first = self._checkout(tmp_path / "checkout-a")
+        second = self._checkout(tmp_path / "elsewhere" / "checkout-b")
+        assert first == second
+        assert str(tmp_path).encode("utf-8") not in first
+        assert b'File "bin\\core.dll"' in first
+
+    def test_source_date_epoch_pins_timestamps(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+        script = self._checkout(tmp_path).decode("utf-8-sig")
+        assert '!define BUILD_TIMESTAMP "2023-11-14 22:13:20"' in script
+        assert "SetDateSave off" in script
+        assert "${__TIME__}]" not in script
+
+    def test_no_epoch_keeps_file_dates(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+        script = self._checkout(tmp_path).decode("utf-8-sig")
+        assert "SetDateSave off" not in script
+        assert "!define BUILD_TIMESTAMP" not in script  # ypack_log.nsh falls back to compile time
+
+
+class TestSplitOutput:
+    _YAML = textwrap.dedent("""\
+        app:
+          name: SplitApp
+          version: "1.0"
+          publisher: "Pub"
+        install: {}
+        files:
+          - SplitApp.exe
+        packages:
+          Core:
+            sources:
+              - source: "core.dll"
+          Docs:
+            optional: true
+            sources:
+              - source: "manual.pdf"
+                destination: "$INSTDIR\\\\docs"
+    """)
+
+    def _save(self, tmp_path, yaml_text=None):
+        cfg_path = tmp_path / "installer.yaml"
+        cfg_path.write_text(yaml_text or self._YAML, encoding="utf-8")
+        cfg = PackageConfig.from_yaml(str(cfg_path))
+        conv = YamlToNsisConverter(cfg, cfg._raw_dict, split=True)
+        conv.save(str(tmp_path / "installer.nsi"))
+        return conv
+
+    def test_packages_and_uninstaller_in_include_files(self, tmp_path):
+        self._save(tmp_path)
+        main = (tmp_path / "installer.nsi").read_text(encoding="utf-8-sig")
+        parts = tmp_path / "installer.d"
+        assert sorted(os.listdir(parts)) == ["pkg_Core.nsh", "pkg_Docs.nsh", "uninstall.nsh"]
+        assert '!include "installer.d\\pkg_Core.nsh"' in main
+        assert 'Section "Core"' not in main
+        assert 'Section "Uninstall"' not in main
+        assert 'Section "Docs" SEC_PKG_1' in (parts / "pkg_Docs.nsh").read_text(encoding="utf-8-sig")
+
+    def test_fragment_hooks_wrap_all_package_parts(self, tmp_path):
+        cfg_path = tmp_path / "installer.yaml"
+        cfg_path.write_text(self._YAML, encoding="utf-8")
+        cfg = PackageConfig.from_yaml(str(cfg_path))
+        conv = YamlToNsisConverter(cfg, cfg._raw_dict, split=True)
+        conv.add_hook("before:package_sections", "; before packages")
+        conv.add_hook("after:package_sections", "; after packages")
+        conv.save(str(tmp_path / "installer.nsi"))
+        main = (tmp_path / "installer.nsi").read_text(encoding="utf-8-sig")
+        assert main.index("; before packages") < main.index("pkg_Core.nsh")
+        assert main.index("pkg_Docs.nsh") < main.index("; after packages") < main.index("uninstall.nsh")
+
+    def test_unchanged_files_are_not_rewritten(self, tmp_path):
+        self._save(tmp_path)
+        conv = self._save(tmp_path, self._YAML.replace('"1.0"', '"1.1"'))
+        written = {os.path.basename(p) for p in conv.files_written}
+        assert written == {"installer.nsi"}
+        assert len(conv.files_unchanged) == 3
+
+    def test_removed_package_deletes_its_include(self, tmp_path):
+        self._save(tmp_path)
+        conv = self._save(tmp_path, self._YAML.split("  Docs:")[0])
+        assert not (tmp_path / "installer.d" / "pkg_Docs.nsh").exists()
+        assert [os.path.basename(p) for p in conv.files_removed] == ["pkg_Docs.nsh"]
@@ -0,0 +1,158 @@
+"""Tests for the backend-neutral installer IR and its NSIS serialisation."""
+
+from __future__ import annotations
+
+from ypack.config import PackageConfig
+from ypack.converters.context import BuildContext
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.ir import (
+    Component,
+    ComponentGroup,
+    CopyFile,
+    CreateShortcut,
+    Download,
+    SetOutPath,
+    UpdateEnvVar,
+    WriteRegistry,
+    iter_components,
+)
+
+
+def _config(**overrides) -> PackageConfig:
+    data = {
+        "app": {"name": "PlanApp", "version": "2.0", "publisher": "Pub"},
+        "install": {},
+        "files": ["app.exe"],
+    }
+    data.update(overrides)
+    return PackageConfig.from_dict(data)
+
+
+class TestBuildPlan:
+    def test_files_share_outpath(self):
+        cfg = _config(files=[
+            "a.exe",
+            "b.dll",
+            {"source": "data/**/*", "destination": "$INSTDIR\\data"},
+            {"source": "https://example.com/x.zip", "destination": "$INSTDIR\\data"},
+        ])
+        plan = BuildContext(cfg).plan
+        assert plan.files == [
+            SetOutPath("$INSTDIR"),
+            CopyFile("a.exe"),
+            CopyFile("b.dll"),
+            SetOutPath("$INSTDIR\\data"),
+            CopyFile("data/**/*", recursive=True),
+            Download("https://example.com/x.zip", "x.zip", "$INSTDIR\\data"),
+        ]
+
+    def test_values_are_resolved(self):
+        cfg = _config(install={
+            "registry_entries": [
+                {"hive": "HKLM", "key": "Software\\${app.name}", "name": "Ver", "value": "${app.version}", "view": "32"},
+            ],
+            "env_vars": [{"name": "PATH", "value": "$INSTDIR\\bin", "append": True}],
+            "desktop_shortcut": {"target": "${app.name}.exe"},
+        })
+        plan = BuildContext(cfg, cfg._raw_dict).plan
+        assert plan.registry == [WriteRegistry("HKLM", "Software\\PlanApp", "Ver", "2.0", view="32")]
+        assert plan.env_vars[0] == UpdateEnvVar(
+            "PATH", "$INSTDIR\\bin", "system", "HKLM",
+            "SYSTEM\\CurrentControlSet\\Control\\Session Manager\\Environment", append=True,
+        )
+        assert plan.shortcuts[0].ops == [
+            CreateShortcut("$DESKTOP\\${APP_NAME}.lnk", "$INSTDIR\\PlanApp.exe"),
+        ]
+
+    def test_components_keep_tree_and_section_ids(self):
+        cfg = _config(packages={
+            "Core": {"sources": [{"source": "core/*", "destination": "$INSTDIR\\core"}]},
+            "Extras": {"children": {
+                "Docs": {"optional": True, "default": False},
+                "Samples": {"post_install": ["setup.exe /quiet"]},
+            }},
+        })
+        plan = BuildContext(cfg).plan
+        assert isinstance(plan.components[1], ComponentGroup)
+        flat = iter_components(plan.components)
+        assert [c.section_id for c in flat] == ["SEC_PKG_0", "SEC_PKG_1", "SEC_PKG_2"]
+        assert isinstance(flat[0], Component)
+        assert flat[0].ops == [SetOutPath("$INSTDIR\\core"), CopyFile("core/*")]
+        assert flat[2].post_install[0].command == "setup.exe /quiet"
+
+
+class TestPlanSerialisation:
+    def test_script_is_rendered_from_plan(self):
+        conv = YamlToNsisConverter(_config())
+        conv.ctx.plan.files.append(CopyFile("extra.dll"))
+        conv.ctx.plan.registry.append(WriteRegistry("HKCU", "Software\\X", "Flag", "1", type="dword"))
+        script = conv.convert()
+        assert 'File "extra.dll"' in script
+        assert 'WriteRegDWORD HKCU "Software\\X" "Flag" 1' in script
+
+    def test_registry_views_toggle_per_run(self):
+        cfg = _config(install={"registry_entries": [
+            {"hive": "HKLM", "key": "K", "name": "a", "value": "1", "view": "64"},
+            {"hive": "HKLM", "key": "K", "name": "b", "value": "2", "view": "64"},
+            {"hive": "HKLM", "key": "K", "name": "c", "value": "3"},
+        ]})
+        script = YamlToNsisConverter(cfg).convert()
+        block = script.split("; Custom registry entries", 1)[1].split("\n\n", 1)[0]
+        assert block.count("SetRegView 64") == 1
+        assert block.count("SetRegView lastused") == 1
+
+
+class TestExpandSources:
+    def _config(self, tmp_path, **overrides):
+        for rel in ("bin/app.exe", "bin/sub/b.dll", "bin/sub/deep/c.dll", "docs/readme.txt"):
+            (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel).write_text(rel)
+        cfg = _config(**overrides)
+        cfg._config_dir = str(tmp_path)
+        return cfg
+
+    def test_files_become_sorted_groups(self, tmp_path):
+        cfg = self._config(tmp_path, files=[{"source": "bin/**"}, "docs/readme.txt", "missing.exe"])
+        ctx = BuildContext(cfg, expand_sources=True)
+        join = lambda rel: str(tmp_path.joinpath(*rel.split("/")))  # noqa: E731
+        assert ctx.plan.files == [
+            SetOutPath("$INSTDIR"),
+            CopyFile(join("bin/app.exe")),
+            SetOutPath("$INSTDIR\\sub"),
+            CopyFile(join("bin/sub/b.dll")),
+            SetOutPath("$INSTDIR\\sub\\deep"),
+            CopyFile(join("bin/sub/deep/c.dll")),
+            SetOutPath("$INSTDIR"),
+            CopyFile(join("docs/readme.txt")),
+            CopyFile("missing.exe"),
+        ]
+
+    def test_script_and_uninstaller_list_each_file(self, tmp_path):
+        cfg = self._config(tmp_path, files=[
+            "bin/app.exe", {"source": "bin/sub/*", "destination": "$INSTDIR\\tools"},
+        ], packages={
+            "Docs": {"sources": [{"source": ["docs", "bin/sub/*"], "destination": "$INSTDIR\\extra"}]},
+        })
+        script = YamlToNsisConverter(cfg, expand_sources=True).convert()
+        install = script.split('Section "Uninstall"', 1)[0]
+        assert "File /r" not in install
+        assert 'SetOutPath "$INSTDIR\\extra\\docs"\n  File "docs\\readme.txt"' in install
+        uninstall = script.split('Section "Uninstall"', 1)[1]
+        assert "RMDir /r" not in uninstall
+        files = uninstall.split("; Remove installed files\n", 1)[1].split("\n\n", 1)[0].splitlines()
+        assert files == [
+            '  Delete "$INSTDIR\\tools\\b.dll"',
+            '  RMDir "$INSTDIR\\tools"',
+            '  Delete "$INSTDIR\\app.exe"',
+        ]
+        removal = uninstall.split("; Remove package files\n", 1)[1].split("\n\n", 1)[0].splitlines()
+        assert removal == [
+            '  Delete "$INSTDIR\\extra\\b.dll"',
+            '  Delete "$INSTDIR\\extra\\docs\\readme.txt"',
+            '  RMDir "$INSTDIR\\extra\\docs"',
+            '  RMDir "$INSTDIR\\extra"',
+        ]
+
+    def test_off_by_default(self, tmp_path):
+        cfg = self._config(tmp_path, files=[{"source": "bin/**"}])
+        assert BuildContext(cfg).plan.files == [SetOutPath("$INSTDIR"), CopyFile("bin/**", recursive=True)]
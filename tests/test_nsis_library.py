@@ -0,0 +1,97 @@
+"""Tests for the bundled NSIS helper library (``ypack/nsis/*.nsh``)."""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from ypack.config import LoggingConfig, PackageConfig
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.nsis_helpers import HELPER_DIR, HELPER_INCLUDE_DIR, HELPER_VERSION
+
+_LIBS = ("ypack_log.nsh", "ypack_path.nsh", "ypack_download.nsh", "ypack_volume.nsh")
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(HELPER_DIR, name), encoding="utf-8") as fh:
+        return fh.read()
+
+
+class TestLibraryFiles:
+    @pytest.mark.parametrize("name", _LIBS)
+    def test_guard_defines_version(self, name):
+        guard = "YPACK_" + name[len("ypack_"):-len(".nsh")].upper() + "_NSH"
+        text = _read(name)
+        assert f"!ifndef {guard}\n!define {guard} {HELPER_VERSION}\n" in text
+        assert text.rstrip().endswith(f"!endif ; {guard}")
+
+    @pytest.mark.parametrize("name", _LIBS)
+    def test_every_macro_is_guarded(self, name):
+        text = _read(name)
+        macros = re.findall(r"(?m)^!macro (\w+)", text)
+        assert macros
+        for macro in macros:
+            assert f"!ifmacrondef {macro}\n!macro {macro}" in text
+
+    def test_functions_have_uninstaller_variants(self):
+        text = _read("ypack_path.nsh") + _read("ypack_download.nsh") + _read("ypack_volume.nsh")
+        functions = re.findall(r"(?m)^Function (\S+)", text)
+        assert functions
+        assert all(f.startswith("${UN}") for f in functions)
+        assert "Call ${UN}_StrContains" in text
+        assert "Call ${UN}VerifyChecksum" in text
+
+
+    def test_join_volume_restores_registers(self):
+        body = _read("ypack_volume.nsh").split("Function ${UN}_JoinVolume", 1)[1].split("FunctionEnd", 1)[0]
+        setup, rest = body.split('  Delete "$R2"', 1)
+        saved = re.findall(r"(?m)^  (?:Exch|Push) (\$\w+)", setup)
+        restored = re.findall(r"(?m)^  Pop (\$\w+)", rest.split("_jv_done:", 1)[1])
+        registers = ["$0", "$1", "$R0", "$R1", "$R2", "$R3", "$R4", "$R5"]
+        assert sorted(saved) == sorted(restored) == registers
+        # Both the copy /b appends and Get-FileHash have their exit code checked.
+        assert body.count('StrCmp $0 "0" 0 ') == 2
+
+
+class TestHelperIncludes:
+    def _converter(self) -> YamlToNsisConverter:
+        cfg = PackageConfig.from_dict({"app": {"name": "LibApp", "version": "1.0"}, "install": {}, "files": []})
+        cfg.logging = LoggingConfig(enabled=True)
+        return YamlToNsisConverter(cfg)
+
+    def test_no_build_machine_path(self):
+        script = self._converter().convert()
+        assert f'!define YPACK_INCLUDE_DIR "{HELPER_INCLUDE_DIR}"' in script
+        assert HELPER_DIR not in script
+
+    def test_save_copies_the_included_libraries(self, tmp_path):
+        self._converter().save(str(tmp_path / "setup.nsi"))
+        assert os.listdir(tmp_path / HELPER_INCLUDE_DIR) == ["ypack_log.nsh"]
+        assert (tmp_path / HELPER_INCLUDE_DIR / "ypack_log.nsh").read_text(encoding="utf-8") == _read("ypack_log.nsh")
+
+
+@pytest.mark.skipif(shutil.which("makensis") is None, reason="makensis not installed")
+class TestCompileWithMakensis:
+    def test_both_variants_compile(self, tmp_path):
+        script = tmp_path / "lib.nsi"
+        script.write_text(
+            f'!addincludedir "{HELPER_DIR}"\n'
+            + "".join(f'!include "{name}"\n' for name in _LIBS)
+            + "".join(
+                f'!insertmacro {macro} "{un}"\n'
+                for un in ("", "un.")
+                # YPackDownloadFile is left out: it needs the inetc plugin.
+                for macro in ("YPackStrContains", "YPackAppendPathEntry", "YPackRemovePathEntry",
+                              "YPackVerifyChecksum", "YPackExtractArchive", "YPackJoinVolume")
+            )
+            + f'OutFile "{tmp_path / "lib.exe"}"\n'
+            'Section\n  !insertmacro LogInit "Test"\n  !insertmacro LogClose\n  WriteUninstaller "$TEMP\\u.exe"\nSectionEnd\n'
+            'Section Uninstall\nSectionEnd\n',
+            encoding="utf-8",
+        )
+        result = subprocess.run(["makensis", "-V2", str(script)], capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
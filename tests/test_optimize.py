@@ -0,0 +1,122 @@
+"""Tests for the IR optimisation passes (``--optimize``)."""
+
+from __future__ import annotations
+
+from ypack.cli import main
+from ypack.config import PackageConfig
+from ypack.converters.context import BuildContext
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.ir import CopyFile, Download, SetOutPath, iter_components
+from ypack.converters.optimize import optimize_plan
+
+
+def _config(**overrides) -> PackageConfig:
+    data = {
+        "app": {"name": "OptApp", "version": "1.0", "publisher": "Pub"},
+        "install": {},
+        "files": ["app.exe"],
+    }
+    data.update(overrides)
+    return PackageConfig.from_dict(data)
+
+
+def _plan(cfg: PackageConfig):
+    return BuildContext(cfg).plan
+
+
+class TestCoalesceSetOutPath:
+    def test_repeated_package_destinations_are_grouped(self):
+        cfg = _config(packages={"Core": {"sources": [
+            {"source": "a.dll", "destination": "$INSTDIR\\lib"},
+            {"source": "readme.txt", "destination": "$INSTDIR"},
+            {"source": "b.dll", "destination": "$INSTDIR\\lib"},
+        ]}})
+        plan = _plan(cfg)
+        stats = optimize_plan(plan)
+        assert iter_components(plan.components)[0].ops == [
+            SetOutPath("$INSTDIR\\lib"),
+            CopyFile("a.dll"),
+            CopyFile("b.dll"),
+            SetOutPath("$INSTDIR"),
+            CopyFile("readme.txt"),
+        ]
+        assert stats.set_out_path == 1
+
+    def test_recursive_copies_and_downloads_are_barriers(self):
+        cfg = _config(files=[
+            {"source": "a.exe", "destination": "$INSTDIR"},
+            {"source": "data/**/*", "destination": "$INSTDIR\\data"},
+            {"source": "b.exe", "destination": "$INSTDIR"},
+            {"source": "https://example.com/x.zip", "destination": "$INSTDIR"},
+        ])
+        plan = _plan(cfg)
+        before = list(plan.files)
+        optimize_plan(plan)
+        assert plan.files == before
+        assert isinstance(plan.files[-1], Download)
+
+
+class TestRegistryPasses:
+    def test_writes_grouped_by_view(self):
+        cfg = _config(install={"registry_entries": [
+            {"hive": "HKLM", "key": "K", "name": "a", "value": "1", "view": "64"},
+            {"hive": "HKLM", "key": "K", "name": "b", "value": "2", "view": "32"},
+            {"hive": "HKLM", "key": "K", "name": "c", "value": "3", "view": "64"},
+        ]})
+        plan = _plan(cfg)
+        stats = optimize_plan(plan)
+        assert [op.name for op in plan.registry] == ["a", "c", "b"]
+        assert stats.set_reg_view == 2
+
+    def test_same_value_in_two_views_keeps_order(self):
+        cfg = _config(install={"registry_entries": [
+            {"hive": "HKLM", "key": "K", "name": "a", "value": "1", "view": "64"},
+            {"hive": "HKLM", "key": "K", "name": "A", "value": "2", "view": "32"},
+            {"hive": "HKLM", "key": "K", "name": "c", "value": "3", "view": "64"},
+        ]})
+        plan = _plan(cfg)
+        stats = optimize_plan(plan)
+        assert [op.name for op in plan.registry] == ["a", "A", "c"]
+        assert stats.set_reg_view == 0
+
+    def test_shared_prog_id_written_once(self):
+        assoc = {"prog_id": "OptApp.Doc", "description": "Doc", "application": "$INSTDIR\\app.exe"}
+        cfg = _config(install={"file_associations": [
+            dict(assoc, extension=".foo"),
+            dict(assoc, extension=".bar"),
+        ]})
+        script = YamlToNsisConverter(cfg, optimize=True).convert()
+        assert script.count('"OptApp.Doc" "" "Doc"') == 1
+        assert script.count('\\Shell\\Open\\Command"') == 1
+        assert 'HKCR ".bar" "" "OptApp.Doc"' in script
+
+
+class TestOptimizeOption:
+    def test_only_applied_when_enabled(self):
+        cfg = _config(install={"registry_entries": [
+            {"hive": "HKLM", "key": "K", "name": "a", "value": "1", "view": "64"},
+            {"hive": "HKLM", "key": "K", "name": "b", "value": "2", "view": "32"},
+            {"hive": "HKLM", "key": "K", "name": "c", "value": "3", "view": "64"},
+        ]})
+
+        def _custom_block(script: str) -> str:
+            return script.split("; Custom registry entries", 1)[1].split("\n\n", 1)[0]
+
+        plain = _custom_block(YamlToNsisConverter(cfg).convert())
+        optimized = _custom_block(YamlToNsisConverter(cfg, optimize=True).convert())
+        assert plain.count("SetRegView 64") == 2
+        assert optimized.count("SetRegView 64") == 1
+
+    def test_cli_reports_removed_operations(self, tmp_path, capsys):
+        cfg = tmp_path / "installer.yaml"
+        cfg.write_text(
+            "app:\n  name: OptApp\n  version: '1.0'\n  publisher: Pub\n"
+            "packages:\n  Core:\n    sources:\n"
+            "      - source: a.dll\n        destination: $INSTDIR\\lib\n"
+            "      - source: b.dll\n        destination: $INSTDIR\\lib\n",
+            encoding="utf-8",
+        )
+        main(["convert", str(cfg), "-O", "-o", str(tmp_path / "out.nsi")])
+        out = capsys.readouterr().out
+        assert "Optimizer removed 1 runtime operations (SetOutPath: 1," in out
+        assert (tmp_path / "out.nsi").read_text(encoding="utf-8-sig").count("SetOutPath \"$INSTDIR\\lib\"") == 1
@@ -0,0 +1,92 @@
+"""Tests for the package index shared by the package generators."""
+
+from __future__ import annotations
+
+from ypack.config import PackageConfig
+from ypack.converters.context import BuildContext
+from ypack.converters.convert_nsis import YamlToNsisConverter
+from ypack.converters.ir import iter_components
+
+
+def _config() -> PackageConfig:
+    return PackageConfig.from_dict({
+        "app": {"name": "IdxApp", "version": "1.0"},
+        "install": {},
+        "files": ["app.exe"],
+        "packages": {
+            "Core": {"sources": ["core/*"]},
+            "Extras": {"children": {
+                "Docs": {"sources": ["docs/*"], "optional": True, "default": False},
+                "Nested": {"children": {
+                    "Samples": {"sources": ["samples/*"], "optional": True},
+                }},
+            }},
+            "Tools": {"sources": ["tools/*"], "destination": "$INSTDIR\\tools"},
+        },
+    })
+
+
+class TestPackageIndex:
+    def test_pre_order_with_links(self):
+        index = BuildContext(_config()).packages
+        assert [n.name for n in index.nodes] == ["Core", "Extras", "Docs", "Nested", "Samples", "Tools"]
+        assert index.roots == (0, 1, 5)
+        extras = index[1]
+        assert [c.name for c in index.children_of(extras)] == ["Docs", "Nested"]
+        assert index[4].parent == 3 and index[4].depth == 2
+        assert [n.name for n in index.subtree(extras)] == ["Extras", "Docs", "Nested", "Samples"]
+
+    def test_section_ids_and_flags_on_leaves(self):
+        index = BuildContext(_config()).packages
+        assert [(n.name, n.section_id, n.init_flags) for n in index.leaves] == [
+            ("Core", "SEC_PKG_0", "${SF_SELECTED}"),
+            ("Docs", "SEC_PKG_1", "0"),
+            ("Samples", "SEC_PKG_2", None),
+            ("Tools", "SEC_PKG_3", "${SF_SELECTED}"),
+        ]
+        assert index[1].section_id is None and index[1].is_group
+
+    def test_built_once_per_context(self):
+        ctx = BuildContext(_config())
+        assert ctx.packages is ctx.packages
+
+    def test_generators_agree_on_ids(self):
+        cfg = _config()
+        ctx = BuildContext(cfg)
+        assert [c.section_id for c in iter_components(ctx.plan.components)] == [
+            n.section_id for n in ctx.packages.leaves
+        ]
+        script = YamlToNsisConverter(cfg).convert()
+        assert 'Section "Docs" SEC_PKG_1' in script
+        assert "SectionSetFlags ${SEC_PKG_1} 0" in script
+        assert "SEC_PKG_2}" not in script
+        assert 'RMDir /r "$INSTDIR\\tools"' in script
+
+
+class TestDeepTrees:
+    def _deep(self, depth: int) -> dict:
+        packages: dict = {}
+        level = packages
+        for d in range(depth):
+            level[f"Leaf{d}"] = {"sources": [f"l{d}.dll"]}
+            group: dict = {"children": {}}
+            level[f"Level{d}"] = group
+            level = group["children"]
+        level["Bottom"] = {"sources": ["bottom.dll"]}
+        return {"app": {"name": "Deep", "version": "1"}, "install": {}, "packages": packages}
+
+    def test_deeper_than_recursion_limit(self):
+        import sys
+
+        depth = sys.getrecursionlimit() + 100
+        cfg = PackageConfig.from_dict(self._deep(depth))
+        ctx = BuildContext(cfg)
+        assert len(ctx.packages.leaves) == depth + 1
+        assert ctx.packages.leaves[-1].depth == depth
+        script = YamlToNsisConverter(cfg).convert()
+        assert script.count("SectionGroupEnd") == depth
+        assert f'Section "Bottom" SEC_PKG_{depth}' in script
+
+    def test_children_keep_config_order(self):
+        cfg = PackageConfig.from_dict(self._deep(3))
+        assert [c.name for c in cfg.packages[1].children] == ["Leaf1", "Level1"]
@@ -0,0 +1,277 @@
+"""Tests for the payload index (``converters/payload.py``)."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+
+import pytest
+
+from ypack.config import PackageConfig
+from ypack.converters import YamlToNsisConverter
+from ypack.converters.context import SharedBuild, locate
+from ypack.converters.payload import PayloadIndex, local_sources, split_source
+from ypack.converters.payload_filter import PayloadFilter
+from ypack.converters.payload_hash import HASH_ALGORITHMS, HashCache, hash_files
+from ypack.converters.payload_store import PayloadStore, load_store, save_store
+
+from .helpers import ROOT, build_path, memory_fs
+
+
+@pytest.fixture()
+def payload(tmp_path):
+    for rel, size in (("app.exe", 3), ("lib/a.dll", 5), ("lib/sub/b.dll", 7), ("lib/readme.txt", 1)):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+    return tmp_path
+
+
+def _index(base, *sources, previous=None):
+    return PayloadIndex(sources, lambda path: locate(path, str(base)), previous=previous)
+
+
+class TestSplitSource:
+    @pytest.mark.parametrize("source, expected", [
+        ("lib/*", ("lib", "*", False)),
+        ("lib/**/*.dll", ("lib", "*.dll", True)),
+        ("lib\\**", ("lib", "*", True)),
+        ("app.exe", ("app.exe", "", False)),
+    ])
+    def test_split(self, source, expected):
+        assert split_source(source, False) == expected
+
+
+class TestExpand:
+    def test_single_file(self, payload):
+        [(rel, file)] = _index(payload, ("app.exe", False)).expand("app.exe")
+        assert rel == "app.exe"
+        assert file.size == 3 and file.mtime_ns == os.stat(payload / "app.exe").st_mtime_ns
+
+    def test_recursive_pattern_sorted(self, payload):
+        index = _index(payload, ("lib/*", True))
+        assert [rel for rel, _ in index.expand("lib/*", True)] == ["a.dll", "readme.txt", "sub/b.dll"]
+
+    def test_flat_pattern(self, payload):
+        index = _index(payload, ("lib/*.dll", False))
+        assert [rel for rel, _ in index.expand("lib/*.dll")] == ["a.dll"]
+
+    def test_directory_installs_as_subdirectory(self, payload):
+        index = _index(payload, ("lib", False))
+        assert [rel for rel, _ in index.expand("lib")] == ["lib/a.dll", "lib/readme.txt", "lib/sub/b.dll"]
+
+    def test_nested_roots_share_one_walk(self, payload):
+        index = _index(payload, ("lib/**", True), ("lib/sub/*", True), ("lib/*.txt", False))
+        assert [rel for rel, _ in index.expand("lib/sub/*", True)] == ["b.dll"]
+        assert [rel for rel, _ in index.expand("lib/*.txt")] == ["readme.txt"]
+        assert len(index.files) == 3
+
+    def test_missing_and_unknown_sources_are_empty(self, payload):
+        index = _index(payload, ("nope/*", True), ("gone.exe", False))
+        assert index.expand("nope/*", True) == []
+        assert index.expand("gone.exe") == []
+        assert index.expand("never-indexed") == []
+
+    def test_sizes_and_lazy_hash(self, payload):
+        index = _index(payload, ("app.exe", False), ("lib/**", True))
+        assert index.total_size == 16
+        assert index.source_size("lib/**", True) == 13
+        file = index.files[str(payload / "app.exe")]
+        assert file._sha256 is None
+        assert file.sha256(index.fs) == hashlib.sha256(b"xxx").hexdigest()
+
+    def test_hash_reads_through_the_index_filesystem(self):
+        fs = memory_fs({"app.exe": b"in memory"})
+        index = PayloadIndex([("app.exe", False)], lambda path: locate(path, ROOT, fs), fs=fs)
+        file = index.files[build_path("app.exe")]
+        assert file.sha256(index.fs) == hashlib.sha256(b"in memory").hexdigest()
+
+
+class TestContextPayload:
+    def test_local_sources_match_plan(self, payload):
+        cfg = PackageConfig.from_dict({
+            "app": {"name": "P", "version": "1"},
+            "install": {},
+            "files": ["app.exe", "https://example.com/x.zip", {"source": "lib", "recursive": True}],
+            "packages": {"G": {"children": {"Docs": {"sources": ["lib/**/*.txt"]}}}},
+        })
+        assert list(local_sources(cfg)) == [
+            ("app.exe", False, None), ("lib", True, None), ("lib/**/*.txt", True, None),
+        ]
+
+    def test_built_once_and_shared(self, payload):
+        cfg = PackageConfig.from_dict({"app": {"name": "P", "version": "1"}, "install": {}, "files": ["app.exe"]})
+        cfg._config_dir = str(payload)
+        conv = YamlToNsisConverter(cfg)
+        assert conv.ctx.payload is conv.ctx.payload
+        assert conv.ctx.payload is conv.ctx.shared.payload
+        assert conv.ctx.payload.total_size == 3
+
+
+class TestPayloadStore:
+    SOURCES = (("app.exe", False), ("lib", True))
+
+    def _saved(self, payload, tmp_path_factory):
+        index = _index(payload, *self.SOURCES)
+        index.files[str(payload / "lib" / "a.dll")].sha256(index.fs)
+        store = str(tmp_path_factory.mktemp("store") / "payload.idx")
+        save_store(index, store)
+        return index, store
+
+    def test_round_trip(self, payload, tmp_path_factory):
+        index, store = self._saved(payload, tmp_path_factory)
+        with PayloadStore(store) as loaded:
+            assert len(loaded) == len(index.files)
+            assert set(loaded.singles()) == {str(payload / "app.exe")}
+            listing = loaded.directory(str(payload / "lib"))
+            assert sorted(listing.files) == ["a.dll", "readme.txt"]
+            assert listing.subdirs == ["sub"]
+            assert listing.files["a.dll"].known_sha256 == hashlib.sha256(b"x" * 5).hexdigest()
+            assert loaded.directory(str(payload / "lib" / "sub")).files["b.dll"].size == 7
+            assert loaded.directory(str(payload / "missing")) is None
+
+    def test_unchanged_tree_is_reused(self, payload, tmp_path_factory):
+        index, store = self._saved(payload, tmp_path_factory)
+        with PayloadStore(store) as previous:
+            again = _index(payload, *self.SOURCES, previous=previous)
+        assert again.stats == {"dirs_scanned": 0, "dirs_reused": 2, "dirs_pruned": 0, "hashes_reused": 1}
+        assert [r for r, _ in again.expand("lib", True)] == [r for r, _ in index.expand("lib", True)]
+
+    def test_edited_file_drops_its_hash(self, payload, tmp_path_factory):
+        _, store = self._saved(payload, tmp_path_factory)
+        target = payload / "lib" / "a.dll"
+        target.write_bytes(b"y" * 9)
+        os.utime(target, ns=(1, 1))
+        with PayloadStore(store) as previous:
+            again = _index(payload, *self.SOURCES, previous=previous)
+        file = again.files[str(target)]
+        assert file.size == 9 and file.known_sha256 is None
+        assert again.stats["hashes_reused"] == 0
+
+    def test_new_file_rescans_its_directory(self, payload, tmp_path_factory):
+        _, store = self._saved(payload, tmp_path_factory)
+        sub = payload / "lib" / "sub"
+        (sub / "c.dll").write_bytes(b"z")
+        os.utime(sub, ns=(1, 1))
+        with PayloadStore(store) as previous:
+            again = _index(payload, *self.SOURCES, previous=previous)
+        assert again.stats["dirs_scanned"] == 1 and again.stats["dirs_reused"] == 1
+        assert str(sub / "c.dll") in again.files
+
+    def test_unreadable_store_is_ignored(self, tmp_path):
+        bad = tmp_path / "payload.idx"
+        bad.write_bytes(b"not an index")
+        assert load_store(str(bad)) is None
+        assert load_store(str(tmp_path / "missing.idx")) is None
+
+
+class TestHashing:
+    def test_algorithms(self, payload):
+        path = str(payload / "lib" / "a.dll")
+        for algorithm in HASH_ALGORITHMS:
+            assert hash_files([path], algorithm) == {path: hashlib.new(algorithm, b"x" * 5).hexdigest()}
+        with pytest.raises(ValueError, match="Unsupported hash algorithm"):
+            hash_files([path], "crc32")
+
+    def test_missing_files_are_left_out(self, payload):
+        assert hash_files([str(payload / "nope")]) == {}
+
+    def test_cache_round_trip(self, payload, tmp_path_factory):
+        db = str(tmp_path_factory.mktemp("cache") / "hashes.db")
+        path = str(payload / "app.exe")
+        with HashCache(db) as cache:
+            first = hash_files([path], "md5", cache=cache)
+            assert (cache.hits, cache.misses) == (0, 1)
+        with HashCache(db) as cache:
+            assert hash_files([path], "md5", cache=cache) == first
+            assert (cache.hits, cache.misses) == (1, 0)
+            (payload / "app.exe").write_bytes(b"changed")
+            assert hash_files([path], "md5", cache=cache)[path] == hashlib.md5(b"changed").hexdigest()
+            assert cache.misses == 1
+
+    def test_foreign_file_is_left_alone(self, payload, tmp_path):
+        db = tmp_path / "hashes.db"
+        db.write_bytes(b"not sqlite" * 100)
+        with HashCache(str(db)) as cache:
+            assert hash_files([str(payload / "app.exe")], cache=cache)
+            assert cache.misses == 1
+        assert db.read_bytes() == b"not sqlite" * 100
+
+    def test_index_keeps_sha256(self, payload):
+        index = _index(payload, ("lib", True))
+        digests = index.hashes()
+        assert len(digests) == 3
+        assert all(f.known_sha256 == digests[p] for p, f in index.files.items())
+
+    def test_shared_build_hashes_once(self, payload, tmp_path_factory):
+        cfg = PackageConfig.from_dict({"app": {"name": "P", "version": "1"}, "install": {}, "files": ["app.exe"]})
+        cfg._config_dir = str(payload)
+        db = str(tmp_path_factory.mktemp("cache") / "hashes.db")
+        shared = SharedBuild(cfg, hash_cache=db)
+        assert shared.hashes("sha1") is shared.hashes("sha1")
+        assert shared.save_hashes().misses == 1
+        assert SharedBuild(cfg, hash_cache=db).hashes("sha1") == shared.hashes("sha1")
+
+
+class TestPayloadFilter:
+    @pytest.mark.parametrize("rel, is_dir, excluded", [
+        ("a.pdb", False, True),
+        ("x/y.pdb", False, True),
+        ("x/keep.pdb", False, False),
+        ("x/__pycache__", True, True),
+        ("__pycache__", False, False),
+        ("dist", True, True),
+        ("x/dist", True, False),
+        ("build/a/b.txt", False, True),
+        ("build", True, False),
+        ("c.txt", False, False),
+    ])
+    def test_gitignore_rules(self, rel, is_dir, excluded):
+        flt = PayloadFilter(["*.pdb", "!keep.pdb", "__pycache__/", "/dist", "build/**"])
+        if is_dir:
+            assert flt.excludes_dir(rel) is excluded
+        else:
+            assert flt.accepts_file(rel, 1) is not excluded
+
+    def test_include_and_sizes(self):
+        flt = PayloadFilter(include=["*.dll", "bin/*.exe"], min_size=2, max_size=10)
+        assert [r for r in ("a.dll", "x/a.dll", "bin/a.exe", "x/bin/a.exe", "a.exe") if flt.accepts_file(r, 5)] == [
+            "a.dll", "x/a.dll", "bin/a.exe",
+        ]
+        assert not flt.accepts_file("a.dll", 1)
+        assert not flt.accepts_file("a.dll", 11)
+
+    def test_combine(self):
+        combined = PayloadFilter.combine(PayloadFilter(["*.a"], max_size=5), None, PayloadFilter(["!x.a"], max_size=3))
+        assert combined == PayloadFilter(["*.a", "!x.a"], max_size=3)
+        assert combined.accepts_file("x.a", 1) and not combined.accepts_file("y.a", 1)
+        assert PayloadFilter.combine(None, PayloadFilter()) is None
+
+    def test_walk_prunes_excluded_directories(self, payload):
+        (payload / "lib" / "__pycache__").mkdir()
+        (payload / "lib" / "__pycache__" / "m.pyc").write_bytes(b"x")
+        flt = PayloadFilter(["__pycache__/", "*.txt"])
+        index = _index(payload, ("lib", True, flt))
+        assert index.stats["dirs_pruned"] == 1
+        assert str(payload / "lib" / "__pycache__") not in index.dirs
+        assert [r for r, _ in index.expand("lib", True, flt)] == ["lib/a.dll", "lib/sub/b.dll"]
+
+    def test_shared_directories_follow_each_source(self, payload):
+        # The second source keeps lib/sub listed; the first still skips it.
+        skip_sub = PayloadFilter(["sub/"])
+        index = _index(payload, ("lib/**", True, skip_sub), ("lib/sub/*", False))
+        assert index.stats["dirs_pruned"] == 0
+        assert [r for r, _ in index.expand("lib/**", True, skip_sub)] == ["a.dll", "readme.txt"]
+        assert [r for r, _ in index.expand("lib/sub/*", False)] == ["b.dll"]
+
+    def test_config_filters_reach_the_plan(self, payload):
+        cfg = PackageConfig.from_dict({
+            "app": {"name": "P", "version": "1"},
+            "install": {},
+            "filters": {"exclude": ["*.txt"]},
+            "files": [{"source": "lib/**", "max_size": 6}],
+        })
+        cfg._config_dir = str(payload)
+        script = YamlToNsisConverter(cfg).convert()
+        assert 'File "lib\\a.dll"' in script
+        assert "File /r" not in script and "readme.txt" not in script and "b.dll" not in script
@@ -162,3 +162,15 @@ class TestCreateResolver:
     def test_target_tool_wix(self):
         r = create_resolver({"variables": {}}, "wix")
         assert r.registry.target_tool == "wix"
+
+    def test_shared_reference_cache_across_tools(self):
+        config = {"app": {"name": "Demo"}, "install": {"install_dir": "$PROGRAMFILES64\\${app.name}"}}
+        cache = {}
+        nsis = create_resolver(config, "nsis", cache)
+        inno = create_resolver(config, "inno", cache)
+        assert nsis.resolve("${install.install_dir}") == "$PROGRAMFILES64\\Demo"
+        assert "${install.install_dir}" in cache
+        seen = []
+        inno.on_lookup = lambda ref, value: seen.append(ref)
+        assert inno.resolve("${install.install_dir}") == "{pf64}\\Demo"
+        assert seen == ["install.install_dir", "app.name"]
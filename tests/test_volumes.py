@@ -0,0 +1,142 @@
+"""Tests for shipping oversized payload files in volumes (``volumes.py``)."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+
+from ypack.cli import main
+from ypack.converters.fragments import FragmentCache
+from ypack.converters.ir import CopyExternal, CopyFile, SetOutPath, iter_components
+from ypack.converters.volumes import pick_external, write_volumes
+
+from .helpers import MemoryBuild, app_config, build_path
+
+LIMIT = 1000
+MODEL = bytes(range(256)) * 10  # 2560 bytes: three volumes
+MODEL_SHA = hashlib.sha256(MODEL).hexdigest()
+
+
+FILES = {
+    "bin/app.exe": b"app",
+    "data/model.bin": MODEL,
+    "data/vocab.txt": b"v" * 100,
+    "extra/notes.txt": b"n" * 10,
+}
+
+CONFIG = app_config(
+    "BigApp",
+    files=[{"source": "bin/*"}, {"source": "data/**", "destination": "$INSTDIR\\data"}],
+    packages={
+        "Extra": {"optional": True, "sources": [{"source": "extra/*", "destination": "$INSTDIR\\extra"}]},
+    },
+)
+
+
+class TestPickExternal:
+    def test_oversized_files(self):
+        assert pick_external({"a": 1500, "b": 10, "c": 1200}, LIMIT) == ["a", "c"]
+
+    def test_largest_until_the_rest_fits(self):
+        assert pick_external({"a": 600, "b": 500, "c": 300}, LIMIT) == ["a"]
+        assert pick_external({"a": 600, "b": 400}, LIMIT) == []
+
+
+class TestPlan:
+    def test_oversized_file_ships_in_volumes(self):
+        ctx = MemoryBuild(CONFIG, FILES).context(volume_limit=LIMIT)
+        external = CopyExternal(build_path("data/model.bin"), f"volumes\\{MODEL_SHA[:16]}", 3, len(MODEL), MODEL_SHA)
+        assert external in ctx.plan.files
+        # Only the source holding it is expanded.
+        assert CopyFile(build_path("data/vocab.txt")) in ctx.plan.files
+        assert CopyFile("bin/*") in ctx.plan.files
+        stats = ctx.volume_stats
+        assert (stats.files, stats.bytes, stats.volumes) == (1, len(MODEL), 3)
+
+    def test_total_payload_over_the_limit(self):
+        build = MemoryBuild(CONFIG, FILES)
+        build.fs.add_file(build_path("data/model.bin"), b"m" * 900)
+        ctx = build.context(volume_limit=LIMIT)
+        assert [op.source for op in ctx.plan.files if isinstance(op, CopyExternal)] == [build_path("data/model.bin")]
+        assert ctx.volume_stats.volumes == 1
+
+    def test_package_files(self):
+        build = MemoryBuild(CONFIG, FILES)
+        build.fs.add_file(build_path("extra/weights.bin"), b"w" * 1500)
+        ctx = build.context(volume_limit=LIMIT)
+        extra = iter_components(ctx.plan.components)[0]
+        assert [op.volumes for op in extra.ops if isinstance(op, CopyExternal)] == [2]
+        assert CopyFile(build_path("extra/notes.txt")) in extra.ops
+
+    def test_only_installed_files_count(self):
+        # bin/ also holds a crash dump the *.dll source does not install.
+        payload = {"bin/app.dll": b"a" * 600, "bin/crash.dmp": b"c" * 500}
+        build = MemoryBuild(CONFIG, payload, files=[{"source": "bin/*.dll"}], packages={})
+        ctx = build.context(volume_limit=LIMIT)
+        assert ctx.volume_stats.files == 0
+        assert ctx.plan.files == [SetOutPath("$INSTDIR"), CopyFile("bin/*.dll")]
+
+    def test_off_without_limit(self):
+        ctx = MemoryBuild(CONFIG, FILES).context()
+        assert ctx.volume_stats is None
+        assert CopyFile("data/**", recursive=True) in ctx.plan.files
+
+
+class TestNsisOutput:
+    def test_joins_and_verifies_at_install_time(self):
+        script = MemoryBuild(CONFIG, FILES).convert(volume_limit=LIMIT)
+        assert (
+            f'  Push "$EXEDIR\\volumes\\{MODEL_SHA[:16]}"\n'
+            '  Push "3"\n'
+            '  Push "$OUTDIR\\model.bin"\n'
+            f'  Push "{MODEL_SHA}"\n'
+            "  Call _JoinVolume\n"
+        ) in script
+        assert 'File "data\\model.bin"' not in script
+        assert '!include "ypack_volume.nsh"' in script
+        assert script.count('!insertmacro YPackJoinVolume ""') == 1
+
+    def test_small_payload_is_unchanged(self):
+        build = MemoryBuild(CONFIG, FILES)
+        build.fs.add_file(build_path("data/model.bin"), b"small")
+        script = build.convert(volume_limit=LIMIT)
+        assert 'File /r "data\\**"' in script
+        assert "ypack_volume.nsh" not in script and "_JoinVolume" not in script
+
+    def test_fragment_cache_sees_new_content(self):
+        build = MemoryBuild(CONFIG, FILES)
+        cache = FragmentCache()
+        build.convert(volume_limit=LIMIT, fragment_cache=cache)
+        build.fs.add_file(build_path("data/model.bin"), MODEL[::-1])
+        script = build.convert(volume_limit=LIMIT, fragment_cache=cache)
+        assert hashlib.sha256(MODEL[::-1]).hexdigest() in script
+        assert MODEL_SHA not in script
+
+
+class TestWriteVolumes:
+    def test_splits_and_skips_current_volumes(self, tmp_path):
+        build = MemoryBuild(CONFIG, FILES)
+        ops = [op for op in build.context(volume_limit=LIMIT).plan.files if isinstance(op, CopyExternal)]
+        written, unchanged = write_volumes(build.fs, ops, LIMIT, str(tmp_path))
+        names = [f"{MODEL_SHA[:16]}.{i:03d}" for i in (1, 2, 3)]
+        assert written == [str(tmp_path / "volumes" / name) for name in names]
+        assert unchanged == []
+        parts = [(tmp_path / "volumes" / name).read_bytes() for name in names]
+        assert [len(part) for part in parts] == [1000, 1000, 560]
+        assert b"".join(parts) == MODEL
+        assert write_volumes(build.fs, ops, LIMIT, str(tmp_path)) == ([], written)
+
+
+class TestCli:
+    def test_volume_size(self, tmp_path, capsys):
+        (tmp_path / "data").mkdir()
+        (tmp_path / "data" / "model.bin").write_bytes(MODEL)
+        cfg = tmp_path / "installer.yaml"
+        cfg.write_text("app:\n  name: B\n  version: '1'\ninstall: {}\nfiles:\n  - source: data/*\n", encoding="utf-8")
+        main(["convert", str(cfg), "--volume-size", "1K", "-o", str(tmp_path / "o.nsi"), "-v"])
+        out = capsys.readouterr().out
+        assert "Volume files: 3 written, 0 unchanged" in out
+        assert "Volumes: 1 files (2,560 bytes) too large for the installer, shipped in 3 volumes" in out
+        volumes = sorted(os.listdir(tmp_path / "volumes"))
+        assert volumes == [f"{MODEL_SHA[:16]}.{i:03d}" for i in (1, 2, 3)]
+        assert b"".join((tmp_path / "volumes" / name).read_bytes() for name in volumes) == MODEL
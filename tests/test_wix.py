@@ -0,0 +1,134 @@
+"""Tests for the WiX backend (``convert_wix.py`` and its harvester)."""
+
+from __future__ import annotations
+
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from ypack.config import PackageConfig
+from ypack.converters import CONVERTER_REGISTRY, YamlToWixConverter
+
+_NS = {"w": "http://wixtoolset.org/schemas/v4/wxs"}
+
+
+@pytest.fixture()
+def payload(tmp_path):
+    for rel in ("app.exe", "lib/a.dll", "lib/sub/b.dll", "lib/readme.txt"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x", encoding="utf-8")
+    return tmp_path
+
+
+def _convert(base, **overrides) -> str:
+    data = {
+        "app": {"name": "WixApp", "version": "2.1.0-beta", "publisher": "Acme"},
+        "install": {"desktop_shortcut_target": "app.exe"},
+        "files": ["app.exe", {"source": "lib/*", "destination": "$INSTDIR\\lib", "recursive": True}],
+    }
+    data.update(overrides)
+    cfg = PackageConfig.from_dict(data)
+    cfg._config_dir = str(base)
+    return YamlToWixConverter(cfg).convert()
+
+
+def _files(xml: str):
+    root = ET.fromstring(xml.encode("utf-8"))
+    return {f.get("Source"): f for f in root.iter(f"{{{_NS['w']}}}File")}
+
+
+class TestHarvest:
+    def test_recursive_glob_keeps_subdirectories(self, payload):
+        sources = set(_files(_convert(payload)))
+        assert sources == {"app.exe", "lib\\a.dll", "lib\\readme.txt", "lib\\sub\\b.dll"}
+
+    def test_pattern_filters_every_level(self, payload):
+        xml = _convert(payload, files=[{"source": "lib/**/*.dll"}])
+        assert set(_files(xml)) == {"lib\\a.dll", "lib\\sub\\b.dll"}
+
+    def test_missing_file_still_referenced(self, tmp_path):
+        assert "missing.exe" in _files(_convert(tmp_path, files=["missing.exe"]))
+
+
+class TestWixDocument:
+    def test_registered(self):
+        assert CONVERTER_REGISTRY["wix"] is YamlToWixConverter
+
+    def test_package_element(self, payload):
+        root = ET.fromstring(_convert(payload).encode("utf-8"))
+        package = root.find("w:Package", _NS)
+        assert package.get("Name") == "WixApp"
+        assert package.get("Version") == "2.1.0"
+        assert package.find("w:MajorUpgrade", _NS) is not None
+
+    def test_output_is_deterministic(self, payload):
+        assert _convert(payload) == _convert(payload)
+
+    def test_component_guid_stable_across_versions(self, payload):
+        def guids(version):
+            xml = _convert(payload, app={"name": "WixApp", "version": version, "publisher": "Acme"})
+            root = ET.fromstring(xml.encode("utf-8"))
+            return sorted(c.get("Guid") for c in root.iter(f"{{{_NS['w']}}}Component"))
+        assert guids("1.0") == guids("2.0")
+
+    def test_directories_nest(self, payload):
+        root = ET.fromstring(_convert(payload).encode("utf-8"))
+        install = next(d for d in root.iter(f"{{{_NS['w']}}}Directory") if d.get("Id") == "INSTALLDIR")
+        lib = install.find("w:Directory[@Name='lib']", _NS)
+        assert lib.find("w:Directory[@Name='sub']", _NS) is not None
+        b_dll = _files(_convert(payload))["lib\\sub\\b.dll"]
+        component = next(
+            c for c in root.iter(f"{{{_NS['w']}}}Component")
+            if c.find("w:File", _NS) is not None and c.find("w:File", _NS).get("Id") == b_dll.get("Id")
+        )
+        assert component.get("Directory") == lib.find("w:Directory[@Name='sub']", _NS).get("Id")
+
+    def test_shortcut_target_not_prefixed_twice(self, payload):
+        xml = _convert(payload)
+        assert 'Target="[INSTALLDIR]app.exe"' in xml
+
+    def test_optional_package_feature_level(self, payload):
+        xml = _convert(payload, packages={
+            "Docs": {"sources": ["lib/readme.txt"], "optional": True, "default": False},
+            "Core": {"sources": ["app.exe"]},
+        })
+        assert '<Feature Id="SEC_PKG_0" Title="Docs" Level="2">' in xml
+        assert '<Feature Id="SEC_PKG_1" Title="Core" Level="1" AllowAbsent="no">' in xml
+
+    def test_download_marked_unsupported(self, payload):
+        xml = _convert(payload, files=[{"source": "https://example.com/x.zip"}])
+        assert "[UNSUPPORTED by wix] download https://example.com/x.zip" in xml
+
+    def test_path_appends_get_unique_ids(self, payload):
+        xml = _convert(payload, install={"env_vars": [
+            {"name": "PATH", "value": "$INSTDIR\\bin", "scope": "system", "append": True},
+            {"name": "PATH", "value": "$INSTDIR\\tools", "scope": "system", "append": True},
+        ]})
+        root = ET.fromstring(xml.encode("utf-8"))
+        ids = [env.get("Id") for env in root.iter(f"{{{_NS['w']}}}Environment")]
+        assert len(ids) == 2
+        assert len(set(ids)) == 2
+
+    def test_no_empty_component_group(self, payload):
+        xml = _convert(payload, packages={
+            "Tools": {"sources": [], "post_install": ["setup.exe /quiet"]},
+        })
+        root = ET.fromstring(xml.encode("utf-8"))
+        groups = root.iter(f"{{{_NS['w']}}}ComponentGroup")
+        assert all(group.find("w:Component", _NS) is not None for group in groups)
+        assert "CG_SEC_PKG_0" not in xml
+        assert '<Feature Id="SEC_PKG_0" Title="Tools" Level="1" AllowAbsent="no" />' in xml
+        assert "[UNSUPPORTED by wix] post_install setup.exe /quiet" in xml
+
+    def test_save_writes_relative_sources(self, payload):
+        out = payload / "build" / "setup.wxs"
+        out.parent.mkdir()
+        cfg = PackageConfig.from_dict({
+            "app": {"name": "WixApp", "version": "1.0"}, "install": {}, "files": ["app.exe"],
+        })
+        cfg._config_dir = str(payload)
+        YamlToWixConverter(cfg).save(str(out))
+        assert "..\\app.exe" in _files(out.read_text(encoding="utf-8"))
+        assert os.path.exists(out)
@@ -11,14 +11,25 @@ validate  Validate a YAML configuration without generating output.
 from __future__ import annotations
 
 import argparse
+import io
 import os
 import subprocess
 import sys
 import textwrap
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TextIO
 
 from . import __version__
-from .converters import BUILD_COMMANDS, OUTPUT_EXTENSIONS, SUPPORTED_FORMATS, get_converter_class
+from .config import parse_size
+from .converters import (
+    BUILD_COMMANDS,
+    CONVERTER_REGISTRY,
+    OUTPUT_EXTENSIONS,
+    PIPE_BUILD_ARGS,
+    SUPPORTED_FORMATS,
+    get_converter_class,
+)
 
 
 # -----------------------------------------------------------------------
@@ -62,6 +73,23 @@ _INIT_TEMPLATE = textwrap.dedent("""\
 _FORMAT_CHOICES = SUPPORTED_FORMATS
 
 
+def _format_list(value: str) -> List[str]:
+    """``-f`` value parser: one format or a comma-separated list of them."""
+    formats: List[str] = []
+    for name in value.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in CONVERTER_REGISTRY:
+            available = ", ".join(sorted(CONVERTER_REGISTRY))
+            raise argparse.ArgumentTypeError(f"invalid format '{name}' (choose from {available})")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        raise argparse.ArgumentTypeError("expected at least one format")
+    return formats
+
+
 # -----------------------------------------------------------------------
 # CLI entry point
 # -----------------------------------------------------------------------
@@ -83,17 +111,56 @@ def main(argv: Optional[List[str]] = None) -> None:
     # -- convert ---------------------------------------------------------
     p_conv = sub.add_parser("convert", help="Convert YAML → installer script")
     p_conv.add_argument("config", help="Path to YAML configuration file")
-    p_conv.add_argument("-f", "--format", default="nsis", choices=_FORMAT_CHOICES,
-                        help="Target installer format (default: nsis)")
+    p_conv.add_argument("-f", "--format", default="nsis", type=_format_list, metavar="FMT[,FMT…]",
+                        help="Target installer format(s), comma-separated: "
+                             f"{', '.join(_FORMAT_CHOICES)} (default: nsis). Several formats share "
+                             "one parse of the configuration and are generated concurrently")
     p_conv.add_argument("-o", "--output", default=None,
-                        help="Output script path (default: <config_dir>/installer.<ext>)")
+                        help="Output script path (default: <config_dir>/installer.<ext>); with several "
+                             "formats each one is written next to it with its own extension")
     p_conv.add_argument("-b", "--build", action="store_true",
                         help="Build installer after script generation (format-specific)")
+    p_conv.add_argument("--pipe", action="store_true",
+                        help="Stream the script into the compiler's stdin while it is generated "
+                             "instead of writing a file (implies --build)")
     p_conv.add_argument("--makensis", default="makensis",
                         help="Path to makensis executable (NSIS only)")
     p_conv.add_argument("-v", "--verbose", action="store_true")
     p_conv.add_argument("-n", "--dry-run", action="store_true",
                         help="Print generated script to stdout instead of writing a file")
+    p_conv.add_argument("--fragment-cache", default=None, metavar="PATH",
+                        help="Reuse unchanged script fragments from this cache file between runs (NSIS only)")
+    p_conv.add_argument("--payload-index", default=None, metavar="PATH",
+                        help="Keep the payload index (file sizes, mtimes, hashes) in this file and refresh "
+                             "it incrementally on the next run instead of walking the payload from scratch")
+    p_conv.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="Render independent script sections on N worker processes "
+                             "(0 = one per CPU; output is identical to -j 1)")
+    p_conv.add_argument("-O", "--optimize", action="store_true",
+                        help="Remove redundant runtime operations (SetOutPath, SetRegView, …) "
+                             "from the generated script and report how many were removed (NSIS only)")
+    p_conv.add_argument("--expand-sources", action="store_true",
+                        help="List every payload file explicitly (sorted SetOutPath / File groups from the "
+                             "payload index) instead of File /r globs; the uninstaller deletes exactly "
+                             "those files (NSIS only)")
+    p_conv.add_argument("--dedupe", nargs="?", const="copy", choices=("copy", "hardlink"), default=None,
+                        help="Store files with identical content once and make the other copies at install "
+                             "time with CopyFiles (or hard links where the volume allows, with 'hardlink'); "
+                             "implies --expand-sources and reports the bytes saved (NSIS only)")
+    p_conv.add_argument("--hash-cache", default=None, metavar="PATH",
+                        help="Keep payload file hashes in this SQLite file so unchanged files are not "
+                             "read again on the next run (used by --dedupe)")
+    p_conv.add_argument("--volume-size", type=parse_size, default=None, metavar="SIZE",
+                        help="Largest file, and total payload, to keep inside the installer (default 2000M, "
+                             "below the makensis limit; 0 = no limit); larger payloads ship in volumes of at "
+                             "most SIZE under volumes/ next to the installer, joined and verified at install "
+                             "time (NSIS only)")
+    p_conv.add_argument("--split", action="store_true",
+                        help="Write each package and the uninstaller to its own .nsh under <output>.d/, "
+                             "rewriting only files whose content changed (NSIS only)")
+    p_conv.add_argument("--compact", action="store_true",
+                        help="Drop comments, blank lines and indentation and shorten internal labels "
+                             "in the generated script; reports the size reduction (NSIS only)")
     p_conv.add_argument("--installer-name", default=None,
                         help="Custom installer filename to use when building (overrides config.installer_name)")
 
@@ -141,43 +208,199 @@ def main(argv: Optional[List[str]] = None) -> None:
 
 def _cmd_convert(args: argparse.Namespace) -> None:
     from .config import PackageConfig
+    from .converters import SharedBuild
 
-    fmt: str = getattr(args, "format", "nsis")
+    formats = getattr(args, "format", "nsis")
+    if isinstance(formats, str):
+        formats = _format_list(formats)
+    multi = len(formats) > 1
 
     if not os.path.exists(args.config):
         print(f"Error: Configuration file '{args.config}' not found", file=sys.stderr)
         sys.exit(1)
 
-    # Determine default output path from format
-    if args.output is None:
-        config_dir = os.path.dirname(os.path.abspath(args.config))
-        ext = OUTPUT_EXTENSIONS.get(fmt, ".nsi")
-        args.output = os.path.join(config_dir, f"installer{ext}")
+    if multi and getattr(args, "pipe", False):
+        print("Error: --pipe streams a single script; choose one format", file=sys.stderr)
+        sys.exit(1)
+
+    outputs = _output_paths(args, formats)
+    # Single-format code paths (build helpers, messages) read args.output.
+    args.output = outputs[formats[0]]
 
     if args.verbose:
         print(f"Loading configuration from {args.config} …")
     config = PackageConfig.from_yaml(args.config)
 
-    converter_cls = get_converter_class(fmt)
-    if args.verbose:
-        print(f"Converting YAML → {fmt.upper()} …")
-    converter = converter_cls(config, config._raw_dict)
-
     # Apply CLI override of installer name if provided
     if getattr(args, "installer_name", None):
         config.install.installer_name = args.installer_name
 
+    if args.verbose:
+        print(f"Converting YAML → {', '.join(fmt.upper() for fmt in formats)} …")
+    options = _nsis_options(args, formats)
+    cache = options.get("fragment_cache")
+
+    # Parse and validation happened once above; the backends also share
+    # resolved ${...} references and the package index.
+    shared = SharedBuild(
+        config, config._raw_dict,
+        payload_store=getattr(args, "payload_index", None) or "",
+        hash_cache=getattr(args, "hash_cache", None) or "",
+    )
+    converters: Dict[str, Any] = {}
+    for fmt in formats:
+        converter_cls = get_converter_class(fmt)
+        fmt_options = options if fmt == "nsis" else {}
+        converters[fmt] = converter_cls(config, config._raw_dict, shared=shared, **fmt_options)  # type: ignore[arg-type]
+    nsis_converter = converters.get("nsis")
+
     if args.dry_run:
-        print(converter.convert())
+        scripts = _for_each(converters, lambda fmt, converter: (fmt, converter.convert()))
+        for fmt, script in scripts:
+            if multi:
+                print(f"==> {fmt.upper()} <==", file=sys.stderr)
+            print(script)
+        # Keep stdout a clean script.
+        _report_size_passes(options, nsis_converter, sys.stderr)
+        return
+
+    fmt = formats[0]
+    if getattr(args, "pipe", False):
+        # No script is written, but relative File / OutFile paths must
+        # resolve exactly as they would next to the -o script.
+        converters[fmt].ctx.output_dir = os.path.dirname(os.path.abspath(args.output))
+        if fmt == "nsis":
+            converters[fmt].write_support_files()
+        _build_piped(args, converters[fmt], config, fmt)
+        if cache is not None:
+            cache.save()
+        _report_size_passes(options, converters[fmt], sys.stdout)
+        _save_payload(shared, args.verbose)
+        _save_hashes(shared, args.verbose)
         return
 
     if args.verbose:
-        print(f"Writing {fmt.upper()} script to {args.output} …")
-    converter.save(args.output)
-    print(f"Generated {fmt.upper()} script: {args.output}")
+        for fmt in formats:
+            print(f"Writing {fmt.upper()} script to {outputs[fmt]} …")
+    # The saves below run concurrently; create their directories up front
+    # rather than relying on whichever backend happens to make its own.
+    for path in outputs.values():
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    _for_each(converters, lambda fmt, converter: converter.save(outputs[fmt]))
+    for fmt in formats:
+        print(f"Generated {fmt.upper()} script: {outputs[fmt]}")
+    if options.get("split") and args.verbose:
+        print(
+            f"Split output: {len(nsis_converter.files_written)} written, "  # type: ignore[union-attr]
+            f"{len(nsis_converter.files_unchanged)} unchanged, "  # type: ignore[union-attr]
+            f"{len(nsis_converter.files_removed)} removed"  # type: ignore[union-attr]
+        )
+    if nsis_converter is not None and args.verbose:
+        written, unchanged = nsis_converter.volumes_written, nsis_converter.volumes_unchanged
+        if written or unchanged:
+            print(f"Volume files: {len(written)} written, {len(unchanged)} unchanged")
+    _report_size_passes(options, nsis_converter, sys.stdout)
+    if cache is not None:
+        cache.save()
+        if args.verbose:
+            print(f"Fragment cache: {cache.hits} reused, {cache.misses} regenerated")
+    _save_payload(shared, args.verbose)
+    _save_hashes(shared, args.verbose)
 
     if args.build:
-        _build(args, config, fmt)
+        for fmt in formats:
+            _build(args, config, fmt, outputs[fmt])
+
+
+def _output_paths(args: argparse.Namespace, formats: List[str]) -> Dict[str, str]:
+    """Map each format to its script path.
+
+    A single format writes to ``-o`` as given.  With several, ``-o``
+    supplies the directory and stem and each format adds its extension.
+    """
+    if args.output is None:
+        stem = os.path.join(os.path.dirname(os.path.abspath(args.config)), "installer")
+    elif len(formats) == 1:
+        return {formats[0]: args.output}
+    else:
+        stem = os.path.splitext(args.output)[0]
+    return {fmt: stem + OUTPUT_EXTENSIONS.get(fmt, ".nsi") for fmt in formats}
+
+
+def _nsis_options(args: argparse.Namespace, formats: List[str]) -> Dict[str, Any]:
+    """Collect NSIS-specific generation options, warning when NSIS is not a target."""
+    options: Dict[str, Any] = {}
+    requested = [
+        ("fragment_cache", "--fragment-cache", getattr(args, "fragment_cache", None)),
+        ("jobs", "--jobs", getattr(args, "jobs", 1) != 1),
+        ("optimize", "--optimize", getattr(args, "optimize", False)),
+        ("compact", "--compact", getattr(args, "compact", False)),
+        ("split", "--split", getattr(args, "split", False)),
+        ("expand_sources", "--expand-sources", getattr(args, "expand_sources", False)),
+        ("dedupe", "--dedupe", getattr(args, "dedupe", None)),
+        ("volume_limit", "--volume-size", getattr(args, "volume_size", None) is not None),
+    ]
+    for key, flag, given in requested:
+        if not given:
+            continue
+        if "nsis" not in formats:
+            print(f"Warning: {flag} is not supported for format '{','.join(formats)}'", file=sys.stderr)
+        elif key == "fragment_cache":
+            from .converters.fragments import FragmentCache
+            options[key] = FragmentCache(args.fragment_cache)
+        elif key == "jobs":
+            options[key] = args.jobs
+        elif key == "dedupe":
+            options[key] = args.dedupe
+        elif key == "volume_limit":
+            options[key] = args.volume_size
+        elif key == "split" and (args.dry_run or getattr(args, "pipe", False)):
+            print("Warning: --split only applies when the script is written to disk", file=sys.stderr)
+        else:
+            options[key] = True
+    return options
+
+
+def _for_each(converters: Dict[str, Any], fn: Callable[[str, Any], Any]) -> List[Any]:
+    """Return ``[fn(fmt, converter), …]``, one thread per converter when there are several."""
+    if len(converters) < 2:
+        return [fn(fmt, converter) for fmt, converter in converters.items()]
+    with ThreadPoolExecutor(max_workers=len(converters)) as executor:
+        futures = [executor.submit(fn, fmt, converter) for fmt, converter in converters.items()]
+        return [future.result() for future in futures]
+
+
+def _report_size_passes(options: dict, converter: Any, stream: TextIO) -> None:
+    # *converter* is the NSIS converter (``None`` when it is not built).
+    if options.get("optimize"):
+        stats = converter.ctx.optimize_stats
+        print(f"Optimizer {stats.summary()}", file=stream)
+    if options.get("dedupe"):
+        dedupe = converter.ctx.dedupe_stats
+        print(f"Dedupe {dedupe.summary()}", file=stream)
+    volumes = converter.ctx.volume_stats if converter is not None else None
+    if volumes is not None and volumes.files:
+        print(f"Volumes: {volumes.summary()}", file=stream)
+    if options.get("compact"):
+        before = converter.bytes_before
+        after = converter.bytes_after
+        saved = 100.0 * (before - after) / before if before else 0.0
+        print(f"Compact output: {before:,} -> {after:,} bytes (-{saved:.1f}%)", file=stream)
+
+
+def _save_payload(shared: Any, verbose: bool) -> None:
+    if shared.save_payload() and verbose:
+        stats = shared.payload.stats
+        print(
+            f"Payload index: {stats['dirs_scanned']} directories scanned, "
+            f"{stats['dirs_reused']} reused, {stats['hashes_reused']} hashes kept"
+        )
+
+
+def _save_hashes(shared: Any, verbose: bool) -> None:
+    hash_cache = shared.save_hashes()
+    if hash_cache is not None and verbose:
+        print(f"Hash cache: {hash_cache.hits} reused, {hash_cache.misses} computed")
 
 
 def _cmd_init(args: argparse.Namespace) -> None:
@@ -214,8 +437,8 @@ def _cmd_validate(args: argparse.Namespace) -> None:
 # Build helper
 # -----------------------------------------------------------------------
 
-def _build(args: argparse.Namespace, config: object, fmt: str) -> None:
-    """Invoke the external compiler for *fmt* (currently NSIS only)."""
+def _build(args: argparse.Namespace, config: object, fmt: str, output: str) -> None:
+    """Invoke the external compiler for *fmt* on *output* (currently NSIS only)."""
     compiler_cmd = BUILD_COMMANDS.get(fmt)
     if compiler_cmd is None:
         print(f"Warning: --build is not yet supported for format '{fmt}'", file=sys.stderr)
@@ -229,20 +452,14 @@ def _build(args: argparse.Namespace, config: object, fmt: str) -> None:
         print(f"Building installer with {compiler_cmd} …")
     try:
         result = subprocess.run(
-            [compiler_cmd, args.output],
+            [compiler_cmd, output],
             capture_output=True,
             text=True,
             check=True,
         )
         if args.verbose:
             print(result.stdout)
-        # Determine installer filename (CLI override -> config -> default)
-        installer_name = getattr(args, "installer_name", None) or (config.install.installer_name or "")
-        if installer_name:
-            installer = installer_name
-        else:
-            installer = f"{config.app.name}-{config.app.version}-Setup.exe"  # type: ignore[attr-defined]
-        print(f"Built installer: {installer}")
+        print(f"Built installer: {_installer_filename(args, config)}")
     except FileNotFoundError:
         print(f"Error: {compiler_cmd} not found. Install {fmt.upper()} or specify the correct path.", file=sys.stderr)
         sys.exit(1)
@@ -252,5 +469,80 @@ def _build(args: argparse.Namespace, config: object, fmt: str) -> None:
         sys.exit(1)
 
 
+def _build_piped(args: argparse.Namespace, converter: object, config: object, fmt: str) -> None:
+    """Stream the generated script straight into the compiler's stdin.
+
+    No script file is written: chunks are fed to the compiler as they are
+    generated, so generation and parsing overlap.  The compiler runs in
+    the context's output directory, which makes relative ``File`` and
+    icon paths resolve exactly as they would next to a saved script.
+    """
+    compiler_cmd = BUILD_COMMANDS.get(fmt)
+    pipe_args = PIPE_BUILD_ARGS.get(fmt)
+    if compiler_cmd is None or pipe_args is None:
+        print(f"Error: --pipe is not supported for format '{fmt}'", file=sys.stderr)
+        sys.exit(1)
+
+    if fmt == "nsis":
+        compiler_cmd = getattr(args, "makensis", compiler_cmd)
+
+    cwd = converter.ctx.output_dir  # type: ignore[attr-defined]
+    if args.verbose:
+        print(f"Streaming {fmt.upper()} script into {compiler_cmd} (cwd: {cwd}) …")
+    try:
+        proc = subprocess.Popen(
+            [compiler_cmd, *pipe_args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+        )
+    except FileNotFoundError:
+        print(f"Error: {compiler_cmd} not found. Install {fmt.upper()} or specify the correct path.", file=sys.stderr)
+        sys.exit(1)
+
+    # Drain the compiler's output concurrently so a chatty compiler can
+    # never block on a full pipe while we are still writing the script.
+    captured: List[bytes] = [b"", b""]
+
+    def _drain(idx: int, pipe: object) -> None:
+        captured[idx] = pipe.read()  # type: ignore[attr-defined]
+
+    readers = [
+        threading.Thread(target=_drain, args=(0, proc.stdout), daemon=True),
+        threading.Thread(target=_drain, args=(1, proc.stderr), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+
+    assert proc.stdin is not None  # opened with stdin=PIPE
+    stdin = io.TextIOWrapper(proc.stdin, encoding="utf-8", newline="\n")
+    try:
+        converter.stream(stdin)  # type: ignore[attr-defined]
+        stdin.close()
+    except BrokenPipeError:
+        pass  # compiler exited early — its stderr explains why
+    returncode = proc.wait()
+    for t in readers:
+        t.join()
+
+    stdout, stderr = (b.decode("utf-8", errors="replace") for b in captured)
+    if returncode != 0:
+        print("Error building installer:", file=sys.stderr)
+        print(stderr or stdout, file=sys.stderr)
+        sys.exit(1)
+    if args.verbose:
+        print(stdout)
+    print(f"Built installer: {_installer_filename(args, config)}")
+
+
+def _installer_filename(args: argparse.Namespace, config: object) -> str:
+    """Determine installer filename (CLI override -> config -> default)."""
+    installer_name = getattr(args, "installer_name", None) or (config.install.installer_name or "")  # type: ignore[attr-defined]
+    if installer_name:
+        return installer_name
+    return f"{config.app.name}-{config.app.version}-Setup.exe"  # type: ignore[attr-defined]
+
+
 if __name__ == "__main__":
     main()
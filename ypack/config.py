@@ -14,6 +14,7 @@ except ImportError as e:
         "PyYAML is required. Install with: pip install PyYAML"
     ) from e
 
+import re
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass, field
 
@@ -353,6 +354,49 @@ class InstallConfig:
 # FileEntry / PackageEntry
 # ---------------------------------------------------------------------------
 
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(value: Any) -> int:
+    """Bytes from ``1048576``, ``"512K"``, ``"10MB"`` or ``"1.5 GiB"`` (binary units)."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    match = _SIZE_RE.match(str(value))
+    if match is None or isinstance(value, bool):
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+@dataclass
+class FilterConfig:
+    """Payload filter rules: gitignore-style patterns and a size range.
+
+    Read from the ``filters`` section (global) and from the same keys on
+    a file entry or package.  ``max_size`` 0 means no limit.
+    """
+    exclude: List[str] = field(default_factory=list)
+    include: List[str] = field(default_factory=list)
+    min_size: int = 0
+    max_size: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Any) -> FilterConfig:
+        if not isinstance(data, dict):
+            return cls()
+
+        def patterns(key: str) -> List[str]:
+            value = data.get(key, [])
+            return [value] if isinstance(value, str) else [str(p) for p in value]
+
+        return cls(
+            exclude=patterns("exclude"),
+            include=patterns("include"),
+            min_size=parse_size(data.get("min_size", 0)),
+            max_size=parse_size(data.get("max_size", 0)),
+        )
+
+
 @dataclass
 class FileEntry:
     """A single file / directory to be installed.
@@ -365,6 +409,7 @@ class FileEntry:
     checksum_type: str = ""
     checksum_value: str = ""
     decompress: bool = False
+    filters: FilterConfig = field(default_factory=FilterConfig)
 
     @property
     def is_remote(self) -> bool:
@@ -385,6 +430,7 @@ class FileEntry:
             checksum_type=data.get("checksum_type", ""),
             checksum_value=data.get("checksum_value", ""),
             decompress=data.get("decompress", False),
+            filters=FilterConfig.from_dict(data),
         )
 
 
@@ -399,17 +445,29 @@ class PackageEntry:
     description: str = ""
     children: List[PackageEntry] = field(default_factory=list)
     post_install: List[str] = field(default_factory=list)
+    filters: FilterConfig = field(default_factory=FilterConfig)
 
     @classmethod
     def from_dict(cls, name: str, data: Dict[str, Any]) -> PackageEntry:
-        # Children (nested SectionGroup)
-        children: List[PackageEntry] = []
-        children_data = data.get("children", {})
-        if isinstance(children_data, dict):
+        # Children (nested SectionGroup) are parsed with an explicit stack
+        # so arbitrarily deep trees never hit the recursion limit.
+        root = cls._parse_fields(name, data)
+        stack = [(root, data)]
+        while stack:
+            pkg, pkg_data = stack.pop()
+            children_data = pkg_data.get("children", {})
+            if not isinstance(children_data, dict):
+                continue
             for child_name, child_data in children_data.items():
                 if isinstance(child_data, dict):
-                    children.append(PackageEntry.from_dict(child_name, child_data))
+                    child = cls._parse_fields(child_name, child_data)
+                    pkg.children.append(child)
+                    stack.append((child, child_data))
+        return root
 
+    @classmethod
+    def _parse_fields(cls, name: str, data: Dict[str, Any]) -> PackageEntry:
+        """Parse one package without its children."""
         # Sources — normalise many accepted input shapes
         sources_data = data.get("sources", data.get("source", []))
         sources: List[Dict[str, str]] = []
@@ -446,8 +504,8 @@ class PackageEntry:
             optional=data.get("optional", False),
             default=data.get("default", True),
             description=data.get("description", ""),
-            children=children,
             post_install=post_install,
+            filters=FilterConfig.from_dict(data),
         )
 
 
@@ -467,6 +525,7 @@ class PackageConfig:
     logging: Optional[LoggingConfig] = None
     languages: List[str] = field(default_factory=lambda: ["English"])
     custom_includes: Dict[str, List[str]] = field(default_factory=dict)
+    filters: FilterConfig = field(default_factory=FilterConfig)
     _raw_dict: Dict[str, Any] = field(default_factory=dict, repr=False)
     _config_dir: str = field(default="", repr=False)
 
@@ -517,5 +576,6 @@ class PackageConfig:
             ),
             languages=data.get("languages", ["English"]),
             custom_includes=data.get("custom_includes", {}),
+            filters=FilterConfig.from_dict(data.get("filters", {})),
             _raw_dict=data,
         )
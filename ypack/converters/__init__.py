@@ -2,10 +2,12 @@
 
 from __future__ import annotations
 
-from typing import Dict, Type
+from typing import Dict, List, Type
 
 from .base import BaseConverter
+from .context import SharedBuild
 from .convert_nsis import YamlToNsisConverter
+from .convert_wix import YamlToWixConverter
 
 # -----------------------------------------------------------------------
 # Converter registry — maps format name → converter class.
@@ -14,6 +16,7 @@ from .convert_nsis import YamlToNsisConverter
 
 CONVERTER_REGISTRY: Dict[str, Type[BaseConverter]] = {
     "nsis": YamlToNsisConverter,
+    "wix": YamlToWixConverter,
 }
 
 #: Formats for which ``--build`` is supported and the corresponding
@@ -22,6 +25,12 @@ BUILD_COMMANDS: Dict[str, str] = {
     "nsis": "makensis",
 }
 
+#: Compiler arguments that make the build command read the script from
+#: stdin (``--pipe``).  Formats missing here can only be built from a file.
+PIPE_BUILD_ARGS: Dict[str, List[str]] = {
+    "nsis": ["-INPUTCHARSET", "UTF8", "-"],
+}
+
 #: Default output file extension per format.
 OUTPUT_EXTENSIONS: Dict[str, str] = {
     "nsis": ".nsi",
@@ -45,9 +54,13 @@ def get_converter_class(fmt: str) -> Type[BaseConverter]:
 
 __all__ = [
     "BaseConverter",
+    "SharedBuild",
     "YamlToNsisConverter",
+    "YamlToWixConverter",
     "CONVERTER_REGISTRY",
     "SUPPORTED_FORMATS",
     "OUTPUT_EXTENSIONS",
+    "BUILD_COMMANDS",
+    "PIPE_BUILD_ARGS",
     "get_converter_class",
 ]
@@ -5,10 +5,10 @@ Base converter interface for packaging tools.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, TextIO
 
 from ..config import PackageConfig
-from .context import BuildContext
+from .context import BuildContext, SharedBuild
 
 
 class BaseConverter(ABC):
@@ -19,14 +19,23 @@ class BaseConverter(ABC):
     # Default output file extension per tool (subclasses may override).
     output_extension: str = ".txt"
 
-    def __init__(self, config: PackageConfig, raw_config: Optional[Dict[str, Any]] = None) -> None:
+    def __init__(
+        self,
+        config: PackageConfig,
+        raw_config: Optional[Dict[str, Any]] = None,
+        shared: Optional[SharedBuild] = None,
+    ) -> None:
         self.config = config
-        self.raw_config = raw_config or getattr(config, "_raw_dict", {})
+        if shared is not None:
+            self.raw_config = shared.raw_config
+        else:
+            self.raw_config = raw_config or getattr(config, "_raw_dict", {})
         self.ctx = BuildContext(
             config=config,
             raw_config=self.raw_config,
             target_tool=self.tool_name,
             config_dir=getattr(config, "_config_dir", ""),
+            shared=shared,
         )
 
     # ------------------------------------------------------------------
@@ -43,6 +52,22 @@ class BaseConverter(ABC):
         """Write the generated script to *output_path*."""
         ...
 
+    def iter_parts(self) -> Iterator[str]:
+        """Yield the script in consecutive chunks, joined by newlines.
+
+        Backends that can generate incrementally override this so that
+        consumers (e.g. a compiler reading from a pipe) can start work
+        before the whole script exists.
+        """
+        yield self.convert()
+
+    def stream(self, fh: TextIO) -> None:
+        """Write the final script to the text stream *fh* chunk by chunk."""
+        for i, part in enumerate(self.iter_parts()):
+            if i:
+                fh.write("\n")
+            fh.write(self._postprocess(part))
+
     # ------------------------------------------------------------------
     # Shared helpers
     # ------------------------------------------------------------------
@@ -51,5 +76,9 @@ class BaseConverter(ABC):
         """Convenience proxy to ``self.ctx.resolve``."""
         return self.ctx.resolve(text)
 
+    def _postprocess(self, text: str) -> str:
+        """Final text fix-ups applied to every chunk written by :meth:`stream`."""
+        return text
+
     def _warn_unsupported(self, feature: str) -> str:
         return f"; [UNSUPPORTED by {self.tool_name}] {feature}"
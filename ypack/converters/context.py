@@ -4,11 +4,30 @@ Build context shared across converter modules.
 
 from __future__ import annotations
 
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 from ..config import PackageConfig
+from .fs import CachedFileSystem, FileSystem, LocalFileSystem
+
+if TYPE_CHECKING:
+    from .dedupe import DedupeStats
+    from .ir import InstallerPlan
+    from .optimize import OptimizeStats
+    from .package_index import PackageIndex
+    from .parallel import WorkerPool
+    from .payload import PayloadIndex
+    from .payload_filter import PayloadFilter
+    from .payload_hash import HashCache
+    from .volumes import ExternalFile, VolumeStats
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
 
 
 _PATH_SEPARATORS: Dict[str, str] = {
@@ -18,6 +37,183 @@ _PATH_SEPARATORS: Dict[str, str] = {
 }
 
 
+class SharedBuild:
+    """Target-independent state shared by the converters of one build.
+
+    ``convert -f nsis,wix,…`` parses and validates the configuration once
+    and hands the same instance to every backend: the ``${...}`` reference
+    cache, the :class:`PackageIndex` and the :class:`PayloadIndex` are
+    computed by whichever backend needs them first.  Only the ``$VAR``
+    built-in translation stays per target tool.  Safe to use from several
+    threads.
+
+    With *payload_store* set, the payload walk starts from the index
+    saved there by the previous build and :meth:`save_payload` writes
+    the refreshed one back.  With *hash_cache* set, :meth:`hashes` keeps
+    file digests in that SQLite file between builds.
+
+    Input files are read through :attr:`fs`, a per-build stat cache over
+    *fs* (the local disk by default; tests pass a
+    :class:`~.fs.MemoryFileSystem`).
+    """
+
+    def __init__(
+        self,
+        config: PackageConfig,
+        raw_config: Optional[Dict[str, Any]] = None,
+        config_dir: str = "",
+        payload_store: str = "",
+        hash_cache: str = "",
+        fs: Optional[FileSystem] = None,
+    ) -> None:
+        self.config = config
+        self.fs = CachedFileSystem(fs if fs is not None else LocalFileSystem())
+        self.payload_store = payload_store
+        self.hash_cache = hash_cache
+        self.raw_config = raw_config if raw_config is not None else getattr(config, "_raw_dict", {})
+        self.config_dir = config_dir or getattr(config, "_config_dir", "") or os.getcwd()
+        self.references: Dict[str, Any] = {}
+        self._packages: Optional[PackageIndex] = None
+        self._payload: Optional[PayloadIndex] = None
+        self._package_filters: Optional[List[Optional[PayloadFilter]]] = None
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._duplicates: Optional[List[List[str]]] = None
+        self._external: Dict[int, List[ExternalFile]] = {}
+        self._hash_cache: Optional[HashCache] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        # The SQLite connection stays with the parent process.
+        state["_hash_cache"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def packages(self) -> PackageIndex:
+        """The :class:`PackageIndex` of ``config.packages``, built once."""
+        with self._lock:
+            if self._packages is None:
+                from .package_index import PackageIndex
+                self._packages = PackageIndex(self.config.packages)
+            return self._packages
+
+    @property
+    def package_filters(self) -> List[Optional[PayloadFilter]]:
+        """Each package's payload filter (global, enclosing groups, own), by index."""
+        index = self.packages
+        with self._lock:
+            if self._package_filters is None:
+                from .payload_filter import PayloadFilter
+                outer = PayloadFilter.from_configs(self.config.filters)
+                filters: List[Optional[PayloadFilter]] = []
+                # Pre-order: a parent's filter is ready before its children.
+                for node in index.nodes:
+                    parent = outer if node.parent is None else filters[node.parent]
+                    filters.append(PayloadFilter.combine(parent, PayloadFilter.from_configs(node.package.filters)))
+                self._package_filters = filters
+            return self._package_filters
+
+    @property
+    def payload(self) -> PayloadIndex:
+        """The :class:`PayloadIndex` of every local source, walked once."""
+        with self._lock:
+            if self._payload is None:
+                from .payload import PayloadIndex, local_sources
+                from .payload_store import load_store
+                previous = load_store(self.payload_store) if self.payload_store else None
+                try:
+                    self._payload = PayloadIndex(
+                        local_sources(self.config),
+                        lambda path: locate(path, self.config_dir, self.fs),
+                        previous=previous,
+                        fs=self.fs,
+                    )
+                finally:
+                    if previous is not None:
+                        previous.close()
+            return self._payload
+
+    def hashes(self, algorithm: str = "sha256") -> Dict[str, str]:
+        """Digests of every payload file by absolute path, computed once per algorithm."""
+        payload = self.payload
+        with self._lock:
+            if algorithm not in self._hashes:
+                self._hashes[algorithm] = payload.hashes(algorithm, cache=self._open_hash_cache())
+            return self._hashes[algorithm]
+
+    @property
+    def duplicates(self) -> List[List[str]]:
+        """Groups of payload files with identical content, each sorted by path.
+
+        Only files sharing their size with another file are hashed
+        (SHA-256); empty files are left out.
+        """
+        payload = self.payload
+        with self._lock:
+            if self._duplicates is None:
+                by_size: Dict[int, List[str]] = {}
+                for path, file in payload.files.items():
+                    if file.size:
+                        by_size.setdefault(file.size, []).append(path)
+                candidates = [path for paths in by_size.values() if len(paths) > 1 for path in paths]
+                digests = payload.hashes("sha256", cache=self._open_hash_cache(), paths=candidates)
+                by_digest: Dict[str, List[str]] = {}
+                for path in candidates:
+                    if path in digests:
+                        by_digest.setdefault(digests[path], []).append(path)
+                self._duplicates = sorted(sorted(group) for group in by_digest.values() if len(group) > 1)
+            return self._duplicates
+
+    def external_files(self, limit: int) -> List[ExternalFile]:
+        """Payload files to ship beside an installer holding at most *limit* bytes.
+
+        ``(path, size, sha256)`` sorted by path; see :func:`~.volumes.pick_external`.
+        Only files the sources actually install (through their patterns
+        and filters) count, not everything the index walked past.
+        """
+        payload = self.payload
+        with self._lock:
+            if limit not in self._external:
+                from .payload import local_sources
+                from .volumes import pick_external
+                sizes = {
+                    f.path: f.size
+                    for source, recursive, filters in local_sources(self.config)
+                    for _, f in payload.expand(source, recursive, filters)
+                }
+                picked = pick_external(sizes, limit)
+                digests = payload.hashes("sha256", cache=self._open_hash_cache(), paths=picked) if picked else {}
+                self._external[limit] = [(path, sizes[path], digests[path]) for path in picked if path in digests]
+            return self._external[limit]
+
+    def _open_hash_cache(self) -> Optional[HashCache]:
+        if self._hash_cache is None and self.hash_cache:
+            from .payload_hash import HashCache
+            self._hash_cache = HashCache(self.hash_cache)
+        return self._hash_cache
+
+    def save_hashes(self) -> Optional[HashCache]:
+        """Persist and close the hash cache; returns it (for its counters) if one was used."""
+        with self._lock:
+            cache, self._hash_cache = self._hash_cache, None
+        if cache is not None:
+            cache.close()
+        return cache
+
+    def save_payload(self) -> bool:
+        """Write the payload index to :attr:`payload_store`; ``False`` if there was nothing to save."""
+        if not self.payload_store or self._payload is None:
+            return False
+        from .payload_store import save_store
+        save_store(self._payload, self.payload_store)
+        return True
+
+
 @dataclass
 class BuildContext:
     """Immutable context that every converter module can access.
@@ -32,21 +228,77 @@ class BuildContext:
     target_tool: str = "nsis"
     config_dir: str = ""
     output_dir: str = ""
+    # Reproducible-build timestamp (seconds since the epoch).  Defaults to
+    # the ``SOURCE_DATE_EPOCH`` environment variable when it is set.
+    source_date_epoch: Optional[int] = None
+    # Run the IR optimisation passes (optimize.py) when lowering the plan.
+    optimize: bool = False
+    # Expand local file sources from the payload index into one copy per
+    # file instead of handing globs / directories to the backend (ir.py).
+    expand_sources: bool = False
+    # Store identical payload files once (dedupe.py): "copy" or "hardlink"
+    # makes the other copies at install time; "" leaves the plan alone.
+    dedupe: str = ""
+    # Files (and total payload) over this many bytes ship in volumes next
+    # to the installer (volumes.py); 0 keeps everything inside.
+    volume_limit: int = 0
+    # Worker pool for opt-in parallel generation (see parallel.py).  Never
+    # shipped to the workers themselves.
+    pool: Optional[WorkerPool] = field(default=None, repr=False, compare=False)
+    # Hook point name -> fragments contributed by integrations (see
+    # YamlToNsisConverter.add_hook).  A fragment is a string, a list of
+    # lines or a callable ``(ctx) -> str | List[str]``.
+    hooks: Dict[str, List[Any]] = field(default_factory=dict, repr=False, compare=False)
+    # State shared with the other backends of a multi-format build; a
+    # private one is created when the context is used on its own.
+    shared: Optional[SharedBuild] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         if not self.config_dir:
             self.config_dir = getattr(self.config, "_config_dir", "") or os.getcwd()
         if not self.output_dir:
             self.output_dir = self.config_dir
+        if self.source_date_epoch is None:
+            self.source_date_epoch = _env_source_date_epoch()
+
+        if self.shared is None:
+            self.shared = SharedBuild(self.config, self.raw_config, self.config_dir)
 
         from ..resolver import create_resolver
-        self._resolver = create_resolver(self.raw_config, self.target_tool)
+        self._resolver = create_resolver(
+            self.raw_config, self.target_tool, self.shared.references,
+        )
+        self._resolver.on_lookup = self._on_ref_lookup
+        self._observed: Optional[List[Tuple[str, str, Any]]] = None
+        self._plan: Optional[InstallerPlan] = None
+        self._plan_inputs: List[Tuple[str, str, Any]] = []
+        self._optimize_stats: Optional[OptimizeStats] = None
+        self._dedupe_stats: Optional[DedupeStats] = None
+        self._volume_stats: Optional[VolumeStats] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["pool"] = None
+        # Hook callables may not pickle; workers get their output instead.
+        state["hooks"] = {name: [self.render_hook(name)] for name in self.hooks}
+        return state
 
     @property
     def path_separator(self) -> str:
         """Return the path separator for the current target tool."""
         return _PATH_SEPARATORS.get(self.target_tool, "\\")
 
+    @property
+    def build_timestamp(self) -> Optional[str]:
+        """UTC timestamp derived from :attr:`source_date_epoch`, if any.
+
+        When set, generators must use this instead of anything that
+        varies between builds (compile-time clocks, file mtimes).
+        """
+        if self.source_date_epoch is None:
+            return None
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(self.source_date_epoch))
+
     @property
     def effective_reg_view(self) -> str:
         """Resolve the effective registry view ('32' or '64').
@@ -68,6 +320,73 @@ class BuildContext:
             return "32"
         return "64"  # default for modern systems
 
+    @property
+    def fs(self) -> FileSystem:
+        """The build's cached view of the input files (see :mod:`.fs`)."""
+        return self.shared.fs  # type: ignore[union-attr]
+
+    @property
+    def packages(self) -> PackageIndex:
+        """The :class:`PackageIndex` of ``config.packages``, built on first use."""
+        return self.shared.packages  # type: ignore[union-attr]
+
+    @property
+    def payload(self) -> PayloadIndex:
+        """The :class:`PayloadIndex` of the local payload, walked on first use."""
+        return self.shared.payload  # type: ignore[union-attr]
+
+    @property
+    def plan(self) -> InstallerPlan:
+        """The backend-neutral :class:`InstallerPlan`, lowered on first use.
+
+        Inputs read while lowering are replayed into every recording that
+        touches the plan, so cached fragments built from it stay exact.
+        """
+        plan = self._ensure_plan()
+        self.replay(self._plan_inputs)
+        return plan
+
+    def _ensure_plan(self) -> InstallerPlan:
+        """Lower the plan and run the enabled passes, once; no inputs are replayed."""
+        if self._plan is None:
+            from .ir import build_plan
+            with self.recording() as observed:
+                plan = build_plan(self)
+                duplicates = self.payload_duplicates() if self.dedupe else None
+                external = self.payload_external()
+            if self.optimize:
+                from .optimize import optimize_plan
+                self._optimize_stats = optimize_plan(plan)
+            if duplicates is not None:
+                from .dedupe import dedupe_plan
+                files = self.payload.files
+                sizes = {path: files[path].size for group in duplicates for path in group}
+                self._dedupe_stats = dedupe_plan(plan, duplicates, sizes, hardlink=self.dedupe == "hardlink")
+            if self.volume_limit:
+                from .volumes import ship_externally
+                self._volume_stats = ship_externally(plan, external, self.volume_limit)
+            self._plan = plan
+            self._plan_inputs = list(observed)
+        return self._plan
+
+    @property
+    def dedupe_stats(self) -> Optional[DedupeStats]:
+        """What deduplication kept out of :attr:`plan` (``None`` unless :attr:`dedupe`)."""
+        self._ensure_plan()
+        return self._dedupe_stats
+
+    @property
+    def volume_stats(self) -> Optional[VolumeStats]:
+        """What :attr:`plan` ships in volumes beside the installer (``None`` unless :attr:`volume_limit`)."""
+        self._ensure_plan()
+        return self._volume_stats
+
+    @property
+    def optimize_stats(self) -> Optional[OptimizeStats]:
+        """What the optimiser removed from :attr:`plan` (``None`` unless :attr:`optimize`)."""
+        self._ensure_plan()
+        return self._optimize_stats
+
     # ------------------------------------------------------------------
     # Variable resolution
     # ------------------------------------------------------------------
@@ -78,26 +397,154 @@ class BuildContext:
             return text
         return self._resolver.resolve(text)
 
+    def lookup_ref(self, ref_path: str) -> Any:
+        """Return the raw config value behind ``${ref_path}`` (or ``None``)."""
+        return self._resolver._get_value_by_path(ref_path)
+
+    # ------------------------------------------------------------------
+    # Hooks
+    # ------------------------------------------------------------------
+
+    def hook(self, name: str) -> List[str]:
+        """Lines contributed to hook point *name* (recorded like any input)."""
+        lines = self.render_hook(name)
+        if self._observed is not None:
+            self._observed.append(("hook", name, lines))
+        return lines
+
+    def render_hook(self, name: str) -> List[str]:
+        """Render the fragments registered for *name*, without recording."""
+        lines: List[str] = []
+        for fragment in self.hooks.get(name, ()):
+            if callable(fragment):
+                fragment = fragment(self)
+            if isinstance(fragment, str):
+                fragment = fragment.splitlines()
+            lines.extend(fragment)
+        return lines
+
+    # ------------------------------------------------------------------
+    # Work distribution
+    # ------------------------------------------------------------------
+
+    def map(self, fn: Callable[[BuildContext, _T], _R], items: List[_T]) -> List[_R]:
+        """Return ``[fn(self, item) for item in items]``, on the pool if any.
+
+        *fn* must be a module-level function so it can be sent to worker
+        processes; results keep the order of *items*.
+        """
+        if self.pool is None or len(items) < 2:
+            return [fn(self, item) for item in items]
+        return self.pool.map(self, fn, items)
+
+    # ------------------------------------------------------------------
+    # Input recording (used by the fragment cache)
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def recording(self) -> Iterator[List[Tuple[str, str, Any]]]:
+        """Record the inputs read through this context inside the block.
+
+        Yields a list that collects ``("ref", path, value)`` for every
+        ``${...}`` config lookup, ``("path", path, result)`` for every
+        :meth:`resolve_path` call, ``("exists", path, found)`` for every
+        :meth:`exists` call, ``("hook", name, lines)`` for every
+        :meth:`hook` expansion, ``("payload", source, files)`` for every
+        :meth:`payload_files` call, ``("payload_size", source, bytes)``
+        for every :meth:`payload_size` call, ``("duplicates", "sha256",
+        groups)`` for every :meth:`payload_duplicates` call and
+        ``("external", limit, files)`` for every :meth:`payload_external`
+        call.
+        """
+        previous = self._observed
+        self._observed = []
+        try:
+            yield self._observed
+        finally:
+            self._observed = previous
+
+    def replay(self, observed: List[Tuple[str, str, Any]]) -> None:
+        """Add inputs recorded in another process to the current recording."""
+        if self._observed is not None:
+            self._observed.extend(observed)
+
+    def _on_ref_lookup(self, ref_path: str, value: Any) -> None:
+        if self._observed is not None:
+            self._observed.append(("ref", ref_path, value))
+
     # ------------------------------------------------------------------
     # Path helpers
     # ------------------------------------------------------------------
 
     def resolve_path(self, path: str) -> str:
-        """Return an absolute path, resolving relative to *config_dir*."""
+        """Return an absolute path, resolving relative to *config_dir*.
+
+        *config_dir* wins over the current working directory so that the
+        result does not depend on where the tool was invoked from.
+        """
         if not path:
             return path
-        if os.path.isabs(path) and os.path.exists(path):
-            return os.path.abspath(path)
-        if os.path.exists(path):
-            return os.path.abspath(path)
-        if self.config_dir:
-            candidate = os.path.abspath(os.path.join(self.config_dir, path))
-            if os.path.exists(candidate):
-                return candidate
-        return path
+        resolved = self._locate(path)
+        if self._observed is not None:
+            self._observed.append(("path", path, resolved))
+        return resolved
+
+    def exists(self, path: str) -> bool:
+        """Whether *path* (absolute, see :meth:`resolve_path`) exists."""
+        found = self.fs.exists(path)
+        if self._observed is not None:
+            self._observed.append(("exists", path, found))
+        return found
+
+    def payload_files(
+        self, source: str, recursive: bool = False, filters: Optional[PayloadFilter] = None,
+    ) -> Optional[List[Tuple[str, str]]]:
+        """``(install-relative path, absolute path)`` of each file *source* installs.
+
+        ``None`` when the source itself does not exist.
+        """
+        payload = self.payload
+        files: Optional[List[Tuple[str, str]]] = None
+        if payload.covers(source, recursive, filters):
+            files = [(rel, f.path) for rel, f in payload.expand(source, recursive, filters)]
+        if self._observed is not None:
+            self._observed.append(("payload", payload_key(source, recursive, filters), files))
+        return files
+
+    def payload_size(
+        self, source: str, recursive: bool = False, filters: Optional[PayloadFilter] = None,
+    ) -> int:
+        """Total bytes *source* installs through *filters* (``0`` when it does not exist)."""
+        size = sum(f.size for _, f in self.payload.expand(source, recursive, filters))
+        if self._observed is not None:
+            self._observed.append(("payload_size", payload_key(source, recursive, filters), size))
+        return size
+
+    def payload_duplicates(self) -> List[List[str]]:
+        """Groups of payload files with identical content (see :attr:`SharedBuild.duplicates`)."""
+        groups = self.shared.duplicates  # type: ignore[union-attr]
+        if self._observed is not None:
+            self._observed.append(("duplicates", "sha256", groups))
+        return groups
+
+    def payload_external(self) -> List[ExternalFile]:
+        """Payload files too large for the installer (see :attr:`volume_limit`)."""
+        if not self.volume_limit:
+            return []
+        files = self.shared.external_files(self.volume_limit)  # type: ignore[union-attr]
+        if self._observed is not None:
+            self._observed.append(("external", str(self.volume_limit), files))
+        return files
+
+    def _locate(self, path: str) -> str:
+        return locate(path, self.config_dir, self.fs)
 
     def relative_to_output(self, file_path: str) -> str:
-        """Return *file_path* relative to *output_dir* for script references."""
+        """Return *file_path* relative to *output_dir* for script references.
+
+        Scripts must never embed absolute build-machine paths: the same
+        configuration checked out elsewhere has to produce identical bytes.
+        """
         if not file_path:
             return file_path
         abs_path = self.resolve_path(file_path)
@@ -107,3 +554,45 @@ class BuildContext:
             return rel.replace("/", sep)
         except ValueError:
             return abs_path.replace("/", sep)
+
+
+def locate(path: str, config_dir: str, fs: Optional[FileSystem] = None) -> str:
+    """Absolute form of *path*, preferring *config_dir* over the working directory."""
+    fs = fs if fs is not None else LocalFileSystem()
+    if os.path.isabs(path):
+        return os.path.abspath(path) if fs.exists(path) else path
+    if config_dir:
+        candidate = os.path.abspath(os.path.join(config_dir, path))
+        if fs.exists(candidate):
+            return candidate
+    if fs.exists(path):
+        return os.path.abspath(path)
+    return path
+
+
+def payload_key(source: str, recursive: bool, filters: Optional[PayloadFilter]) -> str:
+    """Text form of a :meth:`BuildContext.payload_files` query (fragment-cache input)."""
+    rules = None
+    if filters:
+        rules = [list(filters.exclude), list(filters.include), filters.min_size, filters.max_size]
+    return json.dumps([source, recursive, rules])
+
+
+def parse_payload_key(key: str) -> Tuple[str, bool, Optional[PayloadFilter]]:
+    """Inverse of :func:`payload_key`."""
+    from .payload_filter import PayloadFilter
+    source, recursive, rules = json.loads(key)
+    return source, recursive, PayloadFilter(*rules) if rules else None
+
+
+def _env_source_date_epoch() -> Optional[int]:
+    """Parse ``SOURCE_DATE_EPOCH`` (reproducible-builds.org convention)."""
+    raw = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError(
+            f"SOURCE_DATE_EPOCH must be an integer number of seconds, got '{raw}'"
+        ) from None
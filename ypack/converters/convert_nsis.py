@@ -7,27 +7,138 @@ the various sub-modules (header, sections, packages, helpers).
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import hashlib
+import os
+import re
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from ..config import PackageConfig
 from .base import BaseConverter
-from .context import BuildContext
+from .context import BuildContext, SharedBuild
+from .fragments import FragmentCache, FragmentSpec, fragment_key, record
 from .nsis_header import (
     generate_custom_includes,
     generate_general_settings,
     generate_header,
     generate_modern_ui,
 )
-from .nsis_helpers import generate_checksum_helper, generate_log_macros, generate_path_helpers
+from .nsis_helpers import (
+    generate_download_helpers,
+    generate_helper_includes,
+    generate_path_helpers,
+    generate_volume_helpers,
+    write_helper_libraries,
+)
 from .nsis_packages import (
     generate_existing_install_helpers,
     generate_oninit,
     generate_uninit,
+    generate_package_banner,
+    generate_package_part,
     generate_package_sections,
     generate_signing_section,
     generate_update_section,
 )
-from .nsis_sections import generate_installer_section, generate_uninstaller_section
+from .nsis_compact import compact_script
+from .nsis_sections import (
+    generate_dedupe_cleanup,
+    generate_estimated_size,
+    generate_installer_section,
+    generate_uninstaller_section,
+)
+from .parallel import WorkerPool, render_spec, resolve_jobs
+from .volumes import VOLUME_LIMIT, external_ops, write_volumes
+
+_CONFIG_REF_RE = re.compile(r"\$\{([a-z][a-z0-9_.]*)\}")
+
+
+# -----------------------------------------------------------------------
+# Conditional blocks
+# -----------------------------------------------------------------------
+
+def _helper_library(ctx: BuildContext) -> List[str]:
+    # Helper .nsh includes (logging macros must come before sections that use them)
+    return generate_helper_includes(ctx)
+
+
+def _path_helpers(ctx: BuildContext) -> List[str]:
+    # PATH helpers (only the ones the sections call)
+    return generate_path_helpers(ctx)
+
+
+def _checksum_helpers(ctx: BuildContext) -> List[str]:
+    # Download function plus checksum / extract helpers (lightweight stubs)
+    return generate_download_helpers(ctx)
+
+
+# -----------------------------------------------------------------------
+# Script layout — one fragment per generator, in output order.  ``deps``
+# must list every config subtree the generator reads (see fragments.py).
+# -----------------------------------------------------------------------
+
+_INSTALL_DEPS = ("install", "files", "filters", "app.install_icon", "logging")
+
+FRAGMENTS: Tuple[FragmentSpec, ...] = (
+    # Header (unicode, defines, icons)
+    FragmentSpec("header", generate_header, ("app", "install.registry_key")),
+    FragmentSpec("custom_includes", generate_custom_includes, ("custom_includes",)),
+    FragmentSpec("general_settings", generate_general_settings, (
+        "app.license", "install.install_dir", "install.registry_view",
+        "install.silent_install", "logging",
+    )),
+    FragmentSpec("modern_ui", generate_modern_ui, (
+        "app.license", "install.launch_on_finish", "install.launch_on_finish_label",
+        "install.existing_install", "languages", "packages",
+    )),
+    # Signing & update
+    FragmentSpec("signing", generate_signing_section, ("signing",)),
+    FragmentSpec("update", generate_update_section, ("update",)),
+    FragmentSpec("helper_library", _helper_library, ("logging", "install.env_vars", "files", "filters", "packages")),
+    FragmentSpec("path_helpers", _path_helpers, ("install.env_vars",)),
+    # Main install / uninstall
+    FragmentSpec("installer_section", generate_installer_section, _INSTALL_DEPS),
+    FragmentSpec("package_sections", generate_package_sections, ("packages", "filters", "logging"), fans_out=True),
+    FragmentSpec("estimated_size", generate_estimated_size, (
+        "files", "filters", "packages", "install.registry_view", "install.install_dir",
+    )),
+    FragmentSpec("dedupe_cleanup", generate_dedupe_cleanup, ("files", "filters", "packages")),
+    FragmentSpec("uninstaller_section", generate_uninstaller_section, _INSTALL_DEPS + ("packages",)),
+    # Existing-install helper functions (may be referenced by UI callbacks)
+    FragmentSpec("existing_install_helpers", generate_existing_install_helpers, (
+        "install.existing_install", "install.install_dir", "install.registry_view", "logging",
+    )),
+    # .onInit / un.onInit
+    FragmentSpec("oninit", generate_oninit, ("install", "signing", "logging", "packages", "files", "filters")),
+    FragmentSpec("uninit", generate_uninit, ("logging",)),
+    FragmentSpec("checksum_helpers", _checksum_helpers, ("files",)),
+    FragmentSpec("volume_helpers", generate_volume_helpers, ("files", "filters", "packages")),
+)
+
+
+#: Hook points inside fragments (see :meth:`YamlToNsisConverter.add_hook`).
+HOOK_POINTS: Dict[str, str] = {
+    "pages": "installer UI pages, just before the directory page",
+    "install": 'end of Section "Install"',
+    "oninit": "end of .onInit",
+    "uninit": "end of un.onInit",
+    "uninstall": 'end of Section "Uninstall"',
+}
+
+#: What a hook contributes: text, lines, or a callable producing either.
+HookFragment = Union[str, List[str], Callable[[BuildContext], Union[str, List[str]]]]
+
+
+def _package_part_names(ctx: BuildContext) -> List[str]:
+    """Stable include-file names for the top-level packages (split output)."""
+    names: List[str] = []
+    for node in ctx.plan.components:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", node.name).strip("_.") or "package"
+        name, n = f"pkg_{slug}.nsh", 2
+        while name in names:
+            name, n = f"pkg_{slug}_{n}.nsh", n + 1
+        names.append(name)
+    return names
 
 
 class YamlToNsisConverter(BaseConverter):
@@ -36,74 +147,258 @@ class YamlToNsisConverter(BaseConverter):
     tool_name = "nsis"
     output_extension = ".nsi"
 
-    def __init__(self, config: PackageConfig, raw_config: Optional[Dict[str, Any]] = None) -> None:
-        super().__init__(config, raw_config)
+    def __init__(
+        self,
+        config: PackageConfig,
+        raw_config: Optional[Dict[str, Any]] = None,
+        fragment_cache: Optional[FragmentCache] = None,
+        jobs: int = 1,
+        optimize: bool = False,
+        split: bool = False,
+        compact: bool = False,
+        shared: Optional[SharedBuild] = None,
+        expand_sources: bool = False,
+        dedupe: str = "",
+        volume_limit: int = VOLUME_LIMIT,
+    ) -> None:
+        super().__init__(config, raw_config, shared)
+        self.fragment_cache = fragment_cache
+        self.jobs = resolve_jobs(jobs)
+        self.ctx.optimize = optimize
+        # Deduplication works on the per-file copies of expanded sources.
+        self.ctx.expand_sources = expand_sources or bool(dedupe)
+        self.ctx.dedupe = dedupe
+        self.ctx.volume_limit = volume_limit
+        self.split = split
+        self.compact = compact
+        # Script size before / after compaction for the last conversion.
+        self.bytes_before = 0
+        self.bytes_after = 0
+        # Filled by save() in split mode: include files (and the main
+        # script) that were rewritten / left untouched / deleted.
+        self.files_written: List[str] = []
+        self.files_unchanged: List[str] = []
+        self.files_removed: List[str] = []
+        # Filled by write_support_files(): volume files rewritten / already current.
+        self.volumes_written: List[str] = []
+        self.volumes_unchanged: List[str] = []
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
+    def add_hook(self, point: str, fragment: HookFragment) -> None:
+        """Contribute *fragment* to a named hook point during emission.
+
+        *point* is one of :data:`HOOK_POINTS` (inside a generated
+        section or function) or ``before:<fragment>`` /
+        ``after:<fragment>`` for any fragment in :data:`FRAGMENTS`
+        (e.g. ``"after:installer_section"``).  *fragment* is NSIS text,
+        a list of lines, or a callable taking the :class:`BuildContext`
+        and returning either; callables run each time the script is
+        generated.  Fragments for the same point are emitted in the
+        order they were added.
+        """
+        fragment_names = {spec.name for spec in FRAGMENTS}
+        where, _, name = point.partition(":")
+        if point not in HOOK_POINTS and not (where in ("before", "after") and name in fragment_names):
+            raise ValueError(
+                f"Unknown hook point '{point}'. Expected one of {', '.join(HOOK_POINTS)} "
+                f"or before:/after: followed by one of {', '.join(sorted(fragment_names))}"
+            )
+        self.ctx.hooks.setdefault(point, []).append(fragment)
+
     def convert(self) -> str:  # noqa: D102
-        parts: List[str] = []
+        return "\n".join(self.iter_parts())
 
-        # Header (unicode, defines, icons)
-        parts.extend(generate_header(self.ctx))
-        parts.extend(generate_custom_includes(self.ctx))
-        parts.extend(generate_general_settings(self.ctx))
-        parts.extend(generate_modern_ui(self.ctx))
+    def iter_parts(self) -> Iterator[str]:  # noqa: D102
+        self.bytes_before = self.bytes_after = 0
+        for _name, lines in self._iter_hooked_blocks():
+            if lines:
+                yield self._join(lines)
 
-        # Signing & update
-        parts.extend(generate_signing_section(self.ctx))
-        parts.extend(generate_update_section(self.ctx))
+    def save(self, output_path: str) -> None:  # noqa: D102
+        self.ctx.output_dir = os.path.dirname(os.path.abspath(output_path))
+        self.write_support_files()
+        if self.split:
+            self._save_split(output_path)
+            return
 
-        # Logging macros (must come before sections that use them)
-        if self.config.logging and self.config.logging.enabled:
-            parts.extend(generate_log_macros())
+        # NSIS requires the script file to be encoded as UTF-8 with BOM
+        # when it contains Unicode characters. Use 'utf-8-sig' so Python
+        # writes the BOM automatically at the start of the file.
+        with open(output_path, "w", encoding="utf-8-sig") as fh:
+            self.stream(fh)
+
+    def write_support_files(self) -> None:
+        """Write what the script needs next to it into the output directory.
 
-        # PATH helpers (only when needed)
-        needs_path_helpers = any(
-            e.append for e in self.config.install.env_vars
+        That is the helper libraries it ``!include``s (``ypack_nsis/``)
+        and the volumes of files too large for the installer, which have
+        to be shipped next to it (see ``volumes.py``).  Called by
+        :meth:`save`; call it yourself before compiling a script you did
+        not save.
+        """
+        write_helper_libraries(self.ctx, self.ctx.output_dir)
+        self.volumes_written, self.volumes_unchanged = write_volumes(
+            self.ctx.fs, external_ops(self.ctx.plan), self.ctx.volume_limit, self.ctx.output_dir,
         )
-        if needs_path_helpers:
-            parts.extend(generate_path_helpers(self.ctx))
 
-        # Main install / uninstall
-        parts.extend(generate_installer_section(self.ctx))
-        parts.extend(generate_package_sections(self.ctx))
-        parts.extend(generate_uninstaller_section(self.ctx))
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
 
-        # Existing-install helper functions (may be referenced by UI callbacks)
-        parts.extend(generate_existing_install_helpers(self.ctx))
+    def _save_split(self, output_path: str) -> None:
+        """Write package sections and the uninstaller to ``<stem>.d/*.nsh``.
 
-        # .onInit / un.onInit
-        parts.extend(generate_oninit(self.ctx))
-        parts.extend(generate_uninit(self.ctx))
+        The main script ``!include``s them in place.  Every file is only
+        rewritten when its content hash changes, and include files left
+        over from removed packages are deleted.
+        """
+        self.files_written, self.files_unchanged, self.files_removed = [], [], []
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        parts_name = f"{stem}.d"
+        parts_dir = os.path.join(self.ctx.output_dir, parts_name)
+        part_files = self._split_files()
 
-        # Checksum / extract helpers (always emitted — lightweight stubs)
-        has_remote = any(fe.is_remote for fe in self.config.files)
-        has_checksum = any(fe.checksum_type for fe in self.config.files)
-        if has_remote or has_checksum:
-            parts.extend(generate_checksum_helper())
+        main: List[str] = []
+        produced = set()
+        self.bytes_before = self.bytes_after = 0
+        for name, lines in self._iter_hooked_blocks():
+            if not lines:
+                continue
+            text = self._postprocess(self._join(lines))
+            filename = part_files.get(name)
+            if filename is None:
+                main.append(text)
+                continue
+            os.makedirs(parts_dir, exist_ok=True)
+            self._write_if_changed(os.path.join(parts_dir, filename), text)
+            produced.add(filename)
+            main.append(f'!include "{parts_name}\\{filename}"\n')
 
-        return "\n".join(parts)
+        if os.path.isdir(parts_dir):
+            for name in sorted(os.listdir(parts_dir)):
+                if name.endswith(".nsh") and name not in produced:
+                    os.remove(os.path.join(parts_dir, name))
+                    self.files_removed.append(os.path.join(parts_dir, name))
+        self._write_if_changed(output_path, "\n".join(main))
 
-    def save(self, output_path: str) -> None:  # noqa: D102
-        import os
-        self.ctx.output_dir = os.path.dirname(os.path.abspath(output_path))
-        script = self.convert()
-
-        # Post-process: resolve any remaining configuration-style variables
-        # (e.g. ${app.name}) that may appear in the final text. We only
-        # resolve lowercase/dotted references to avoid touching NSIS defines
-        # such as ${APP_NAME}.
-        import re
-        pattern = re.compile(r"\$\{([a-z][a-z0-9_.]*)\}")
-        def _repl(m: re.Match) -> str:
-            return self.ctx.resolve(m.group(0))
-        script = pattern.sub(_repl, script)
+    def _write_if_changed(self, path: str, text: str) -> None:
+        # Same bytes a text-mode 'utf-8-sig' write would produce (NSIS
+        # needs the BOM in every included file too).
+        data = text.replace("\n", os.linesep).encode("utf-8-sig")
+        if os.path.isfile(path):
+            with open(path, "rb") as fh:
+                if hashlib.sha256(fh.read()).digest() == hashlib.sha256(data).digest():
+                    self.files_unchanged.append(path)
+                    return
+        with open(path, "wb") as fh:
+            fh.write(data)
+        self.files_written.append(path)
 
-        # NSIS requires the script file to be encoded as UTF-8 with BOM
-        # when it contains Unicode characters. Use 'utf-8-sig' so Python
-        # writes the BOM automatically at the start of the file.
-        with open(output_path, "w", encoding="utf-8-sig") as fh:
-            fh.write(script)
+    def _join(self, lines: List[str]) -> str:
+        text = "\n".join(lines)
+        if not self.compact:
+            return text
+        compacted = compact_script(text)
+        self.bytes_before += len(text.encode("utf-8"))
+        self.bytes_after += len(compacted.encode("utf-8"))
+        return compacted
+
+    def _specs(self) -> Tuple[FragmentSpec, ...]:
+        """The fragment table; split mode renders one fragment per package."""
+        if not self.split:
+            return FRAGMENTS
+        specs: List[FragmentSpec] = []
+        for spec in FRAGMENTS:
+            if spec.name != "package_sections":
+                specs.append(spec)
+                continue
+            specs.append(FragmentSpec("package_sections:banner", generate_package_banner, ("packages",)))
+            for i, filename in enumerate(_package_part_names(self.ctx)):
+                specs.append(FragmentSpec(
+                    f"package_sections:{filename}",
+                    partial(generate_package_part, index=i),
+                    spec.deps,
+                    fans_out=True,
+                ))
+        return tuple(specs)
+
+    def _split_files(self) -> Dict[str, str]:
+        files = {f"package_sections:{name}": name for name in _package_part_names(self.ctx)}
+        files["uninstaller_section"] = "uninstall.nsh"
+        return files
+
+    def _iter_hooked_blocks(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yield ``(name, lines)`` for every fragment plus its ``before:`` / ``after:`` hooks.
+
+        Split mode renders one logical fragment as several specs
+        (``package_sections:…``); its hooks wrap the whole run.
+        """
+        current: Optional[str] = None
+        for spec, lines in self._iter_blocks():
+            base = spec.name.split(":", 1)[0]
+            if base != current:
+                if current is not None:
+                    yield f"after:{current}", self.ctx.render_hook(f"after:{current}")
+                yield f"before:{base}", self.ctx.render_hook(f"before:{base}")
+                current = base
+            yield spec.name, lines
+        if current is not None:
+            yield f"after:{current}", self.ctx.render_hook(f"after:{current}")
+
+    def _iter_blocks(self) -> Iterator[Tuple[FragmentSpec, List[str]]]:
+        """Yield ``(spec, lines)`` for every fragment in output order."""
+        specs = self._specs()
+        if self.jobs <= 1:
+            for spec in specs:
+                yield spec, self._render(spec)
+            return
+
+        with WorkerPool(self.ctx, self.jobs) as pool:
+            self.ctx.pool = pool
+            try:
+                yield from self._iter_blocks_parallel(pool, specs)
+            finally:
+                self.ctx.pool = None
+
+    def _iter_blocks_parallel(
+        self, pool: WorkerPool, specs: Tuple[FragmentSpec, ...],
+    ) -> Iterator[Tuple[FragmentSpec, List[str]]]:
+        # Dispatch self-contained fragments up front so the workers are busy
+        # while fan-out fragments render here (feeding the same pool).
+        cached = {spec.name: self._lookup(spec) for spec in specs}
+        futures = {
+            spec.name: pool.submit(render_spec, spec)
+            for spec in specs
+            if cached[spec.name][1] is None and not spec.fans_out
+        }
+        for spec in specs:
+            key, lines = cached[spec.name]
+            if lines is None:
+                if spec.name in futures:
+                    lines, observed = futures[spec.name].result()
+                else:
+                    lines, observed = record(self.ctx, spec)
+                if self.fragment_cache is not None:
+                    self.fragment_cache.store(key, lines, observed)
+            yield spec, lines
+
+    def _render(self, spec: FragmentSpec) -> List[str]:
+        if self.fragment_cache is not None:
+            return self.fragment_cache.render(self.ctx, spec)
+        return spec.render(self.ctx)
+
+    def _lookup(self, spec: FragmentSpec) -> Tuple[str, Optional[List[str]]]:
+        if self.fragment_cache is None:
+            return "", None
+        key = fragment_key(self.ctx, spec)
+        return key, self.fragment_cache.lookup(self.ctx, key)
+
+    def _postprocess(self, text: str) -> str:
+        # Resolve any remaining configuration-style variables (e.g.
+        # ${app.name}) that may appear in the final text. We only resolve
+        # lowercase/dotted references to avoid touching NSIS defines such
+        # as ${APP_NAME}.
+        return _CONFIG_REF_RE.sub(lambda m: self.ctx.resolve(m.group(0)), text)
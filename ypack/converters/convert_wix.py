@@ -0,0 +1,63 @@
+"""
+YAML → WiX source (``.wxs``) converter.
+
+Targets the WiX v4 schema.  The payload is harvested in-process (see
+wix_harvest.py), so the generated source references every file
+explicitly and needs no ``heat`` run or other external tool.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from ..config import PackageConfig
+from .base import BaseConverter
+from .context import SharedBuild
+from .wix_sections import (
+    WixLayout,
+    build_layout,
+    generate_components,
+    generate_directories,
+    generate_features,
+    generate_package,
+    unsupported,
+)
+
+
+class YamlToWixConverter(BaseConverter):
+    """Convert a :class:`PackageConfig` into a WiX v4 source file."""
+
+    tool_name = "wix"
+    output_extension = ".wxs"
+
+    def __init__(
+        self,
+        config: PackageConfig,
+        raw_config: Optional[Dict[str, Any]] = None,
+        shared: Optional[SharedBuild] = None,
+    ) -> None:
+        super().__init__(config, raw_config, shared)
+        # Layout of the last conversion (file count, directories …).
+        self.layout: Optional[WixLayout] = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def convert(self) -> str:  # noqa: D102
+        layout = build_layout(self.ctx)
+        self.layout = layout
+        lines = generate_package(self.ctx, layout)
+        lines.extend(generate_directories(self.ctx, layout))
+        lines.extend(generate_components(self.ctx, layout))
+        lines.extend(generate_features(self.ctx, layout))
+        return "\n".join(lines) + "\n"
+
+    def save(self, output_path: str) -> None:  # noqa: D102
+        self.ctx.output_dir = os.path.dirname(os.path.abspath(output_path))
+        with open(output_path, "w", encoding="utf-8") as fh:
+            fh.write(self.convert())
+
+    def _warn_unsupported(self, feature: str) -> str:
+        return unsupported(feature)
@@ -0,0 +1,126 @@
+"""
+Content deduplication of the installer payload.
+
+Packages often ship the same file (MSVC runtime, Qt plugins …) in
+several directories.  :func:`dedupe_plan` keeps one ``CopyFile`` per
+distinct content and turns the other copies into :class:`CopyInstalled`
+operations, so the installer stores each blob once and the extra copies
+are made on the target machine.
+
+A copy is only made from a file that is certain to be installed before
+it: one from the top-level ``files`` (``Section "Install"`` runs before
+every package) or an earlier one in the same component.  Content that
+several components share and the top-level files do not is staged once
+under :data:`STAGE_DIR` by the install section and copied from there.
+
+Only expanded copies (one ``CopyFile`` per indexed file, see
+:func:`~.ir.expand_groups`) take part; globs and directories are left
+to the backend.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from .ir import CopyFile, CopyInstalled, InstallerPlan, Op, SetOutPath, iter_components
+
+#: Where blobs shared by several components are staged at install time.
+STAGE_DIR = "$PLUGINSDIR\\ypack_dedupe"
+
+
+@dataclass
+class DedupeStats:
+    """What :func:`dedupe_plan` kept out of the installer."""
+    files: int = 0        # copies made on the target instead of stored
+    bytes_saved: int = 0  # payload bytes makensis no longer reads, compresses and stores
+    staged: int = 0       # blobs staged for several components
+
+    def summary(self) -> str:
+        return (
+            f"stored {self.files} duplicate files once: {self.bytes_saved:,} bytes less to compress "
+            f"and ship ({self.staged} staged for several packages)"
+        )
+
+
+def dedupe_plan(
+    plan: InstallerPlan,
+    duplicates: Sequence[Sequence[str]],
+    sizes: Mapping[str, int],
+    hardlink: bool = False,
+) -> DedupeStats:
+    """Replace repeated copies of identical files in *plan* (in place).
+
+    *duplicates* are groups of local paths with the same content and
+    *sizes* their sizes in bytes.
+    """
+    stats = DedupeStats()
+    blob_of: Dict[str, int] = {path: i for i, group in enumerate(duplicates) for path in group}
+    if not blob_of:
+        return stats
+
+    origins: Dict[int, str] = {}
+    plan.files = _dedupe_ops(plan.files, origins, blob_of, sizes, hardlink, stats)
+
+    # Blobs first copied by more than one component (and not by the
+    # top-level files) are staged once for all of them.
+    components = iter_components(plan.components)
+    first_source: Dict[int, str] = {}
+    users: Dict[int, int] = {}
+    for comp in components:
+        seen = set()
+        for op in comp.ops:
+            blob = _blob(op, blob_of)
+            if blob is None or blob in origins or blob in seen:
+                continue
+            seen.add(blob)
+            first_source.setdefault(blob, op.source)  # type: ignore[union-attr]
+            users[blob] = users.get(blob, 0) + 1
+    staged: Dict[int, str] = {}
+    for blob, source in first_source.items():
+        if users[blob] < 2:
+            continue
+        folder = f"{STAGE_DIR}\\{len(staged)}"
+        plan.files.extend([SetOutPath(folder), CopyFile(source)])
+        staged[blob] = f"{folder}\\{os.path.basename(source)}"
+        stats.staged += 1
+        # Every user copies it; the staged copy itself is still stored.
+        stats.bytes_saved -= sizes.get(source, 0)
+
+    for comp in components:
+        comp.ops = _dedupe_ops(comp.ops, {**origins, **staged}, blob_of, sizes, hardlink, stats)
+    return stats
+
+
+def _blob(op: Op, blob_of: Mapping[str, int]) -> Optional[int]:
+    if isinstance(op, CopyFile) and not op.recursive:
+        return blob_of.get(op.source)
+    return None
+
+
+def _dedupe_ops(
+    ops: List[Op],
+    origins: Dict[int, str],
+    blob_of: Mapping[str, int],
+    sizes: Mapping[str, int],
+    hardlink: bool,
+    stats: DedupeStats,
+) -> List[Op]:
+    out: List[Op] = []
+    out_dir: Optional[str] = None
+    for op in ops:
+        if isinstance(op, SetOutPath):
+            out_dir = op.path
+        blob = _blob(op, blob_of)
+        if blob is not None and out_dir is not None:
+            source = op.source  # type: ignore[union-attr]
+            target = out_dir.rstrip("\\") + "\\" + os.path.basename(source)
+            origin = origins.setdefault(blob, target)
+            if origin != target:
+                out.append(CopyInstalled(origin, target, hardlink))
+                stats.files += 1
+                stats.bytes_saved += sizes.get(source, 0)
+                continue
+        out.append(op)
+    return out
@@ -0,0 +1,254 @@
+"""
+Script fragments and the fragment cache.
+
+A *fragment* is the output of one top-level generator (``generate_*``).
+Every fragment declares the config subtrees it reads (``deps``); the
+cache keys each fragment by a hash of exactly those subtrees plus the
+build environment, so changing e.g. ``app.version`` only re-renders the
+fragments that actually read it.
+
+Generators may also read values indirectly — ``${...}`` references
+resolved through the raw YAML dict, filesystem lookups via
+:meth:`BuildContext.resolve_path` and :meth:`BuildContext.exists`, and
+integration hooks expanded via :meth:`BuildContext.hook`.  Those
+inputs are recorded while a fragment renders and re-checked before a
+cached copy is reused, which keeps invalidation exact without having to
+declare them up front.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .context import BuildContext, parse_payload_key
+
+#: ``(kind, argument, value)`` — see :meth:`BuildContext.recording`.
+Observation = Tuple[str, str, Any]
+
+_CACHE_FORMAT = 1
+
+
+@dataclass(frozen=True)
+class FragmentSpec:
+    """A named generator together with its declared config dependencies.
+
+    *deps* are dotted attribute paths on :class:`PackageConfig`
+    (``"install.registry_entries"``, ``"app"``, …).  A *fans_out*
+    generator spreads its own work over :meth:`BuildContext.map`, so in
+    parallel mode it runs in the parent process rather than in a worker.
+    """
+
+    name: str
+    render: Callable[[BuildContext], List[str]]
+    deps: Tuple[str, ...]
+    fans_out: bool = False
+
+
+def record(ctx: BuildContext, spec: FragmentSpec) -> Tuple[List[str], List[Observation]]:
+    """Render *spec* and return its lines plus the indirect inputs it read."""
+    with ctx.recording() as observed:
+        lines = spec.render(ctx)
+    return lines, list(observed)
+
+
+class FragmentCache:
+    """Caches rendered fragments, optionally persisted to a JSON file.
+
+    Only entries used during the current run are written back by
+    :meth:`save`, so a cache file tracks a single configuration and does
+    not grow without bound.  Use one file per config / output script.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._used: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.isfile(path):
+            self._load(path)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def render(self, ctx: BuildContext, spec: FragmentSpec) -> List[str]:
+        """Return the lines for *spec*, re-rendering only when stale."""
+        key = fragment_key(ctx, spec)
+        cached = self.lookup(ctx, key)
+        if cached is not None:
+            return cached
+        lines, observed = record(ctx, spec)
+        self.store(key, lines, observed)
+        return lines
+
+    def lookup(self, ctx: BuildContext, key: str) -> Optional[List[str]]:
+        """Return cached lines for *key* if all recorded inputs still match."""
+        entry = self._entries.get(key)
+        if entry is not None and all(
+            _digest(_current(ctx, kind, arg)) == digest
+            for kind, arg, digest in entry["inputs"]
+        ):
+            self.hits += 1
+            self._used[key] = entry
+            return list(entry["lines"])
+        self.misses += 1
+        return None
+
+    def store(self, key: str, lines: List[str], observed: List[Observation]) -> None:
+        """Remember *lines* under *key* with the inputs observed while rendering."""
+        inputs = sorted({(kind, arg, _digest(value)) for kind, arg, value in observed})
+        entry = {"lines": list(lines), "inputs": [list(i) for i in inputs]}
+        self._entries[key] = entry
+        self._used[key] = entry
+
+    def save(self) -> None:
+        """Persist the entries used in this run to :attr:`path`."""
+        if not self.path:
+            return
+        data = {"format": _CACHE_FORMAT, "entries": self._used}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return  # unreadable cache is just a cold cache
+        if isinstance(data, dict) and data.get("format") == _CACHE_FORMAT:
+            self._entries = dict(data.get("entries", {}))
+
+
+def fragment_key(ctx: BuildContext, spec: FragmentSpec) -> str:
+    """Hash of the code, build environment and declared config subtrees."""
+    h = hashlib.sha256()
+    for part in (
+        _code_fingerprint(),
+        spec.name,
+        ctx.target_tool,
+        ctx.config_dir,
+        ctx.output_dir,
+        str(ctx.source_date_epoch),
+        str(ctx.optimize),
+        str(ctx.expand_sources),
+        ctx.dedupe,
+        str(ctx.volume_limit),
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    for dep in spec.deps:
+        h.update(dep.encode("utf-8"))
+        h.update(b"=")
+        h.update(_canonical(_config_value(ctx.config, dep)).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _config_value(config: Any, dotted: str) -> Any:
+    obj = config
+    for attr in dotted.split("."):
+        obj = getattr(obj, attr, None)
+    return obj
+
+
+def _current(ctx: BuildContext, kind: str, arg: str) -> Any:
+    if kind == "ref":
+        return ctx.lookup_ref(arg)
+    if kind == "path":
+        return ctx.resolve_path(arg)
+    if kind == "exists":
+        return ctx.exists(arg)
+    if kind == "hook":
+        return ctx.render_hook(arg)
+    if kind == "payload":
+        return ctx.payload_files(*parse_payload_key(arg))
+    if kind == "payload_size":
+        return ctx.payload_size(*parse_payload_key(arg))
+    if kind == "duplicates":
+        return ctx.payload_duplicates()
+    if kind == "external":
+        return ctx.payload_external()
+    raise ValueError(f"Unknown fragment input kind '{kind}'")
+
+
+def _entries(value: Any) -> Optional[Tuple[bool, List[Tuple[str, Any]]]]:
+    """``(keyed, [(key, child), ...])`` of a container, ``None`` for a scalar."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return True, [
+            (f.name, getattr(value, f.name)) for f in dataclasses.fields(value) if not f.name.startswith("_")
+        ]
+    if isinstance(value, dict):
+        return True, [(str(k), v) for k, v in value.items()]
+    if isinstance(value, (list, tuple)):
+        return False, [("", v) for v in value]
+    return None
+
+
+def _canonical(value: Any) -> str:
+    # JSON text of *value*, built with an explicit stack so arbitrarily deep
+    # trees (nested packages) never hit the recursion limit.  Dict order is
+    # significant for generated output (e.g. verbs), so keys are *not*
+    # sorted here.
+    out: List[str] = []
+    open_ids = set()  # containers on the current path, to reject cycles
+    stack: List[Tuple[str, Any]] = [("value", value)]
+    while stack:
+        kind, item = stack.pop()
+        if kind == "text":
+            out.append(item)
+            continue
+        if kind == "close":
+            open_ids.discard(item)
+            continue
+        entries = _entries(item)
+        if entries is None:
+            out.append(json.dumps(item, ensure_ascii=False, default=str))
+            continue
+        if id(item) in open_ids:
+            raise ValueError("Cannot fingerprint a self-referencing config value")
+        open_ids.add(id(item))
+        keyed, children = entries
+        out.append("{" if keyed else "[")
+        todo: List[Tuple[str, Any]] = []
+        for i, (key, child) in enumerate(children):
+            if i:
+                todo.append(("text", ", "))
+            if keyed:
+                todo.append(("text", json.dumps(key, ensure_ascii=False) + ": "))
+            todo.append(("value", child))
+        todo.append(("text", "}" if keyed else "]"))
+        todo.append(("close", id(item)))
+        stack.extend(reversed(todo))
+    return "".join(out)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(_canonical(value).encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _code_fingerprint() -> str:
+    """Hash of the converter sources, so upgrades never reuse stale output."""
+    from .. import __version__
+
+    h = hashlib.sha256(__version__.encode("utf-8"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(here)):
+        if name.endswith(".py"):
+            with open(os.path.join(here, name), "rb") as fh:
+                h.update(name.encode("utf-8"))
+                h.update(fh.read())
+    return h.hexdigest()
@@ -0,0 +1,215 @@
+"""
+Filesystem access for the converters.
+
+Every question a conversion asks about the build machine — where a
+relative path resolves, whether an icon exists, what a payload
+directory contains — goes through a :class:`FileSystem`:
+
+* :class:`LocalFileSystem` is the real disk;
+* :class:`CachedFileSystem` wraps another one and answers repeated
+  questions from memory, so a build stats each path once however many
+  generators ask (on network-mounted trees every stat is a round trip);
+* :class:`MemoryFileSystem` holds a tree built in code, so tests can
+  run a conversion without touching disk.
+
+:class:`~.context.SharedBuild` owns one cached instance per build.  Only
+inputs go through this layer; scripts and caches are written to disk.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import stat as stat_module
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, BinaryIO, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+
+class FileStat(NamedTuple):
+    """What the converters need from a ``stat`` call."""
+
+    is_dir: bool
+    size: int
+    mtime_ns: int
+    ino: int
+
+
+#: ``(subdirectory names, files by name)`` of one directory.
+Listing = Tuple[List[str], Dict[str, FileStat]]
+
+
+class FileSystem(ABC):
+    """Read-only filesystem queries; subclasses implement :meth:`stat`, :meth:`scan` and :meth:`open`."""
+
+    @abstractmethod
+    def stat(self, path: str) -> Optional[FileStat]:
+        """The status of *path* (following symlinks), ``None`` if it does not exist."""
+        ...
+
+    @abstractmethod
+    def scan(self, path: str) -> Optional[Listing]:
+        """The entries of directory *path*, ``None`` if it cannot be listed.
+
+        Symlinks to directories are neither followed nor listed.
+        """
+        ...
+
+    @abstractmethod
+    def open(self, path: str) -> BinaryIO:
+        """*path* opened for binary reading; raises :class:`OSError` if that fails."""
+        ...
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        st = self.stat(path)
+        return st is not None and st.is_dir
+
+    def isfile(self, path: str) -> bool:
+        st = self.stat(path)
+        return st is not None and not st.is_dir
+
+
+class LocalFileSystem(FileSystem):
+    """The disk of the build machine."""
+
+    def stat(self, path: str) -> Optional[FileStat]:
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        return FileStat(stat_module.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def scan(self, path: str) -> Optional[Listing]:
+        subdirs: List[str] = []
+        files: Dict[str, FileStat] = {}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files[entry.name] = FileStat(False, st.st_size, st.st_mtime_ns, entry.inode())
+        except OSError:
+            return None
+        return subdirs, files
+
+    def open(self, path: str) -> BinaryIO:
+        return open(path, "rb", buffering=0)
+
+
+class CachedFileSystem(FileSystem):
+    """Memoises the :meth:`stat` answers of *inner* for the lifetime of one build.
+
+    Listings are passed through (the payload walk reads each directory
+    once) but the file stats they carry fill the cache.  *hits* and
+    *misses* count :meth:`stat` calls.  Safe to use from several threads.
+    """
+
+    def __init__(self, inner: FileSystem) -> None:
+        self.inner = inner
+        self.hits = 0
+        self.misses = 0
+        self._stats: Dict[str, Optional[FileStat]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stat(self, path: str) -> Optional[FileStat]:
+        with self._lock:
+            if path in self._stats:
+                self.hits += 1
+                return self._stats[path]
+            self.misses += 1
+        st = self.inner.stat(path)
+        with self._lock:
+            self._stats[path] = st
+        return st
+
+    def scan(self, path: str) -> Optional[Listing]:
+        listing = self.inner.scan(path)
+        if listing is not None:
+            prefix = os.path.join(path, "")
+            with self._lock:
+                for name, st in listing[1].items():
+                    self._stats[prefix + name] = st
+        return listing
+
+    def open(self, path: str) -> BinaryIO:
+        return self.inner.open(path)
+
+
+class MemoryFileSystem(FileSystem):
+    """An in-memory tree: ``MemoryFileSystem({"/src/app.exe": b"MZ"})``.
+
+    Paths are made absolute (against the working directory) and
+    normalised; parent directories are created as files are added.
+    """
+
+    def __init__(self, files: Optional[Mapping[str, bytes]] = None) -> None:
+        self._files: Dict[str, Tuple[bytes, int, int]] = {}
+        self._dirs: Dict[str, Tuple[Set[str], int]] = {}
+        self._next_ino = 1
+        for path, data in (files or {}).items():
+            self.add_file(path, data)
+
+    def add_file(self, path: str, data: bytes = b"", mtime_ns: int = 0) -> None:
+        path = os.path.abspath(path)
+        self._add_parent(path)
+        self._files[path] = (data, mtime_ns, self._ino())
+
+    def add_dir(self, path: str) -> None:
+        path = os.path.abspath(path)
+        if path not in self._dirs:
+            if os.path.dirname(path) != path:
+                self._add_parent(path)
+            self._dirs[path] = (set(), self._ino())
+
+    def _add_parent(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        self.add_dir(parent)
+        self._dirs[parent][0].add(os.path.basename(path))
+
+    def _ino(self) -> int:
+        self._next_ino += 1
+        return self._next_ino
+
+    def stat(self, path: str) -> Optional[FileStat]:
+        path = os.path.abspath(path)
+        if path in self._files:
+            data, mtime_ns, ino = self._files[path]
+            return FileStat(False, len(data), mtime_ns, ino)
+        if path in self._dirs:
+            return FileStat(True, 0, 0, self._dirs[path][1])
+        return None
+
+    def scan(self, path: str) -> Optional[Listing]:
+        path = os.path.abspath(path)
+        if path not in self._dirs:
+            return None
+        subdirs: List[str] = []
+        files: Dict[str, FileStat] = {}
+        for name in sorted(self._dirs[path][0]):
+            child = os.path.join(path, name)
+            if child in self._dirs:
+                subdirs.append(name)
+            else:
+                data, mtime_ns, ino = self._files[child]
+                files[name] = FileStat(False, len(data), mtime_ns, ino)
+        return subdirs, files
+
+    def open(self, path: str) -> BinaryIO:
+        path = os.path.abspath(path)
+        if path not in self._files:
+            raise FileNotFoundError(path)
+        return io.BytesIO(self._files[path][0])
@@ -0,0 +1,455 @@
+"""
+Backend-neutral installer IR.
+
+:func:`build_plan` lowers a :class:`PackageConfig` once into an
+:class:`InstallerPlan` — plain lists of installer operations (set output
+path, copy file, download, write registry, shortcut, environment update,
+exec).  Backends serialise the plan; analysers and optimisation passes
+inspect or rewrite it instead of re-deriving data from the config or
+re-parsing generated script text.
+
+Values in the plan are already variable-resolved for the context's
+target tool.  File sources stay as written in the config (relative to
+the config directory); turning them into script paths is the backend's
+job.  With :attr:`BuildContext.expand_sources` set, when payload
+filters apply to a source, or when it holds a file too large for the
+installer, local sources are instead expanded from the payload index
+into one ``CopyFile`` per file (absolute paths), grouped by destination
+directory.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from ..variables import BUILTIN_VARIABLES
+from .payload_filter import PayloadFilter
+
+if TYPE_CHECKING:
+    from ..config import EnvVarEntry, FileAssociation
+    from .context import BuildContext
+    from .package_index import IndexedPackage
+
+
+# -----------------------------------------------------------------------
+# Operations
+# -----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class SetOutPath:
+    """Make *path* the destination directory for following copies."""
+    path: str
+
+
+@dataclass(frozen=True)
+class CopyFile:
+    """Install a local file (or glob / directory when *recursive*)."""
+    source: str
+    recursive: bool = False
+
+
+@dataclass(frozen=True)
+class CopyInstalled:
+    """Copy a file an earlier operation installed to *target* (see :mod:`.dedupe`).
+
+    Both paths are on the target machine.  With *hardlink* the copy is a
+    hard link where the volume supports one.
+    """
+    source: str
+    target: str
+    hardlink: bool = False
+
+
+@dataclass(frozen=True)
+class CopyExternal:
+    """Install a local file from volumes shipped beside the installer (see :mod:`.volumes`).
+
+    Like :class:`CopyFile` it goes to the current output path.  *volume*
+    is the installer-relative stem of its *volumes* pieces; *size* and
+    *sha256* describe the whole file.
+    """
+    source: str
+    volume: str
+    volumes: int
+    size: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class Download:
+    """Fetch *url* into *destination* at install time."""
+    url: str
+    filename: str
+    destination: str
+    checksum_type: str = ""
+    checksum_value: str = ""
+    decompress: bool = False
+
+
+@dataclass(frozen=True)
+class WriteRegistry:
+    """Write one registry value.  *view* is ``"32"``, ``"64"`` or ``None`` (default view)."""
+    hive: str
+    key: str
+    name: str
+    value: str
+    type: str = "string"   # "string" | "expand" | "dword"
+    view: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CreateDirectory:
+    path: str
+
+
+@dataclass(frozen=True)
+class CreateShortcut:
+    link: str
+    target: str
+
+
+@dataclass(frozen=True)
+class UpdateEnvVar:
+    """Set an environment variable, or append to a PATH-style list."""
+    name: str
+    value: str
+    scope: str
+    hive: str
+    key: str
+    append: bool = False
+
+
+@dataclass(frozen=True)
+class Exec:
+    command: str
+    wait: bool = True
+
+
+Op = Union[
+    SetOutPath, CopyFile, CopyInstalled, CopyExternal, Download, WriteRegistry, CreateDirectory, CreateShortcut,
+    UpdateEnvVar, Exec,
+]
+
+
+# -----------------------------------------------------------------------
+# Containers
+# -----------------------------------------------------------------------
+
+@dataclass
+class Step:
+    """An ordered group of operations that belong together (one shortcut, one association …)."""
+    title: str
+    ops: List[Op] = field(default_factory=list)
+
+
+@dataclass
+class Component:
+    """A selectable leaf package."""
+    name: str
+    section_id: str
+    optional: bool = False
+    default: bool = True
+    description: str = ""
+    ops: List[Op] = field(default_factory=list)
+    post_install: List[Exec] = field(default_factory=list)
+
+
+@dataclass
+class ComponentGroup:
+    """A named group of components (``children`` in the config)."""
+    name: str
+    children: List[ComponentNode] = field(default_factory=list)
+
+
+ComponentNode = Union[Component, ComponentGroup]
+
+
+@dataclass
+class InstallerPlan:
+    """Everything the installer does, in execution order per category."""
+    files: List[Op] = field(default_factory=list)
+    registry: List[WriteRegistry] = field(default_factory=list)
+    env_vars: List[UpdateEnvVar] = field(default_factory=list)
+    shortcuts: List[Step] = field(default_factory=list)
+    associations: List[Step] = field(default_factory=list)
+    components: List[ComponentNode] = field(default_factory=list)
+
+
+# -----------------------------------------------------------------------
+# Lowering
+# -----------------------------------------------------------------------
+
+def build_plan(ctx: BuildContext) -> InstallerPlan:
+    """Lower ``ctx.config`` into an :class:`InstallerPlan`."""
+    cfg = ctx.config
+    return InstallerPlan(
+        files=_file_ops(ctx),
+        registry=[
+            WriteRegistry(
+                hive=entry.hive,
+                key=ctx.resolve(entry.key),
+                name=entry.name,
+                value=ctx.resolve(entry.value),
+                type=entry.type,
+                view=entry.view if entry.view in ("32", "64") else None,
+            )
+            for entry in cfg.install.registry_entries
+        ],
+        env_vars=[
+            UpdateEnvVar(
+                name=env.name,
+                value=ctx.resolve(env.value),
+                scope=env.scope,
+                hive=hive,
+                key=key,
+                append=bool(env.append and env.name.upper() == "PATH"),
+            )
+            for env in cfg.install.env_vars
+            for hive, key in [env_hive_key(env)]
+        ],
+        shortcuts=_shortcut_steps(ctx),
+        associations=_association_steps(ctx),
+        components=_component_nodes(ctx),
+    )
+
+
+def is_recursive_glob(source: str) -> bool:
+    """``**`` in a source means "copy the matching tree recursively"."""
+    return bool(source) and "**" in source
+
+
+def env_hive_key(env: EnvVarEntry) -> Tuple[str, str]:
+    scope = (env.scope or "system").lower()
+    if scope == "system":
+        return "HKLM", "SYSTEM\\CurrentControlSet\\Control\\Session Manager\\Environment"
+    return "HKCU", "Environment"
+
+
+def fa_hive_prefix(fa: FileAssociation) -> Tuple[str, str]:
+    if getattr(fa, "register_for_all_users", True):
+        return "HKCR", ""
+    return "HKCU", "Software\\Classes\\"
+
+
+def iter_components(nodes: List[ComponentNode]) -> List[Component]:
+    """Leaf components of *nodes* in section order."""
+    flat: List[Component] = []
+    stack: List[ComponentNode] = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ComponentGroup):
+            stack.extend(reversed(node.children))
+        else:
+            flat.append(node)
+    return flat
+
+
+def expand_groups(
+    ctx: BuildContext,
+    source: str,
+    recursive: bool,
+    dest: str,
+    filters: Optional[PayloadFilter] = None,
+) -> Optional[List[Tuple[str, List[str]]]]:
+    """``[(out_dir, [file, ...]), ...]`` installing *source* into *dest* file by file.
+
+    Directories are sorted (*dest* itself first) and so are the files in
+    each.  ``None`` means "copy *source* as written": expansion is off,
+    no *filters* apply and none of its files ships in volumes, or the
+    source does not exist (the backend reports it).
+    """
+    if not ctx.expand_sources and filters is None and not _ships_externally(ctx, source, recursive):
+        return None
+    files = ctx.payload_files(source, recursive, filters)
+    if files is None:
+        return None
+    groups: Dict[str, Tuple[str, List[str]]] = {}
+    base = dest.rstrip("\\")
+    for rel, path in files:
+        folder = rel.rpartition("/")[0]
+        if folder not in groups:
+            out_dir = base + "\\" + folder.replace("/", "\\") if folder else dest
+            groups[folder] = (out_dir, [])
+        groups[folder][1].append(path)
+    return [groups[folder] for folder in sorted(groups)]
+
+
+def _ships_externally(ctx: BuildContext, source: str, recursive: bool) -> bool:
+    # A source holding a file too large for the installer is expanded so
+    # that file gets a copy of its own (see volumes.py).
+    external = ctx.payload_external()
+    if not external:
+        return False
+    paths = {path for path, _, _ in external}
+    return any(f.path in paths for _, f in ctx.payload.expand(source, recursive))
+
+
+def _set_out_path(ops: List[Op], path: str) -> None:
+    # A SetOutPath with nothing after it yet is replaced, not followed.
+    if ops and isinstance(ops[-1], SetOutPath):
+        ops[-1] = SetOutPath(path)
+    else:
+        ops.append(SetOutPath(path))
+
+
+def _file_ops(ctx: BuildContext) -> List[Op]:
+    ops: List[Op] = []
+    current_outpath: Optional[str] = None
+    for fe in ctx.config.files:
+        dest = fe.destination or "$INSTDIR"
+        recursive = is_recursive_glob(fe.source) or fe.recursive
+        groups = None if fe.is_remote else expand_groups(
+            ctx, fe.source, recursive, dest, PayloadFilter.from_configs(ctx.config.filters, fe.filters),
+        )
+        if groups is not None:
+            for out_dir, paths in groups:
+                if out_dir != current_outpath:
+                    _set_out_path(ops, out_dir)
+                    current_outpath = out_dir
+                ops.extend(CopyFile(path) for path in paths)
+            continue
+        if dest != current_outpath:
+            ops.append(SetOutPath(dest))
+            current_outpath = dest
+        if fe.is_remote:
+            ops.append(Download(
+                url=fe.source,
+                filename=fe.source.rsplit("/", 1)[-1] or "download",
+                destination=dest,
+                checksum_type=fe.checksum_type,
+                checksum_value=fe.checksum_value,
+                decompress=fe.decompress,
+            ))
+        else:
+            ops.append(CopyFile(fe.source, recursive=recursive))
+    return ops
+
+
+def _shortcut_target(ctx: BuildContext, target: str) -> str:
+    target = ctx.resolve(target)
+    # Already rooted: a drive, or a built-in folder in the target tool's syntax.
+    folders = tuple(ctx.resolve(f"${name}") for name in BUILTIN_VARIABLES)
+    if not (target.startswith("$") or target.startswith(folders) or re.match(r"^[A-Za-z]:\\", target)):
+        target = f"{ctx.resolve('$INSTDIR')}\\{target}"
+    return target
+
+
+def _shortcut_steps(ctx: BuildContext) -> List[Step]:
+    install = ctx.config.install
+    steps: List[Step] = []
+
+    desktop_sc = install.desktop_shortcut
+    if desktop_sc and desktop_sc.target:
+        # Use custom name if provided, otherwise use ${APP_NAME}
+        name = ctx.resolve(desktop_sc.name) if desktop_sc.name else "${APP_NAME}"
+        steps.append(Step("Desktop shortcut", [
+            CreateShortcut(f"$DESKTOP\\{name}.lnk", _shortcut_target(ctx, desktop_sc.target)),
+        ]))
+
+    start_sc = install.start_menu_shortcut
+    if start_sc and start_sc.target:
+        name = ctx.resolve(start_sc.name) if start_sc.name else "${APP_NAME}"
+        steps.append(Step("Start menu shortcuts", [
+            CreateDirectory("$SMPROGRAMS\\${APP_NAME}"),
+            CreateShortcut(f"$SMPROGRAMS\\${{APP_NAME}}\\{name}.lnk", _shortcut_target(ctx, start_sc.target)),
+            CreateShortcut("$SMPROGRAMS\\${APP_NAME}\\Uninstall.lnk", "$INSTDIR\\Uninstall.exe"),
+        ]))
+    return steps
+
+
+def _association_steps(ctx: BuildContext) -> List[Step]:
+    steps: List[Step] = []
+    for fa in ctx.config.install.file_associations:
+        hive, prefix = fa_hive_prefix(fa)
+        ops: List[Op] = [WriteRegistry(hive, f"{prefix}{fa.extension}", "", fa.prog_id)]
+        if fa.prog_id:
+            ops.append(WriteRegistry(hive, f"{prefix}{fa.prog_id}", "", fa.description))
+        if fa.default_icon:
+            ops.append(WriteRegistry(hive, f"{prefix}{fa.prog_id}\\DefaultIcon", "", fa.default_icon))
+        verbs = fa.verbs or {}
+        if verbs:
+            for verb, cmd in verbs.items():
+                ops.append(WriteRegistry(hive, f"{prefix}{fa.prog_id}\\Shell\\{verb}\\Command", "", cmd))
+        elif fa.application:
+            ops.append(WriteRegistry(hive, f"{prefix}{fa.prog_id}\\Shell\\Open\\Command", "", f'{fa.application} \\"%1\\"'))
+        steps.append(Step(f"File association: {fa.extension} -> {fa.application}", ops))
+    return steps
+
+
+def package_filter(ctx: BuildContext, node: IndexedPackage) -> Optional[PayloadFilter]:
+    """Global, enclosing-group and own payload filters of a package, combined."""
+    return ctx.shared.package_filters[node.index]  # type: ignore[union-attr]
+
+
+def files_size(ctx: BuildContext) -> int:
+    """Bytes the top-level ``files`` entries install from the local payload."""
+    cfg = ctx.config
+    return sum(
+        ctx.payload_size(
+            fe.source, is_recursive_glob(fe.source) or fe.recursive,
+            PayloadFilter.from_configs(cfg.filters, fe.filters),
+        )
+        for fe in cfg.files if not fe.is_remote
+    )
+
+
+def package_size(ctx: BuildContext, node: IndexedPackage) -> int:
+    """Bytes a package installs from its own sources (not its children's)."""
+    filters = package_filter(ctx, node)
+    total = 0
+    for src_entry in node.package.sources:
+        src_val = src_entry.get("source", "")
+        for src in (src_val if isinstance(src_val, list) else [src_val]):
+            if src:
+                total += ctx.payload_size(src, is_recursive_glob(src), filters)
+    return total
+
+
+def size_kb(size: int) -> int:
+    """*size* bytes in whole KB, rounded up (the unit of NSIS section sizes)."""
+    return (size + 1023) // 1024
+
+
+def _component_nodes(ctx: BuildContext) -> List[ComponentNode]:
+    index = ctx.packages
+    built: Dict[int, ComponentNode] = {}
+    # Children come after their parent in pre-order, so building from the
+    # end has every child ready before its group.
+    for node in reversed(index.nodes):
+        pkg = node.package
+        if node.is_group:
+            built[node.index] = ComponentGroup(pkg.name, [built[i] for i in node.children])
+            continue
+        ops: List[Op] = []
+        filters = package_filter(ctx, node)
+        for src_entry in pkg.sources:
+            src_val = src_entry.get("source", "")
+            dest = src_entry.get("destination", "$INSTDIR")
+            ops.append(SetOutPath(dest))
+            current = dest
+            for src in (src_val if isinstance(src_val, list) else [src_val]):
+                groups = expand_groups(ctx, src, is_recursive_glob(src), dest, filters)
+                if groups is None:
+                    if current != dest:
+                        ops.append(SetOutPath(dest))
+                        current = dest
+                    ops.append(CopyFile(src, recursive=is_recursive_glob(src)))
+                    continue
+                for out_dir, paths in groups:
+                    if out_dir != current:
+                        _set_out_path(ops, out_dir)
+                        current = out_dir
+                    ops.extend(CopyFile(path) for path in paths)
+        assert node.section_id is not None  # every leaf is a section
+        built[node.index] = Component(
+            name=pkg.name,
+            section_id=node.section_id,
+            optional=pkg.optional,
+            default=pkg.default,
+            description=pkg.description,
+            ops=ops,
+            post_install=[Exec(cmd) for cmd in pkg.post_install],
+        )
+    return [built[i] for i in index.roots]
@@ -0,0 +1,65 @@
+"""
+Compact NSIS emission for machine-only scripts.
+
+:func:`compact_script` drops comments, blank lines and indentation and
+renames internal (``_``-prefixed) jump labels to short ones.  None of
+that changes what makensis compiles: comments and blank lines are not
+instructions, so relative jumps (``+3``) still land on the same
+instruction, and labels are scoped to their Section / Function, so
+renaming them consistently within one chunk is safe.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List
+
+_LABEL_DEF_RE = re.compile(r"^\s*(_[A-Za-z0-9_]*[A-Za-z][A-Za-z0-9_]*):\s*$")
+_QUOTES = "\"'`"
+
+
+def compact_script(text: str) -> str:
+    """Return *text* without comments, blank lines, indentation and long labels."""
+    lines: List[str] = []
+    for line in text.split("\n"):
+        stripped = _strip_comment(line).strip()
+        if stripped:
+            lines.append(stripped)
+    return _shorten_labels("\n".join(lines))
+
+
+def _strip_comment(line: str) -> str:
+    """Cut a ``;`` / ``#`` comment that is not inside a quoted string."""
+    stripped = line.lstrip()
+    if stripped.startswith((";", "#")):
+        return ""
+    quote = ""
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if line.startswith("$\\", i):
+                i += 3  # escaped character ($\" $\r …)
+                continue
+            if ch == quote:
+                quote = ""
+        elif ch in _QUOTES:
+            quote = ch
+        elif ch == ";" and (i == 0 or line[i - 1] in " \t"):
+            return line[:i]
+        i += 1
+    return line
+
+
+def _shorten_labels(text: str) -> str:
+    names: Dict[str, str] = {}
+    for line in text.split("\n"):
+        m = _LABEL_DEF_RE.match(line)
+        if m and m.group(1) not in names:
+            names[m.group(1)] = f"_{len(names)}"
+    if not names:
+        return text
+    pattern = re.compile(
+        r"(?<![\w.$])(" + "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True)) + r")(?![\w.])"
+    )
+    return pattern.sub(lambda m: names[m.group(1)], text)
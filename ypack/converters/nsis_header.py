@@ -4,7 +4,6 @@ NSIS script header generation — defines, includes, unicode, icons.
 
 from __future__ import annotations
 
-import os
 from typing import List
 
 from .context import BuildContext
@@ -34,6 +33,8 @@ def generate_header(ctx: BuildContext) -> List[str]:
         reg_key = f"Software\\{cfg.app.publisher}\\{cfg.app.name}"
     reg_key = ctx.resolve(reg_key)
     lines.append(f'!define REG_KEY "{reg_key}"')
+    if ctx.build_timestamp is not None:
+        lines.append(f'!define BUILD_TIMESTAMP "{ctx.build_timestamp}"')
     lines.append("")
 
     # MUI icon defines (must appear before !include MUI2.nsh)
@@ -43,14 +44,16 @@ def generate_header(ctx: BuildContext) -> List[str]:
         lines.append("; --- Modern UI Icons ---")
         if install_icon:
             abs_path = ctx.resolve_path(install_icon)
-            rel_path = ctx.relative_to_output(abs_path) if os.path.exists(abs_path) else install_icon
-            if not os.path.exists(abs_path):
+            found = ctx.exists(abs_path)
+            rel_path = ctx.relative_to_output(abs_path) if found else install_icon
+            if not found:
                 lines.append(f"; WARNING: Install icon not found: {install_icon}")
             lines.append(f'!define MUI_ICON "{rel_path}"')
         if uninstall_icon:
             abs_path = ctx.resolve_path(uninstall_icon)
-            rel_path = ctx.relative_to_output(abs_path) if os.path.exists(abs_path) else uninstall_icon
-            if not os.path.exists(abs_path):
+            found = ctx.exists(abs_path)
+            rel_path = ctx.relative_to_output(abs_path) if found else uninstall_icon
+            if not found:
                 lines.append(f"; WARNING: Uninstall icon not found: {uninstall_icon}")
             lines.append(f'!define MUI_UNICON "{rel_path}"')
         lines.append("")
@@ -58,7 +61,7 @@ def generate_header(ctx: BuildContext) -> List[str]:
     # License file (put near top with other top-level defines)
     if cfg.app.license:
         abs_path = ctx.resolve_path(cfg.app.license)
-        if os.path.exists(abs_path):
+        if ctx.exists(abs_path):
             rel_path = ctx.relative_to_output(abs_path)
             lines.append(f'!define LICENSE_FILE "{rel_path}"')
         else:
@@ -100,6 +103,10 @@ def generate_general_settings(ctx: BuildContext) -> List[str]:
     if cfg.app.license:
         lines.append('LicenseData "${LICENSE_FILE}"')
 
+    # Reproducible builds: don't embed source file modification times
+    if ctx.source_date_epoch is not None:
+        lines.append("SetDateSave off")
+
     # Silent install support
     if cfg.install.silent_install:
         lines.append("SilentInstall silent")
@@ -148,6 +155,7 @@ def generate_modern_ui(ctx: BuildContext) -> List[str]:
 
     if cfg.packages:
         lines.append("!insertmacro MUI_PAGE_COMPONENTS")
+    lines.extend(ctx.hook("pages"))
 
     # If existing-install handling allows multiple installations, we
     # defer path-specific checks until the user has chosen an install
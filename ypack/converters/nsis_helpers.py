@@ -1,300 +1,174 @@
 """
-NSIS helper functions emitted into the generated script.
-
-Contains:
-- Logging macros (LogInit / LogWrite / LogClose) — fallback file-based
-  logging when the NSIS build does not support ``LogSet``.
-- PATH manipulation helpers (_Contains, _NormalizePathEntry,
-  _RemovePathEntry) that are only included when ``append=True`` env vars
-  are present.
-- VerifyChecksum / ExtractArchive stubs.
+NSIS helper library wiring.
+
+The helpers themselves live in ``ypack/nsis/*.nsh`` and ship as package
+data; generated scripts pull them in with ``!addincludedir`` /
+``!include`` and only expand the functions they call:
+
+- ``ypack_log.nsh`` — logging macros (LogInit / LogWrite / LogClose),
+  fallback file-based logging when the NSIS build does not support
+  ``LogSet``.
+- ``ypack_path.nsh`` — PATH manipulation helpers (_StrContains,
+  _AppendPathEntry, _RemovePathEntry) for ``append=True`` env vars.
+- ``ypack_download.nsh`` — _DownloadFile, shared by every remote file
+  entry, and the VerifyChecksum / ExtractArchive stubs.
+- ``ypack_volume.nsh`` — _JoinVolume, which reassembles files shipped in
+  volumes next to the installer (see ``volumes.py``).
+
+Every library defines ``YPACK_<NAME>_NSH`` to its version; the script
+refuses to compile against a different one.
 """
 
 from __future__ import annotations
 
+import os
 from typing import List
 
 from .context import BuildContext
+from .volumes import external_ops
+
+#: Directory holding the bundled ``.nsh`` files.
+HELPER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nsis")
 
+#: Version of the helper library the generated scripts are written against.
+HELPER_VERSION = 1
 
-# -----------------------------------------------------------------------
-# Logging macros
-# -----------------------------------------------------------------------
+#: Directory next to the script (relative, so the script embeds no
+#: build-machine path) that :func:`write_helper_libraries` fills.
+HELPER_INCLUDE_DIR = "ypack_nsis"
 
-def generate_log_macros() -> List[str]:
-    r"""Emit reusable ``!macro`` blocks for structured install/uninstall logging.
 
-    Three macros are generated:
+def helper_libraries(ctx: BuildContext) -> List[str]:
+    """Names of the ``.nsh`` files the script for *ctx* needs, in include order."""
+    libs: List[str] = []
+    if ctx.config.logging and ctx.config.logging.enabled:
+        libs.append("ypack_log.nsh")
+    if _path_appends(ctx) or _path_removes(ctx):
+        libs.append("ypack_path.nsh")
+    files = ctx.config.files
+    if any(fe.is_remote or fe.checksum_type for fe in files):
+        libs.append("ypack_download.nsh")
+    if _ships_volumes(ctx):
+        libs.append("ypack_volume.nsh")
+    return libs
 
-    * **LogInit** – opens (or creates) the log file and writes a header.
-    * **LogWrite** ``<message>`` – appends one timestamped line.
-    * **LogClose** – writes a footer and closes the file handle.
 
-    The macros use compile-time ``!ifdef LOG_FILE`` guards so they
-    silently become no-ops when logging is not configured.  They are
-    safe to call from *any* Section or Function (installer **and**
-    uninstaller) because ``!macro`` expansion is context-free.
+def generate_helper_includes(ctx: BuildContext) -> List[str]:
+    """Emit ``!addincludedir`` plus one version-checked ``!include`` per library.
 
-    The file handle ``$_LOG_HANDLE`` is stored in ``$R9`` (callers
-    should not clobber it between LogInit and LogClose).
+    ``YPACK_INCLUDE_DIR`` defaults to :data:`HELPER_INCLUDE_DIR`, which
+    makensis resolves against the script's directory; saving the script
+    copies the libraries there.  It can be overridden on the makensis
+    command line (``/DYPACK_INCLUDE_DIR=…``).
     """
-    return [
+    libs = helper_libraries(ctx)
+    if not libs:
+        return []
+
+    lines: List[str] = [
         "; ===========================================================================",
-        "; Logging Macros",
+        "; xswl-YPack helper library",
         "; ===========================================================================",
-        "",
-        "; --- Var for log file handle ---",
-        "Var _LOG_HANDLE",
-        "",
-        "; ---------------------------------------------------------------------------",
-        "; LogInit – open log file and write header",
-        ";   Usage: !insertmacro LogInit <title>",
-        ";          e.g.  !insertmacro LogInit \"Install\"",
-        ";   Note: Installer uses 'w' (write/truncate) to start fresh; Uninstaller",
-        ";         uses 'a' (append) so both install and uninstall logs are kept.",
-        "; ---------------------------------------------------------------------------",
-        "!macro LogInit _title",
-        "!ifdef LOG_FILE",
-        '  CreateDirectory "$INSTDIR"',
-        '  !ifdef __UNINSTALL__',
-        '    ; Uninstaller: append to existing log',
-        '    FileOpen $_LOG_HANDLE "${LOG_FILE}" a',
-        '  !else',
-        '    ; Installer: start fresh (truncate old log)',
-        '    FileOpen $_LOG_HANDLE "${LOG_FILE}" w',
-        '  !endif',
-        '  FileSeek $_LOG_HANDLE 0 END',
-        '  FileWrite $_LOG_HANDLE "=======================================================$\\r$\\n"',
-        '  FileWrite $_LOG_HANDLE "${APP_NAME} ${APP_VERSION} - ${_title}$\\r$\\n"',
-        '  FileWrite $_LOG_HANDLE "Date: ${__DATE__} ${__TIME__}$\\r$\\n"',
-        '  FileWrite $_LOG_HANDLE "=======================================================$\\r$\\n"',
+        "!ifndef YPACK_INCLUDE_DIR",
+        f'  !define YPACK_INCLUDE_DIR "{HELPER_INCLUDE_DIR}"',
         "!endif",
-        "!macroend",
-        "",
-        "; ---------------------------------------------------------------------------",
-        "; LogWrite – append a single message line",
-        ";   Usage: !insertmacro LogWrite <message>",
-        "; ---------------------------------------------------------------------------",
-        "!macro LogWrite _msg",
-        "!ifdef LOG_FILE",
-        '  FileWrite $_LOG_HANDLE "[${__DATE__} ${__TIME__}] ${_msg}$\\r$\\n"',
-        "!endif",
-        "!macroend",
-        "",
-        "; ---------------------------------------------------------------------------",
-        "; LogClose – write footer and close the file",
-        "; ---------------------------------------------------------------------------",
-        "!macro LogClose",
-        "!ifdef LOG_FILE",
-        '  FileWrite $_LOG_HANDLE "-------------------------------------------------------$\\r$\\n"',
-        '  FileWrite $_LOG_HANDLE "Completed.$\\r$\\n$\\r$\\n"',
-        '  FileClose $_LOG_HANDLE',
-        "!endif",
-        "!macroend",
-        "",
+        '!addincludedir "${YPACK_INCLUDE_DIR}"',
     ]
+    for lib in libs:
+        guard = "YPACK_" + os.path.splitext(lib)[0][len("ypack_"):].upper() + "_NSH"
+        lines.extend([
+            f'!include "{lib}"',
+            f"!if ${{{guard}}} != {HELPER_VERSION}",
+            f'  !error "{lib} is version ${{{guard}}}, this script needs {HELPER_VERSION}"',
+            "!endif",
+        ])
+    lines.append("")
+    return lines
 
 
-def generate_path_helpers(ctx: BuildContext) -> List[str]:
-    """Emit NSIS helper functions for PATH append / remove.
+def write_helper_libraries(ctx: BuildContext, directory: str) -> List[str]:
+    """Copy the libraries the script for *ctx* includes to ``<directory>/ypack_nsis``.
 
-    These helpers are correct pure-NSIS and do NOT rely on
-    ``StrRep.nsh`` or any third-party includes.
+    Returns the files written; copies that are already current are left alone.
     """
-    lines: List[str] = []
+    written: List[str] = []
+    target_dir = os.path.join(directory, HELPER_INCLUDE_DIR)
+    for lib in helper_libraries(ctx):
+        with open(os.path.join(HELPER_DIR, lib), "rb") as fh:
+            data = fh.read()
+        target = os.path.join(target_dir, lib)
+        if os.path.isfile(target):
+            with open(target, "rb") as fh:
+                if fh.read() == data:
+                    continue
+        os.makedirs(target_dir, exist_ok=True)
+        with open(target, "wb") as fh:
+            fh.write(data)
+        written.append(target)
+    return written
 
-    lines.extend([
-        "; ---------------------------------------------------------------------------",
-        "; Helper: _StrContains — check if $1 (needle) is in $0 (haystack)",
-        ";   Returns $R9 = 1 if found, 0 otherwise; $R8 = index of match",
-        "; ---------------------------------------------------------------------------",
-        "Function _StrContains",
-        "  Push $R0",
-        "  Push $R1",
-        "  Push $R2",
-        "  Push $R3",
-        "  Push $R4",
-        "",
-        "  StrLen $R2 $0  ; haystack length",
-        "  StrLen $R3 $1  ; needle length",
-        "  StrCpy $R9 0   ; default: not found",
-        "  StrCpy $R8 -1",
-        "",
-        "  ; Edge case: empty needle always matches at 0",
-        "  IntCmp $R3 0 _sc_found 0 0",
-        "",
-        "  ; If needle is longer than haystack, cannot match",
-        "  IntCmp $R3 $R2 0 0 _sc_done",
-        "",
-        "  IntOp $R4 $R2 - $R3  ; last valid start index",
-        "  StrCpy $R0 0          ; current index",
-        "",
-        "_sc_loop:",
-        "  IntCmp $R0 $R4 0 0 _sc_done    ; index > last valid → done",
-        "  StrCpy $R1 $0 $R3 $R0          ; extract substring",
-        "  StrCmp $R1 $1 _sc_found",
-        "  IntOp $R0 $R0 + 1",
-        "  Goto _sc_loop",
-        "",
-        "_sc_found:",
-        "  StrCpy $R9 1",
-        "  StrCpy $R8 $R0",
-        "",
-        "_sc_done:",
-        "  Pop $R4",
-        "  Pop $R3",
-        "  Pop $R2",
-        "  Pop $R1",
-        "  Pop $R0",
-        "FunctionEnd",
-        "",
-    ])
 
-    lines.extend([
-        "; ---------------------------------------------------------------------------",
-        "; Helper: _RemovePathEntry — remove exact semicolon-delimited entry $1 from $0",
-        ";   Modifies $0 in-place.",
-        "; ---------------------------------------------------------------------------",
-        "Function _RemovePathEntry",
-        "  Push $R0",
-        "  Push $R1",
-        "  Push $R2",
-        "  Push $R3",
-        "",
-        '  StrCpy $0 ";$0;"   ; wrap so every entry has ; on both sides',
-        '  StrCpy $1 ";$1;"',
-        "",
-        "_rpe_loop:",
-        "  ; Check if $1 exists in $0",
-        "  Push $0",
-        "  Push $1",
-        "  Call _StrContains",
-        '  StrCmp $R9 "0" _rpe_done',
-        "",
-        "  ; Found at $R8 — splice it out",
-        "  StrLen $R2 $1",
-        "  StrCpy $R0 $0 $R8          ; prefix",
-        "  IntOp $R3 $R8 + $R2",
-        "  StrCpy $R1 $0 '' $R3       ; suffix",
-        '  StrCpy $0 "$R0$R1"',
-        "  Goto _rpe_loop",
-        "",
-        "_rpe_done:",
-        "  ; Strip wrapping semicolons",
-        "  StrLen $R2 $0",
-        "  IntOp $R2 $R2 - 2",
-        "  IntCmp $R2 0 _rpe_empty 0 0",
-        "  StrCpy $0 $0 $R2 1",
-        "  Goto _rpe_exit",
-        "",
-        "_rpe_empty:",
-        '  StrCpy $0 ""',
-        "",
-        "_rpe_exit:",
-        "  Pop $R3",
-        "  Pop $R2",
-        "  Pop $R1",
-        "  Pop $R0",
-        "FunctionEnd",
-        "",
-    ])
+def generate_path_helpers(ctx: BuildContext) -> List[str]:
+    """Define the PATH helper functions the sections call.
+
+    The installer needs ``_StrContains`` / ``_AppendPathEntry``; the
+    uninstaller needs ``un.``-prefixed copies of ``_StrContains`` /
+    ``_RemovePathEntry``.  Both variants expand from the same macro in
+    ``ypack_path.nsh``.
+    """
+    lines: List[str] = []
+    if _path_appends(ctx):
+        lines.extend([
+            '!insertmacro YPackStrContains ""',
+            '!insertmacro YPackAppendPathEntry ""',
+        ])
+    if _path_removes(ctx):
+        lines.extend([
+            '!insertmacro YPackStrContains "un."',
+            '!insertmacro YPackRemovePathEntry "un."',
+        ])
+    if lines:
+        lines.insert(0, "; --- PATH helpers (ypack_path.nsh) ---")
+        lines.append("")
+    return lines
 
-    # Uninstaller copies — NSIS requires un.Function for uninstaller
-    lines.extend([
-        "; Uninstaller copies of the above helpers",
-        "Function un._StrContains",
-        "  Push $R0",
-        "  Push $R1",
-        "  Push $R2",
-        "  Push $R3",
-        "  Push $R4",
-        "  StrLen $R2 $0",
-        "  StrLen $R3 $1",
-        "  StrCpy $R9 0",
-        "  StrCpy $R8 -1",
-        "  IntCmp $R3 0 _usc_found 0 0",
-        "  IntCmp $R3 $R2 0 0 _usc_done",
-        "  IntOp $R4 $R2 - $R3",
-        "  StrCpy $R0 0",
-        "_usc_loop:",
-        "  IntCmp $R0 $R4 0 0 _usc_done",
-        "  StrCpy $R1 $0 $R3 $R0",
-        "  StrCmp $R1 $1 _usc_found",
-        "  IntOp $R0 $R0 + 1",
-        "  Goto _usc_loop",
-        "_usc_found:",
-        "  StrCpy $R9 1",
-        "  StrCpy $R8 $R0",
-        "_usc_done:",
-        "  Pop $R4",
-        "  Pop $R3",
-        "  Pop $R2",
-        "  Pop $R1",
-        "  Pop $R0",
-        "FunctionEnd",
-        "",
-        "Function un._RemovePathEntry",
-        "  Push $R0",
-        "  Push $R1",
-        "  Push $R2",
-        "  Push $R3",
-        '  StrCpy $0 ";$0;"',
-        '  StrCpy $1 ";$1;"',
-        "_urpe_loop:",
-        "  Push $0",
-        "  Push $1",
-        "  Call un._StrContains",
-        '  StrCmp $R9 "0" _urpe_done',
-        "  StrLen $R2 $1",
-        "  StrCpy $R0 $0 $R8",
-        "  IntOp $R3 $R8 + $R2",
-        "  StrCpy $R1 $0 '' $R3",
-        '  StrCpy $0 "$R0$R1"',
-        "  Goto _urpe_loop",
-        "_urpe_done:",
-        "  StrLen $R2 $0",
-        "  IntOp $R2 $R2 - 2",
-        "  IntCmp $R2 0 _urpe_empty 0 0",
-        "  StrCpy $0 $0 $R2 1",
-        "  Goto _urpe_exit",
-        "_urpe_empty:",
-        '  StrCpy $0 ""',
-        "_urpe_exit:",
-        "  Pop $R3",
-        "  Pop $R2",
-        "  Pop $R1",
-        "  Pop $R0",
-        "FunctionEnd",
-        "",
-    ])
 
+def generate_download_helpers(ctx: BuildContext) -> List[str]:
+    """Define ``_DownloadFile`` and the VerifyChecksum / ExtractArchive stubs."""
+    files = ctx.config.files
+    lines: List[str] = []
+    if any(fe.is_remote for fe in files):
+        lines.append('!insertmacro YPackDownloadFile ""')
+    if any(fe.is_remote or fe.checksum_type for fe in files):
+        lines.extend([
+            '!insertmacro YPackVerifyChecksum ""',
+            '!insertmacro YPackExtractArchive ""',
+        ])
+    if lines:
+        lines.insert(0, "; --- Download / checksum helpers (ypack_download.nsh) ---")
+        lines.append("")
     return lines
 
 
-def generate_checksum_helper() -> List[str]:
-    """Emit placeholder VerifyChecksum / ExtractArchive functions."""
+def generate_volume_helpers(ctx: BuildContext) -> List[str]:
+    """Define ``_JoinVolume`` when a file ships in volumes beside the installer."""
+    if not _ships_volumes(ctx):
+        return []
     return [
-        "; ---------------------------------------------------------------------------",
-        "; Helper: VerifyChecksum (placeholder — needs a proper plugin)",
-        "; ---------------------------------------------------------------------------",
-        "Function VerifyChecksum",
-        "  ; Stack: file_path, checksum_type, checksum_value",
-        "  Pop $R2  ; checksum_value",
-        "  Pop $R1  ; checksum_type",
-        "  Pop $R0  ; file_path",
-        "  ; TODO: Implement using Crypto plugin or PowerShell Get-FileHash.",
-        '  StrCpy $0 "0"  ; 0 = success',
-        "  Push $0",
-        "FunctionEnd",
-        "",
-        "; ---------------------------------------------------------------------------",
-        "; Helper: ExtractArchive (placeholder)",
-        "; ---------------------------------------------------------------------------",
-        "Function ExtractArchive",
-        "  ; Stack: archive_path, dest_dir",
-        "  Pop $R1  ; dest_dir",
-        "  Pop $R0  ; archive_path",
-        "  ; TODO: Implement using nsisunz or 7z plugin.",
-        "FunctionEnd",
+        "; --- Volume helpers (ypack_volume.nsh) ---",
+        '!insertmacro YPackJoinVolume ""',
         "",
     ]
+
+
+def _ships_volumes(ctx: BuildContext) -> bool:
+    return bool(external_ops(ctx.plan))
+
+
+def _path_appends(ctx: BuildContext) -> bool:
+    return any(op.append for op in ctx.plan.env_vars)
+
+
+def _path_removes(ctx: BuildContext) -> bool:
+    return any(env.remove_on_uninstall and env.append and env.name.upper() == "PATH"
+               for env in ctx.config.install.env_vars)
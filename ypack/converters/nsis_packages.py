@@ -7,69 +7,46 @@ commands, and the .onInit section-flag setup.
 
 from __future__ import annotations
 
-import os
-from typing import List
+from typing import List, Optional, Tuple
 
 from .context import BuildContext
-from .nsis_sections import _normalize_path, _should_use_recursive, _flatten_packages
+from .ir import ComponentGroup, ComponentNode, Op, files_size, package_size, size_kb
+from .nsis_sections import INSTALL_SECTION_ID, render_op, render_ops
+
+
+#: Component operations rendered per :meth:`BuildContext.map` work item.
+_OP_SLICE = 2048
+
+
+_PACKAGE_BANNER = [
+    "; ===========================================================================",
+    "; Package / Component Sections",
+    "; ===========================================================================",
+    "",
+]
 
 
 def generate_package_sections(ctx: BuildContext) -> List[str]:
-    """Emit ``Section`` / ``SectionGroup`` blocks for every package."""
+    """Emit ``Section`` / ``SectionGroup`` blocks for every package.
+
+    The section skeleton is laid out from the plan's components first;
+    their ``SetOutPath`` / ``File`` operations — the expensive part for
+    large payloads — are rendered in slices through
+    :meth:`BuildContext.map` so they can run on a worker pool.
+    """
     if not ctx.config.packages:
         return []
+    return [*_PACKAGE_BANNER, *_render_components(ctx, ctx.plan.components)]
 
-    has_logging = ctx.config.logging and ctx.config.logging.enabled
-    lines: List[str] = [
-        "; ===========================================================================",
-        "; Package / Component Sections",
-        "; ===========================================================================",
-        "",
-    ]
 
-    idx_ref = [0]  # mutable counter shared across recursion
+def generate_package_banner(ctx: BuildContext) -> List[str]:
+    """The banner that precedes the package sections (split output)."""
+    return list(_PACKAGE_BANNER) if ctx.config.packages else []
 
-    def _emit(pkg_list: list) -> None:
-        for pkg in pkg_list:
-            if pkg.children:
-                lines.append(f'SectionGroup "{pkg.name}"')
-                _emit(pkg.children)
-                lines.append("SectionGroupEnd")
-                lines.append("")
-            else:
-                sec_name = f"SEC_PKG_{idx_ref[0]}"
-                idx_ref[0] += 1
-                lines.append(f'Section "{pkg.name}" {sec_name}')
-
-                if has_logging:
-                    lines.append(f'  !insertmacro LogWrite "Installing component: {pkg.name}"')
-
-                for src_entry in pkg.sources:
-                    src_val = src_entry.get("source", "")
-                    dest = src_entry.get("destination", "$INSTDIR")
-                    lines.append(f'  SetOutPath "{dest}"')
-
-                    if isinstance(src_val, list):
-                        for s in src_val:
-                            lines.append(_file_line(ctx, s))
-                    else:
-                        lines.append(_file_line(ctx, src_val))
-
-                if pkg.post_install:
-                    lines.append("")
-                    lines.append("  ; Post-install commands")
-                    for cmd in pkg.post_install:
-                        if has_logging:
-                            lines.append(f'  !insertmacro LogWrite "Running: {cmd}"')
-                        lines.append(f'  ExecWait "{cmd}"')
-
-                if has_logging:
-                    lines.append(f'  !insertmacro LogWrite "Component {pkg.name} done."')
-                lines.append("SectionEnd")
-                lines.append("")
-
-    _emit(ctx.config.packages)
-    return lines
+
+def generate_package_part(ctx: BuildContext, index: int) -> List[str]:
+    """Sections for the *index*-th top-level package only (split output)."""
+    return _render_components(ctx, [ctx.plan.components[index]])
 
 
 def generate_signing_section(ctx: BuildContext) -> List[str]:
@@ -211,14 +188,12 @@ def generate_oninit(ctx: BuildContext) -> List[str]:
     lines.extend(_generate_existing_install_check(ctx))
 
     # Section flags for packages
-    flat = _flatten_packages(cfg.packages)
-    for idx, pkg in enumerate(flat):
-        sec = f"SEC_PKG_{idx}"
-        if pkg.optional and not pkg.default:
-            lines.append(f"  SectionSetFlags ${{{sec}}} 0")
-        elif not pkg.optional:
-            lines.append(f"  SectionSetFlags ${{{sec}}} ${{SF_SELECTED}}")
+    for pkg in ctx.packages.leaves:
+        if pkg.init_flags is not None:
+            lines.append(f"  SectionSetFlags ${{{pkg.section_id}}} {pkg.init_flags}")
+    lines.extend(_section_sizes(ctx))
 
+    lines.extend(ctx.hook("oninit"))
     lines.extend([
         "FunctionEnd",
         "",
@@ -580,6 +555,7 @@ def generate_uninit(ctx: BuildContext) -> List[str]:
             '!endif',
         ])
 
+    lines.extend(ctx.hook("uninit"))
     lines.extend([
         "FunctionEnd",
         "",
@@ -591,13 +567,91 @@ def generate_uninit(ctx: BuildContext) -> List[str]:
 # Internal
 # -----------------------------------------------------------------------
 
-def _file_line(ctx: BuildContext, source: str) -> str:
-    """Build a single ``File`` directive, choosing /r when appropriate."""
-    resolved = ctx.resolve_path(source)
-    if os.path.exists(resolved):
-        path_for_nsi = resolved
-    else:
-        path_for_nsi = _normalize_path(source)
-    if _should_use_recursive(source):
-        return f'  File /r "{path_for_nsi}"'
-    return f'  File "{path_for_nsi}"'
+def _section_sizes(ctx: BuildContext) -> List[str]:
+    """``SectionSetSize`` for every section with local payload.
+
+    The sizes come from the payload index and replace what makensis
+    estimated, so the components page and the free-space check are
+    right even for sources it sized as written.
+    """
+    sizes: List[Tuple[Optional[str], int]] = [(INSTALL_SECTION_ID, files_size(ctx))]
+    sizes.extend((node.section_id, package_size(ctx, node)) for node in ctx.packages.leaves)
+    lines = [f"  SectionSetSize ${{{section_id}}} {size_kb(size)}" for section_id, size in sizes if size]
+    if lines:
+        lines.insert(0, "  ; Section sizes (KB) from the payload index")
+    return lines
+
+
+def _render_components(ctx: BuildContext, nodes: List[ComponentNode]) -> List[str]:
+    """Lay out the section skeleton and render the operations in batches.
+
+    The tree is walked with an explicit stack (``None`` marks the end of
+    a group), so nesting depth is unbounded.  Each component's
+    operations stay in place as a reference in *layout* (only runs longer
+    than ``_OP_SLICE`` are sliced), and the runs are packed into work
+    items of about ``_OP_SLICE`` operations — thousands of small
+    components cost a few :meth:`BuildContext.map` items, not one each.
+    """
+    has_logging = ctx.config.logging and ctx.config.logging.enabled
+    layout: List[Optional[str]] = []   # text, or None for the next op run
+    batches: List[List[List[Op]]] = [[]]
+    batch_size = 0
+
+    def _add_run(run: List[Op]) -> None:
+        nonlocal batch_size
+        if batch_size and batch_size + len(run) > _OP_SLICE:
+            batches.append([])
+            batch_size = 0
+        layout.append(None)
+        batches[-1].append(run)
+        batch_size += len(run)
+
+    stack: List[Optional[ComponentNode]] = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node is None:
+            layout.append("SectionGroupEnd")
+            layout.append("")
+        elif isinstance(node, ComponentGroup):
+            layout.append(f'SectionGroup "{node.name}"')
+            stack.append(None)
+            stack.extend(reversed(node.children))
+        else:
+            layout.append(f'Section "{node.name}" {node.section_id}')
+
+            if has_logging:
+                layout.append(f'  !insertmacro LogWrite "Installing component: {node.name}"')
+
+            if len(node.ops) <= _OP_SLICE:
+                if node.ops:
+                    _add_run(node.ops)
+            else:
+                for i in range(0, len(node.ops), _OP_SLICE):
+                    _add_run(node.ops[i:i + _OP_SLICE])
+
+            if node.post_install:
+                layout.append("")
+                layout.append("  ; Post-install commands")
+                for op in node.post_install:
+                    if has_logging:
+                        layout.append(f'  !insertmacro LogWrite "Running: {op.command}"')
+                    layout.extend(render_op(ctx, op))
+
+            if has_logging:
+                layout.append(f'  !insertmacro LogWrite "Component {node.name} done."')
+            layout.append("SectionEnd")
+            layout.append("")
+
+    rendered = (lines for result in ctx.map(_render_runs, [b for b in batches if b]) for lines in result)
+    lines: List[str] = []
+    for item in layout:
+        if item is None:
+            lines.extend(next(rendered))
+        else:
+            lines.append(item)
+    return lines
+
+
+def _render_runs(ctx: BuildContext, runs: List[List[Op]]) -> List[List[str]]:
+    """Worker task: render each op run of one batch."""
+    return [render_ops(ctx, run) for run in runs]
@@ -11,10 +11,39 @@ Fixes over the original implementation:
 from __future__ import annotations
 
 import os
-import re
-from typing import List, Set, Optional
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 from .context import BuildContext
+from .dedupe import STAGE_DIR
+from .ir import (
+    CopyExternal,
+    CopyFile,
+    CopyInstalled,
+    CreateDirectory,
+    CreateShortcut,
+    Download,
+    Exec,
+    Op,
+    SetOutPath,
+    Step,
+    UpdateEnvVar,
+    WriteRegistry,
+    env_hive_key,
+    expand_groups,
+    fa_hive_prefix,
+    files_size,
+    is_recursive_glob,
+    package_filter,
+    package_size,
+    size_kb,
+)
+from .package_index import SF_SELECTED
+from .payload import local_sources
+from .payload_filter import PayloadFilter
+
+
+#: Section ID of ``Section "Install"`` (the top-level files).
+INSTALL_SECTION_ID = "SEC_INSTALL"
 
 
 # -----------------------------------------------------------------------
@@ -29,10 +58,6 @@ def _normalize_path(path: str) -> str:
     return path
 
 
-def _should_use_recursive(source: str) -> bool:
-    return bool(source) and "**" in source
-
-
 # -----------------------------------------------------------------------
 # Installer Section
 # -----------------------------------------------------------------------
@@ -45,7 +70,7 @@ def generate_installer_section(ctx: BuildContext) -> List[str]:
         "; ===========================================================================",
         '; Installer Section',
         "; ===========================================================================",
-        'Section "Install"',
+        f'Section "Install" {INSTALL_SECTION_ID}',
         "",
     ]
 
@@ -55,8 +80,10 @@ def generate_installer_section(ctx: BuildContext) -> List[str]:
         lines.append('  !insertmacro LogWrite "Install directory: $INSTDIR"')
         lines.append("")
 
+    plan = ctx.plan
+
     # Track whether we need the inetc plugin
-    has_remote = any(fe.is_remote for fe in cfg.files)
+    has_remote = any(isinstance(op, Download) for op in plan.files)
     if has_remote:
         lines.insert(0, '!include "inetc.nsh"')
         lines.insert(0, "; Plugin: inetc for HTTP downloads")
@@ -64,48 +91,9 @@ def generate_installer_section(ctx: BuildContext) -> List[str]:
     # --- Files ---
     if has_logging:
         lines.append('  !insertmacro LogWrite "Copying files ..."')
-    current_outpath: Optional[str] = None
-    for fe in cfg.files:
-        dest = fe.destination or "$INSTDIR"
-
-        if fe.is_remote:
-            # Remote download
-            url = fe.source
-            filename = url.rsplit("/", 1)[-1] or "download"
-            if dest != current_outpath:
-                lines.append(f'  SetOutPath "{dest}"')
-                current_outpath = dest
-            lines.append(f"  ; Download: {url}")
-            lines.append(f'  inetc::get /SILENT "{url}" "$OUTDIR\\{filename}" /END')
-            lines.append("  Pop $0")
-            lines.append('  StrCmp $0 "OK" +3 0')
-            lines.append('  MessageBox MB_OK|MB_ICONSTOP "Download failed: $0"')
-            lines.append("  Abort")
-            if fe.checksum_type:
-                lines.append(f"  ; Verify checksum: {fe.checksum_type} {fe.checksum_value}")
-                lines.append(f'  Push "$OUTDIR\\{filename}"')
-                lines.append(f'  Push "{fe.checksum_type}"')
-                lines.append(f'  Push "{fe.checksum_value}"')
-                lines.append("  Call VerifyChecksum")
-                lines.append("  Pop $0")
-                lines.append('  StrCmp $0 "0" +3 0')
-                lines.append('  MessageBox MB_OK|MB_ICONSTOP "Checksum verification failed"')
-                lines.append("  Abort")
-            if fe.decompress:
-                lines.append(f'  Push "$OUTDIR\\{filename}"')
-                lines.append(f'  Push "{dest}"')
-                lines.append("  Call ExtractArchive")
-        else:
-            # Local file / directory
-            if dest != current_outpath:
-                lines.append(f'  SetOutPath "{dest}"')
-                current_outpath = dest
-            norm = _normalize_path(fe.source)
-            if _should_use_recursive(fe.source) or fe.recursive:
-                lines.append(f'  File /r "{norm}"')
-            else:
-                lines.append(f'  File "{norm}"')
-
+    if any(isinstance(op, SetOutPath) and op.path.startswith("$PLUGINSDIR") for op in plan.files):
+        lines.append("  InitPluginsDir")
+    lines.extend(render_ops(ctx, plan.files))
     lines.append("")
 
     # --- Uninstaller ---
@@ -150,28 +138,29 @@ def generate_installer_section(ctx: BuildContext) -> List[str]:
         lines.append("")
 
     # --- Custom registry entries ---
-    _emit_registry_writes(ctx, lines)
+    if plan.registry:
+        lines.append("  ; Custom registry entries")
+        lines.extend(render_ops(ctx, plan.registry))
+        lines.append("")
 
     # --- Environment variables ---
-    _emit_env_var_writes(ctx, lines)
+    for op in plan.env_vars:
+        lines.append(f"  ; Environment variable: {op.name} ({op.scope})")
+        lines.extend(render_op(ctx, op))
+        lines.append("")
 
     # --- Shortcuts ---
-    _emit_shortcuts(ctx, lines)
+    for step in plan.shortcuts:
+        lines.extend(_render_step(ctx, step))
     if has_logging and (cfg.install.desktop_shortcut or cfg.install.start_menu_shortcut):
         lines.append('  !insertmacro LogWrite "Shortcuts created."')
         lines.append("")
 
     # --- File associations ---
-    _emit_file_associations(ctx, lines)
-
-    # Estimated install size
-    lines.append("  ; Calculate installed size")
-    lines.append('  ${GetSize} "$INSTDIR" "/S=0K" $0 $1 $2')
-    lines.append('  IntFmt $0 "0x%08X" $0')
-    lines.append(f'  SetRegView {reg_view}')
-    lines.append('  WriteRegDWORD HKLM "Software\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\${APP_NAME}" "EstimatedSize" $0')
-    lines.append('  SetRegView lastused')
-    lines.append("")
+    for step in plan.associations:
+        lines.extend(_render_step(ctx, step))
+
+    lines.extend(ctx.hook("install"))
 
     # --- Logging: end ---
     if has_logging:
@@ -184,6 +173,85 @@ def generate_installer_section(ctx: BuildContext) -> List[str]:
     return lines
 
 
+# -----------------------------------------------------------------------
+# Installed size
+# -----------------------------------------------------------------------
+
+def generate_estimated_size(ctx: BuildContext) -> List[str]:
+    """Emit a hidden section writing the ARP ``EstimatedSize`` (KB).
+
+    The size comes from the payload index at build time: the top-level
+    files plus each selected package, checked through its section flags.
+    It runs after the package sections, where their IDs are defined.
+    When the build cannot see every installed file — a local source is
+    missing here, or files are downloaded at install time — the size is
+    measured at install time with ``${GetSize}`` instead.
+    """
+    lines: List[str] = [
+        "; ===========================================================================",
+        "; Installed size (Add/Remove Programs)",
+        "; ===========================================================================",
+        'Section "-EstimatedSize"',
+    ]
+    if not _payload_known(ctx):
+        lines.extend([
+            '  ${GetSize} "$INSTDIR" "/S=0K" $0 $1 $2',
+            '  IntFmt $0 "0x%08X" $0',
+        ])
+        size = "$0"
+    else:
+        base_kb = size_kb(files_size(ctx))
+        package_kb = [(node.section_id, size_kb(package_size(ctx, node))) for node in ctx.packages.leaves]
+        package_kb = [(section_id, kb) for section_id, kb in package_kb if kb]
+        if package_kb:
+            lines.append(f"  StrCpy $0 {base_kb}")
+            for section_id, kb in package_kb:
+                lines.extend([
+                    f"  SectionGetFlags ${{{section_id}}} $1",
+                    f"  IntOp $1 $1 & {SF_SELECTED}",
+                    "  IntCmp $1 0 +2",
+                    f"  IntOp $0 $0 + {kb}",
+                ])
+            size = "$0"
+        else:
+            size = str(base_kb)
+    lines.extend([
+        f"  SetRegView {ctx.effective_reg_view}",
+        f'  WriteRegDWORD HKLM "Software\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\${{APP_NAME}}" "EstimatedSize" {size}',
+        "  SetRegView lastused",
+        "SectionEnd",
+        "",
+    ])
+    return lines
+
+
+def generate_dedupe_cleanup(ctx: BuildContext) -> List[str]:
+    """Emit a hidden section deleting the blobs staged for ``--dedupe``.
+
+    It runs after the package sections, the last users of the staged
+    copies, so they do not sit in ``$PLUGINSDIR`` until the installer
+    exits.
+    """
+    if not any(isinstance(op, SetOutPath) and op.path.startswith(STAGE_DIR) for op in ctx.plan.files):
+        return []
+    return [
+        'Section "-DedupeCleanup"',
+        f'  RMDir /r "{STAGE_DIR}"',
+        "SectionEnd",
+        "",
+    ]
+
+
+def _payload_known(ctx: BuildContext) -> bool:
+    """Whether the payload index sees every file the installer installs."""
+    if any(fe.is_remote for fe in ctx.config.files):
+        return False
+    return all(
+        ctx.payload_files(source, recursive, filters) is not None
+        for source, recursive, filters in local_sources(ctx.config) if source
+    )
+
+
 # -----------------------------------------------------------------------
 # Uninstaller Section
 # -----------------------------------------------------------------------
@@ -211,10 +279,18 @@ def generate_uninstaller_section(ctx: BuildContext) -> List[str]:
     lines.append("  ; Remove installed files")
     for fe in reversed(cfg.files):
         dest = fe.destination or "$INSTDIR"
-        if fe.is_remote:
+        recursive = is_recursive_glob(fe.source) or fe.recursive
+        groups = None if fe.is_remote else expand_groups(
+            ctx, fe.source, recursive, dest, PayloadFilter.from_configs(cfg.filters, fe.filters),
+        )
+        if groups is not None:
+            lines.extend(_remove_expanded(groups, dest))
+            if dest != "$INSTDIR":
+                lines.append(f'  RMDir "{dest}"')
+        elif fe.is_remote:
             filename = fe.source.rsplit("/", 1)[-1] or "download"
             lines.append(f'  Delete "{dest}\\{filename}"')
-        elif _should_use_recursive(fe.source) or fe.recursive:
+        elif recursive:
             dirname = os.path.basename(_normalize_path(fe.source).rstrip("\\*"))
             if dirname and dirname != "*":
                 lines.append(f'  RMDir /r "{dest}\\{dirname}"')
@@ -228,10 +304,24 @@ def generate_uninstaller_section(ctx: BuildContext) -> List[str]:
     if cfg.packages:
         lines.append("")
         lines.append("  ; Remove package files")
-        for pkg in _flatten_packages(cfg.packages):
-            for src_entry in pkg.sources:
+        for leaf in ctx.packages.leaves:
+            filters = package_filter(ctx, leaf)
+            expanded: Dict[str, List[Tuple[str, List[str]]]] = {}
+            for src_entry in leaf.package.sources:
                 dest = src_entry.get("destination", "$INSTDIR")
-                lines.append(f'  RMDir /r "{dest}"')
+                src_val = src_entry.get("source", "")
+                found = [
+                    expand_groups(ctx, src, is_recursive_glob(src), dest, filters)
+                    for src in (src_val if isinstance(src_val, list) else [src_val])
+                ]
+                known = [groups for groups in found if groups is not None]
+                if found and len(known) == len(found):
+                    expanded.setdefault(dest, []).extend(g for groups in known for g in groups)
+                else:
+                    lines.append(f'  RMDir /r "{dest}"')
+            for dest, groups in expanded.items():
+                lines.extend(_remove_expanded(groups, dest))
+                lines.append(f'  RMDir "{dest}"')
 
     lines.extend([
         "",
@@ -304,7 +394,7 @@ def generate_uninstaller_section(ctx: BuildContext) -> List[str]:
 
     # Remove file associations
     for fa in cfg.install.file_associations:
-        hive, prefix = _fa_hive_prefix(fa)
+        hive, prefix = fa_hive_prefix(fa)
         lines.append(f"  ; Remove file association: {fa.extension}")
         lines.append(f'  DeleteRegKey {hive} "{prefix}{fa.extension}"')
         if fa.prog_id:
@@ -313,6 +403,8 @@ def generate_uninstaller_section(ctx: BuildContext) -> List[str]:
     # Remove environment variables
     _emit_env_var_removes(ctx, lines)
 
+    lines.extend(ctx.hook("uninstall"))
+
     # --- Logging: end ---
     if has_logging:
         lines.append('  !insertmacro LogWrite "Uninstallation completed."')
@@ -326,83 +418,168 @@ def generate_uninstaller_section(ctx: BuildContext) -> List[str]:
     return lines
 
 
+def _remove_expanded(groups: List[Tuple[str, List[str]]], dest: str) -> List[str]:
+    """Delete the files of :func:`expand_groups` output, then the directories it created.
+
+    Directories are removed deepest first and only when empty, so files
+    the user added below *dest* survive.
+    """
+    lines: List[str] = []
+    folders: Set[str] = set()
+    root = dest.rstrip("\\")
+    for out_dir, paths in reversed(groups):
+        for path in reversed(paths):
+            lines.append(f'  Delete "{out_dir}\\{os.path.basename(path)}"')
+        while out_dir.startswith(root + "\\") and out_dir not in folders:
+            folders.add(out_dir)
+            out_dir = out_dir.rsplit("\\", 1)[0]
+    for folder in sorted(folders, key=lambda f: (-f.count("\\"), f)):
+        lines.append(f'  RMDir "{folder}"')
+    return lines
+
+
 # -----------------------------------------------------------------------
-# Internal helpers
+# IR serialisation
 # -----------------------------------------------------------------------
 
-def _emit_registry_writes(ctx: BuildContext, lines: List[str]) -> None:
-    """Emit WriteRegStr / WriteRegDWORD for custom registry entries.
+def render_ops(ctx: BuildContext, ops: Sequence[Op]) -> List[str]:
+    """Serialise a run of IR operations.
 
-    Groups entries by registry view to minimize ``SetRegView`` toggles.
+    Consecutive :class:`WriteRegistry` ops share ``SetRegView`` toggles;
+    the view is restored with ``lastused`` at the end of the run.
     """
-    entries = ctx.config.install.registry_entries
-    if not entries:
-        return
-
-    lines.append("  ; Custom registry entries")
+    lines: List[str] = []
     current_view: Optional[str] = None
-    for entry in entries:
-        key = ctx.resolve(entry.key)
-        value = ctx.resolve(entry.value)
-        target_view = entry.view if entry.view in ("32", "64") else None
-        if target_view != current_view:
+    for op in ops:
+        if isinstance(op, WriteRegistry) and op.view != current_view:
             if current_view is not None:
                 lines.append("  SetRegView lastused")
-            if target_view is not None:
-                lines.append(f"  SetRegView {target_view}")
-            current_view = target_view
-        if entry.type == "dword":
-            lines.append(f'  WriteRegDWORD {entry.hive} "{key}" "{entry.name}" {value}')
-        elif entry.type == "expand":
-            lines.append(f'  WriteRegExpandStr {entry.hive} "{key}" "{entry.name}" "{value}"')
-        else:
-            lines.append(f'  WriteRegStr {entry.hive} "{key}" "{entry.name}" "{value}"')
+            if op.view is not None:
+                lines.append(f"  SetRegView {op.view}")
+            current_view = op.view
+        lines.extend(render_op(ctx, op))
     if current_view is not None:
         lines.append("  SetRegView lastused")
-    lines.append("")
+    return lines
 
 
-def _emit_env_var_writes(ctx: BuildContext, lines: List[str]) -> None:
-    """Emit environment variable writes (installer side)."""
-    for env in ctx.config.install.env_vars:
-        env_value = ctx.resolve(env.value)
-        hive, key = _env_hive_key(env)
-        lines.append(f"  ; Environment variable: {env.name} ({env.scope})")
+def render_op(ctx: BuildContext, op: Op) -> List[str]:
+    """Serialise one IR operation to NSIS lines."""
+    if isinstance(op, SetOutPath):
+        return [f'  SetOutPath "{op.path}"']
+    if isinstance(op, CopyFile):
+        return [_file_line(ctx, op)]
+    if isinstance(op, CopyInstalled):
+        return _copy_installed_lines(op)
+    if isinstance(op, CopyExternal):
+        return _copy_external_lines(op)
+    if isinstance(op, Download):
+        return _download_lines(op)
+    if isinstance(op, WriteRegistry):
+        if op.type == "dword":
+            return [f'  WriteRegDWORD {op.hive} "{op.key}" "{op.name}" {op.value}']
+        if op.type == "expand":
+            return [f'  WriteRegExpandStr {op.hive} "{op.key}" "{op.name}" "{op.value}"']
+        return [f'  WriteRegStr {op.hive} "{op.key}" "{op.name}" "{op.value}"']
+    if isinstance(op, CreateDirectory):
+        return [f'  CreateDirectory "{op.path}"']
+    if isinstance(op, CreateShortcut):
+        return [f'  CreateShortCut "{op.link}" "{op.target}"']
+    if isinstance(op, UpdateEnvVar):
+        return _env_var_lines(op)
+    if isinstance(op, Exec):
+        return [f'  ExecWait "{op.command}"' if op.wait else f'  Exec "{op.command}"']
+    raise TypeError(f"Cannot serialise IR operation {op!r}")
+
+
+def _render_step(ctx: BuildContext, step: Step) -> List[str]:
+    return [f"  ; {step.title}", *render_ops(ctx, step.ops), ""]
+
+
+def _file_line(ctx: BuildContext, op: CopyFile) -> str:
+    """Build a single ``File`` directive.
+
+    Sources that exist are referenced relative to the output directory
+    (where makensis runs); anything else is passed through normalised.
+    """
+    resolved = ctx.resolve_path(op.source)
+    if ctx.exists(resolved):
+        path_for_nsi = ctx.relative_to_output(resolved)
+    else:
+        path_for_nsi = _normalize_path(op.source)
+    if op.recursive:
+        return f'  File /r "{path_for_nsi}"'
+    return f'  File "{path_for_nsi}"'
+
+
+def _copy_installed_lines(op: CopyInstalled) -> List[str]:
+    copy = f'  CopyFiles /SILENT "{op.source}" "{op.target}"'
+    if not op.hardlink:
+        return [copy]
+    # Fall back to a copy where the volume has no hard links (or the
+    # two paths are on different volumes).
+    return [
+        "  Push $0",
+        f"  System::Call 'kernel32::CreateHardLinkW(w \"{op.target}\", w \"{op.source}\", p 0) i .r0'",
+        "  IntCmp $0 0 0 +2 +2",
+        copy,
+        "  Pop $0",
+    ]
 
-        if env.append and env.name.upper() == "PATH":
-            lines.extend([
-                f'  ReadRegStr $0 {hive} "{key}" "{env.name}"',
-                f'  StrCpy $1 "{env_value}"',
-                "",
-                '  ; Check whether the entry already exists',
-                '  Push $0',
-                '  Push $1',
-                "  Call _StrContains",
-                '  StrCmp $R9 "1" _skip_path_append',
-                "",
-                '  ; Append entry',
-                '  StrCmp $0 "" 0 +2',
-                f'    StrCpy $0 "{env_value}"',
-                '  Goto +2',
-                f'    StrCpy $0 "$0;{env_value}"',
-                f'  WriteRegExpandStr {hive} "{key}" "{env.name}" "$0"',
-                "",
-                '  ; Broadcast WM_SETTINGCHANGE',
-                '  SendMessage ${HWND_BROADCAST} ${WM_SETTINGCHANGE} 0 "STR:Environment" /TIMEOUT=500',
-                "",
-                "_skip_path_append:",
-            ])
-        else:
-            lines.append(f'  WriteRegStr {hive} "{key}" "{env.name}" "{env_value}"')
-        lines.append("")
+
+def _copy_external_lines(op: CopyExternal) -> List[str]:
+    name = os.path.basename(op.source)
+    return [
+        f"  ; {name}: {op.size:,} bytes in {op.volumes} volume(s) next to the installer",
+        f'  Push "$EXEDIR\\{op.volume}"',
+        f'  Push "{op.volumes}"',
+        f'  Push "$OUTDIR\\{name}"',
+        f'  Push "{op.sha256}"',
+        "  Call _JoinVolume",
+    ]
+
+
+def _download_lines(op: Download) -> List[str]:
+    lines = [
+        f"  ; Download: {op.url}",
+        f'  Push "{op.url}"',
+        f'  Push "$OUTDIR\\{op.filename}"',
+        f'  Push "{op.checksum_type}"',
+        f'  Push "{op.checksum_value}"',
+        "  Call _DownloadFile",
+    ]
+    if op.decompress:
+        lines.extend([
+            f'  Push "$OUTDIR\\{op.filename}"',
+            f'  Push "{op.destination}"',
+            "  Call ExtractArchive",
+        ])
+    return lines
+
+
+def _env_var_lines(op: UpdateEnvVar) -> List[str]:
+    if not op.append:
+        return [f'  WriteRegStr {op.hive} "{op.key}" "{op.name}" "{op.value}"']
+    return [
+        f'  ReadRegStr $0 {op.hive} "{op.key}" "{op.name}"',
+        f'  StrCpy $1 "{op.value}"',
+        "  Call _AppendPathEntry",
+        '  StrCmp $R9 "1" +3  ; already present',
+        f'  WriteRegExpandStr {op.hive} "{op.key}" "{op.name}" "$0"',
+        '  SendMessage ${HWND_BROADCAST} ${WM_SETTINGCHANGE} 0 "STR:Environment" /TIMEOUT=500',
+    ]
 
 
+# -----------------------------------------------------------------------
+# Internal helpers
+# -----------------------------------------------------------------------
+
 def _emit_env_var_removes(ctx: BuildContext, lines: List[str]) -> None:
     """Emit environment variable removal (uninstaller side)."""
     for env in ctx.config.install.env_vars:
         if not env.remove_on_uninstall:
             continue
-        hive, key = _env_hive_key(env)
+        hive, key = env_hive_key(env)
 
         if env.append and env.name.upper() == "PATH":
             env_value = ctx.resolve(env.value)
@@ -417,80 +594,3 @@ def _emit_env_var_removes(ctx: BuildContext, lines: List[str]) -> None:
             ])
         else:
             lines.append(f'  DeleteRegValue {hive} "{key}" "{env.name}"')
-
-
-def _emit_shortcuts(ctx: BuildContext, lines: List[str]) -> None:
-    """Emit CreateShortCut for desktop and start menu."""
-    cfg = ctx.config
-
-    desktop_sc = cfg.install.desktop_shortcut
-    if desktop_sc and desktop_sc.target:
-        target = ctx.resolve(desktop_sc.target)
-        if not (target.startswith("$") or re.match(r"^[A-Za-z]:\\", target)):
-            target = f"$INSTDIR\\{target}"
-        # Use custom name if provided, otherwise use ${APP_NAME}
-        name = ctx.resolve(desktop_sc.name) if desktop_sc.name else "${APP_NAME}"
-        lines.append("  ; Desktop shortcut")
-        lines.append(f'  CreateShortCut "$DESKTOP\\{name}.lnk" "{target}"')
-        lines.append("")
-
-    start_sc = cfg.install.start_menu_shortcut
-    if start_sc and start_sc.target:
-        target = ctx.resolve(start_sc.target)
-        if not (target.startswith("$") or re.match(r"^[A-Za-z]:\\", target)):
-            target = f"$INSTDIR\\{target}"
-        # Use custom name if provided, otherwise use ${APP_NAME}
-        name = ctx.resolve(start_sc.name) if start_sc.name else "${APP_NAME}"
-        lines.extend([
-            "  ; Start menu shortcuts",
-            '  CreateDirectory "$SMPROGRAMS\\${APP_NAME}"',
-            f'  CreateShortCut "$SMPROGRAMS\\${{APP_NAME}}\\{name}.lnk" "{target}"',
-            '  CreateShortCut "$SMPROGRAMS\\${APP_NAME}\\Uninstall.lnk" "$INSTDIR\\Uninstall.exe"',
-            "",
-        ])
-
-
-def _emit_file_associations(ctx: BuildContext, lines: List[str]) -> None:
-    """Emit WriteRegStr for file associations."""
-    for fa in ctx.config.install.file_associations:
-        hive, prefix = _fa_hive_prefix(fa)
-        lines.append(f"  ; File association: {fa.extension} -> {fa.application}")
-        lines.append(f'  WriteRegStr {hive} "{prefix}{fa.extension}" "" "{fa.prog_id}"')
-        if fa.prog_id:
-            lines.append(f'  WriteRegStr {hive} "{prefix}{fa.prog_id}" "" "{fa.description}"')
-        if fa.default_icon:
-            lines.append(f'  WriteRegStr {hive} "{prefix}{fa.prog_id}\\DefaultIcon" "" "{fa.default_icon}"')
-        verbs = fa.verbs or {}
-        if verbs:
-            for verb, cmd in verbs.items():
-                lines.append(f'  WriteRegStr {hive} "{prefix}{fa.prog_id}\\Shell\\{verb}\\Command" "" "{cmd}"')
-        elif fa.application:
-            lines.append(f'  WriteRegStr {hive} "{prefix}{fa.prog_id}\\Shell\\Open\\Command" "" "{fa.application} \\"%1\\""')
-        lines.append("")
-
-
-# -----------------------------------------------------------------------
-# Tiny shared utilities
-# -----------------------------------------------------------------------
-
-def _env_hive_key(env) -> tuple[str, str]:
-    scope = (env.scope or "system").lower()
-    if scope == "system":
-        return "HKLM", "SYSTEM\\CurrentControlSet\\Control\\Session Manager\\Environment"
-    return "HKCU", "Environment"
-
-
-def _fa_hive_prefix(fa) -> tuple[str, str]:
-    if getattr(fa, "register_for_all_users", True):
-        return "HKCR", ""
-    return "HKCU", "Software\\Classes\\"
-
-
-def _flatten_packages(packages) -> list:
-    flat = []
-    for pkg in packages:
-        if pkg.children:
-            flat.extend(_flatten_packages(pkg.children))
-        else:
-            flat.append(pkg)
-    return flat
@@ -0,0 +1,199 @@
+"""
+IR optimisation passes.
+
+The lowering in :mod:`ir` mirrors the configuration one entry at a time,
+which leaves redundant runtime state switches in the plan.
+:func:`optimize_plan` rewrites an :class:`InstallerPlan` in place:
+
+* ``SetOutPath`` — plain copies into the same directory are grouped so
+  each directory is entered once per run of copies.
+* ``SetRegView`` — custom registry writes are grouped by view.
+* ``CreateDirectory`` / registry writes — shortcut and file-association
+  steps do not repeat setup an earlier step already performed.
+
+Operations are only reordered when they cannot observe each other:
+recursive copies and downloads are barriers for ``SetOutPath`` grouping,
+and registry writes are left in config order when two views write the
+same value name.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from .ir import (
+    CopyFile,
+    CreateDirectory,
+    InstallerPlan,
+    Op,
+    SetOutPath,
+    UpdateEnvVar,
+    WriteRegistry,
+    iter_components,
+)
+
+
+@dataclass
+class OptimizeStats:
+    """Runtime operations removed by :func:`optimize_plan`, per kind."""
+    set_out_path: int = 0
+    set_reg_view: int = 0
+    create_directory: int = 0
+    registry_writes: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.set_out_path + self.set_reg_view + self.create_directory + self.registry_writes
+
+    def summary(self) -> str:
+        return (
+            f"removed {self.total} runtime operations "
+            f"(SetOutPath: {self.set_out_path}, SetRegView: {self.set_reg_view}, "
+            f"CreateDirectory: {self.create_directory}, registry writes: {self.registry_writes})"
+        )
+
+
+def optimize_plan(plan: InstallerPlan) -> OptimizeStats:
+    """Run every pass over *plan* (in place) and return what was removed."""
+    stats = OptimizeStats()
+
+    plan.files = _coalesce_outpaths(plan.files, stats)
+    for comp in iter_components(plan.components):
+        comp.ops = _coalesce_outpaths(comp.ops, stats)
+
+    plan.registry = _group_by_view(plan.registry, stats)
+    _dedupe_setup(plan, stats)
+    return stats
+
+
+def view_switches(ops: List[Op]) -> int:
+    """Number of ``SetRegView`` statements a backend emits for *ops*."""
+    switches = 0
+    current: Optional[str] = None
+    for op in ops:
+        if isinstance(op, WriteRegistry) and op.view != current:
+            switches += (current is not None) + (op.view is not None)
+            current = op.view
+    return switches + (current is not None)
+
+
+# -----------------------------------------------------------------------
+# Passes
+# -----------------------------------------------------------------------
+
+def _coalesce_outpaths(ops: List[Op], stats: OptimizeStats) -> List[Op]:
+    """Group non-recursive copies by destination between barriers.
+
+    A non-recursive copy only writes directly into its destination, so
+    copies into different directories cannot collide and may be
+    reordered; copies into the same directory keep their relative order.
+    A ``SetOutPath`` with no copies still creates its directory, so it is
+    kept as an (empty) group of its own.
+    """
+    out: List[Op] = []
+    groups: Dict[str, List[Op]] = {}
+    pending: Optional[str] = None   # destination in effect in the source order
+    current: Optional[str] = None   # destination in effect in the output
+
+    def _flush() -> None:
+        nonlocal current
+        for dest, copies in groups.items():
+            if dest != current:
+                out.append(SetOutPath(dest))
+                current = dest
+            out.extend(copies)
+        groups.clear()
+
+    for op in ops:
+        if isinstance(op, SetOutPath):
+            pending = op.path
+            groups.setdefault(op.path, [])
+        elif isinstance(op, CopyFile) and not op.recursive and pending is not None:
+            groups.setdefault(pending, []).append(op)
+        else:
+            _flush()
+            if pending is not None and pending != current:
+                out.append(SetOutPath(pending))
+                current = pending
+            out.append(op)
+    _flush()
+
+    stats.set_out_path += _count(ops, SetOutPath) - _count(out, SetOutPath)
+    return out
+
+
+def _group_by_view(entries: List[WriteRegistry], stats: OptimizeStats) -> List[WriteRegistry]:
+    """Stable-partition registry writes by view (first appearance order)."""
+    views: Dict[Tuple[str, str, str], Set[Optional[str]]] = {}
+    for op in entries:
+        views.setdefault(_reg_slot(op), set()).add(op.view)
+    if any(len(v) > 1 for v in views.values()):
+        # The same value is written through different views; which one
+        # wins may depend on order, so leave the writes alone.
+        return entries
+
+    by_view: Dict[Optional[str], List[WriteRegistry]] = {}
+    for op in entries:
+        by_view.setdefault(op.view, []).append(op)
+    grouped = [op for ops in by_view.values() for op in ops]
+    stats.set_reg_view += view_switches(list(entries)) - view_switches(list(grouped))
+    return grouped
+
+
+def _dedupe_setup(plan: InstallerPlan, stats: OptimizeStats) -> None:
+    """Drop directory creation and registry writes that repeat earlier ones.
+
+    Walks the install-time steps in execution order (registry entries,
+    environment variables, shortcuts, file associations) tracking the
+    last value written to each registry slot.
+    """
+    written: Dict[Tuple[str, str, str], Tuple[Optional[str], str, str]] = {}
+    for reg in plan.registry:
+        written[_reg_slot(reg)] = (reg.view, reg.type, reg.value)
+    for env in plan.env_vars:
+        written.pop(_env_slot(env), None)
+
+    created: Set[str] = set()
+    for step in plan.shortcuts:
+        kept: List[Op] = []
+        for op in step.ops:
+            if isinstance(op, CreateDirectory):
+                if op.path in created:
+                    stats.create_directory += 1
+                    continue
+                created.add(op.path)
+            kept.append(op)
+        step.ops = kept
+
+    for step in plan.associations:
+        kept = []
+        for op in step.ops:
+            if isinstance(op, WriteRegistry):
+                state = (op.view, op.type, op.value)
+                if written.get(_reg_slot(op)) == state:
+                    stats.registry_writes += 1
+                    continue
+                written[_reg_slot(op)] = state
+            kept.append(op)
+        step.ops = kept
+
+    plan.shortcuts = [step for step in plan.shortcuts if step.ops]
+    plan.associations = [step for step in plan.associations if step.ops]
+
+
+# -----------------------------------------------------------------------
+# Helpers
+# -----------------------------------------------------------------------
+
+def _reg_slot(op: WriteRegistry) -> Tuple[str, str, str]:
+    # Registry key and value names are case-insensitive.
+    return op.hive, op.key.lower(), op.name.lower()
+
+
+def _env_slot(op: UpdateEnvVar) -> Tuple[str, str, str]:
+    return op.hive, op.key.lower(), op.name.lower()
+
+
+def _count(ops: List[Op], kind: type) -> int:
+    return sum(1 for op in ops if isinstance(op, kind))
@@ -0,0 +1,120 @@
+"""
+Package index — the ``packages`` tree flattened once per build.
+
+:class:`PackageIndex` numbers every package in pre-order, links parents
+and children by index, assigns the ``SEC_PKG_n`` section IDs to leaves
+in section order and precomputes the ``.onInit`` selection flags.
+Generators read it through :attr:`BuildContext.packages` instead of
+walking ``config.packages`` themselves, so every consumer agrees on the
+same IDs and order.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from ..config import PackageEntry
+
+#: ``SectionSetFlags`` value for components that must be installed.
+SF_SELECTED = "${SF_SELECTED}"
+
+
+@dataclass(frozen=True)
+class IndexedPackage:
+    """One node of the package tree.
+
+    *index* is the pre-order position; *parent* / *children* refer to
+    other nodes by index.  Only leaves (``children == ()``) become
+    sections and carry a *section_id*.  *init_flags* is the value
+    ``.onInit`` passes to ``SectionSetFlags`` (``None`` keeps the
+    section's compiled-in default).
+    """
+
+    index: int
+    package: PackageEntry
+    depth: int
+    parent: Optional[int]
+    children: Tuple[int, ...]
+    section_id: Optional[str]
+    init_flags: Optional[str]
+
+    @property
+    def name(self) -> str:
+        return self.package.name
+
+    @property
+    def is_group(self) -> bool:
+        return bool(self.children)
+
+
+class PackageIndex:
+    """Flattened, immutable view of a ``packages`` tree."""
+
+    def __init__(self, packages: List[PackageEntry]) -> None:
+        nodes: List[IndexedPackage] = []
+        children: List[List[int]] = []
+        parents: List[Optional[int]] = []
+        depths: List[int] = []
+
+        # Pre-order walk with an explicit stack (reversed so siblings pop
+        # in config order).
+        stack: List[Tuple[PackageEntry, Optional[int], int]] = [
+            (pkg, None, 0) for pkg in reversed(packages)
+        ]
+        order: List[PackageEntry] = []
+        while stack:
+            pkg, parent, depth = stack.pop()
+            idx = len(order)
+            order.append(pkg)
+            parents.append(parent)
+            depths.append(depth)
+            children.append([])
+            if parent is not None:
+                children[parent].append(idx)
+            stack.extend((child, idx, depth + 1) for child in reversed(pkg.children))
+
+        leaf_count = 0
+        for idx, pkg in enumerate(order):
+            section_id: Optional[str] = None
+            flags: Optional[str] = None
+            if not children[idx]:
+                section_id = f"SEC_PKG_{leaf_count}"
+                leaf_count += 1
+                if not pkg.optional:
+                    flags = SF_SELECTED
+                elif not pkg.default:
+                    flags = "0"
+            nodes.append(IndexedPackage(
+                index=idx,
+                package=pkg,
+                depth=depths[idx],
+                parent=parents[idx],
+                children=tuple(children[idx]),
+                section_id=section_id,
+                init_flags=flags,
+            ))
+
+        self.nodes: Tuple[IndexedPackage, ...] = tuple(nodes)
+        self.roots: Tuple[int, ...] = tuple(n.index for n in nodes if n.parent is None)
+        self.leaves: Tuple[IndexedPackage, ...] = tuple(n for n in nodes if not n.is_group)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __bool__(self) -> bool:
+        return bool(self.nodes)
+
+    def __getitem__(self, index: int) -> IndexedPackage:
+        return self.nodes[index]
+
+    def children_of(self, node: IndexedPackage) -> List[IndexedPackage]:
+        """Direct children of *node*, in config order."""
+        return [self.nodes[i] for i in node.children]
+
+    def subtree(self, node: IndexedPackage) -> Tuple[IndexedPackage, ...]:
+        """*node* and all its descendants, in pre-order."""
+        end = node.index + 1
+        while end < len(self.nodes) and self.nodes[end].depth > node.depth:
+            end += 1
+        return self.nodes[node.index:end]
@@ -0,0 +1,95 @@
+"""
+Opt-in parallel script generation on a process pool.
+
+Generators are pure functions of :class:`BuildContext`, so independent
+fragments can be rendered in worker processes and stitched back in
+output order.  Each worker receives the context once (pool initializer)
+rather than once per task; tasks then only carry a module-level function
+and its item.  Inputs recorded in a worker (see
+:meth:`BuildContext.recording`) are shipped back with the result so the
+fragment cache sees exactly what a serial render would have recorded.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, TypeVar
+
+from .context import BuildContext
+
+if TYPE_CHECKING:
+    from .fragments import FragmentSpec
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+Observation = Tuple[str, str, Any]
+
+_WORKER_CTX: Optional[BuildContext] = None
+
+
+def resolve_jobs(jobs: int) -> int:
+    """Normalise a ``--jobs`` value: ``0`` means one worker per CPU."""
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+class WorkerPool:
+    """A process pool whose workers all hold a copy of one build context."""
+
+    def __init__(self, ctx: BuildContext, jobs: int) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(ctx,),
+        )
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def submit(self, fn: Callable[[BuildContext, _T], _R], item: _T) -> Future:
+        """Run ``fn(ctx, item)`` in a worker; the future yields ``(result, observed)``."""
+        return self._executor.submit(_run, fn, item)
+
+    def map(self, ctx: BuildContext, fn: Callable[[BuildContext, _T], _R], items: List[_T]) -> List[_R]:
+        """Ordered parallel map; worker inputs are replayed into *ctx*."""
+        futures = [self.submit(fn, item) for item in items]
+        results: List[_R] = []
+        for fut in futures:
+            result, observed = fut.result()
+            ctx.replay(observed)
+            results.append(result)
+        return results
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+
+def render_spec(ctx: BuildContext, spec: FragmentSpec) -> List[str]:
+    """Worker task: render one :class:`FragmentSpec`."""
+    return spec.render(ctx)
+
+
+# -----------------------------------------------------------------------
+# Worker side
+# -----------------------------------------------------------------------
+
+def _init_worker(ctx: BuildContext) -> None:
+    global _WORKER_CTX
+    # With the 'fork' start method the context arrives unpickled, pool and
+    # all; workers must never fan out again.
+    ctx.pool = None
+    _WORKER_CTX = ctx
+
+
+def _run(fn: Callable[[BuildContext, _T], _R], item: _T) -> Tuple[_R, List[Observation]]:
+    ctx = _WORKER_CTX
+    assert ctx is not None, "worker used before initialisation"
+    with ctx.recording() as observed:
+        result = fn(ctx, item)
+    return result, list(observed)
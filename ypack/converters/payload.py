@@ -0,0 +1,429 @@
+"""
+Payload index — what the local file sources actually contain.
+
+NSIS hands ``File /r`` globs straight to makensis, so ypack itself used
+to know nothing about the payload.  :class:`PayloadIndex` walks every
+local ``files`` entry and package source once per build: directory
+trees are listed through the build's :class:`~.fs.FileSystem` on a
+thread pool (directory reads release the GIL) and each file's size and
+mtime come from the same scan.  Content hashes are computed lazily, on first request.  Given the
+:class:`~.payload_store.PayloadStore` of a previous build, the walk is
+incremental (see :class:`PayloadIndex`).
+
+Generators read it through :attr:`BuildContext.payload` and expand a
+source with :meth:`PayloadIndex.expand` instead of touching the
+filesystem themselves.  Expansion follows makensis ``File`` semantics:
+a bare directory installs as a subdirectory of the destination, a
+pattern installs the matching files (at every level when recursive)
+with their paths below the pattern's base directory.
+
+A source may carry a :class:`~.payload_filter.PayloadFilter`.  The walk
+does not descend into a directory that every source covering it
+excludes, and :meth:`PayloadIndex.expand` applies the source's own
+filter to what was read.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..config import PackageConfig
+from .fs import FileSystem, LocalFileSystem
+from .ir import is_recursive_glob
+from .payload_filter import PayloadFilter
+
+if TYPE_CHECKING:
+    from .payload_hash import HashCache
+    from .payload_store import PayloadStore
+
+_WILDCARD_RE = re.compile(r"[*?\[]")
+
+
+class PayloadFile:
+    """One local file: absolute *path*, *size* in bytes and *mtime_ns*."""
+
+    __slots__ = ("path", "size", "mtime_ns", "_sha256")
+
+    def __init__(self, path: str, size: int, mtime_ns: int, sha256: Optional[str] = None) -> None:
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._sha256 = sha256
+
+    def __repr__(self) -> str:
+        return f"PayloadFile({self.path!r}, size={self.size})"
+
+    def sha256(self, fs: Optional[FileSystem] = None) -> str:
+        """Hex SHA-256 of the content, read through *fs* on first call.
+
+        *fs* defaults to the local disk; pass the index's
+        :attr:`PayloadIndex.fs` for a file it listed.
+        """
+        if self._sha256 is None:
+            from .payload_hash import hash_file
+            self._sha256 = hash_file(self.path, "sha256", fs)
+        return self._sha256
+
+    @property
+    def known_sha256(self) -> Optional[str]:
+        """The SHA-256 if it has been computed (or carried over), else ``None``."""
+        return self._sha256
+
+
+class PayloadDir:
+    """One directory listing: its *mtime_ns*, files by name and subdirectory names."""
+
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: Dict[str, PayloadFile], subdirs: List[str]) -> None:
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+#: ``(install-relative path, file)``; the path is ``/``-separated.
+PayloadMatch = Tuple[str, PayloadFile]
+
+#: ``(source, recursive, filter)`` — one local source as the plan copies it.
+PayloadSource = Tuple[str, bool, Optional[PayloadFilter]]
+
+# (filter, path relative to the filtered source's base) for every source
+# whose tree a directory belongs to.
+_Interests = List[Tuple[Optional[PayloadFilter], str]]
+
+
+def split_source(source: str, recursive: bool) -> Tuple[str, str, bool]:
+    """Split a config source into ``(base_dir, pattern, recursive)``.
+
+    ``lib/*`` → ``("lib", "*", recursive)``; ``lib/**/*.dll`` →
+    ``("lib", "*.dll", True)``; a plain path gives an empty *pattern*.
+    """
+    parts = [p for p in re.split(r"[\\/]", source) if p]
+    for i, part in enumerate(parts):
+        if _WILDCARD_RE.search(part):
+            base = "/".join(parts[:i])
+            rest = parts[i:]
+            if "**" in rest:
+                recursive = True
+            pattern = next((p for p in reversed(rest) if p != "**"), "*")
+            if source.startswith(("/", "\\")):
+                base = "/" + base
+            return base, pattern, recursive
+    return source, "", recursive
+
+
+def local_sources(config: PackageConfig) -> Iterator[PayloadSource]:
+    """``(source, recursive, filter)`` of every local file entry and package source.
+
+    The flags match the ``CopyFile`` operations of the installer plan
+    and the filters those of :func:`~.ir.expand_groups`, so plan
+    sources can be looked up in the index directly.
+    """
+    for fe in config.files:
+        if not fe.is_remote:
+            filters = PayloadFilter.from_configs(config.filters, fe.filters)
+            yield fe.source, is_recursive_glob(fe.source) or fe.recursive, filters
+    # A package's filter applies to its children too.
+    outer = PayloadFilter.from_configs(config.filters)
+    stack = [(pkg, outer) for pkg in config.packages]
+    while stack:
+        pkg, outer = stack.pop()
+        filters = PayloadFilter.combine(outer, PayloadFilter.from_configs(pkg.filters))
+        stack.extend((child, filters) for child in pkg.children)
+        for src_entry in pkg.sources:
+            src_val = src_entry.get("source", "")
+            for src in (src_val if isinstance(src_val, list) else [src_val]):
+                yield src, is_recursive_glob(src), filters
+
+
+class PayloadIndex:
+    """Sizes and mtimes of every local payload file, from one parallel walk.
+
+    *sources* are ``(source, recursive)`` or ``(source, recursive,
+    filter)`` tuples.  *locate* maps a config-relative path to an
+    absolute one (see :meth:`BuildContext.resolve_path`).  Everything is
+    read through *fs* (the local disk by default).
+
+    With a *previous* store, a directory whose mtime is unchanged is not
+    listed again: its entry names are reused and only its files are
+    stat'ed (editing a file in place does not touch the directory
+    mtime).  A file whose size and mtime are unchanged keeps its stored
+    hash.  *stats* counts what was rescanned and reused.
+    """
+
+    def __init__(
+        self,
+        sources: Iterable[Tuple[Any, ...]],
+        locate: Callable[[str], str],
+        threads: Optional[int] = None,
+        previous: Optional[PayloadStore] = None,
+        fs: Optional[FileSystem] = None,
+    ) -> None:
+        self.fs = fs if fs is not None else LocalFileSystem()
+        self.stats: Dict[str, int] = {
+            "dirs_scanned": 0, "dirs_reused": 0, "dirs_pruned": 0, "hashes_reused": 0,
+        }
+        self._previous = previous
+        self._specs: Dict[PayloadSource, Tuple[str, str, bool]] = {}
+        trees: Dict[str, List[Optional[PayloadFilter]]] = {}
+        flat: Set[str] = set()
+        singles: Set[str] = set()
+        for item in sources:
+            source, recursive = item[0], item[1]
+            key = (source, recursive, (item[2] if len(item) > 2 else None) or None)
+            if key in self._specs or not source:
+                continue
+            base, pattern, rec = split_source(source, recursive)
+            base = locate(base) if base else locate(".")
+            self._specs[key] = (base, pattern, rec)
+            if pattern and not rec:
+                flat.add(base)
+            elif pattern or self.fs.isdir(base):
+                trees.setdefault(base, []).append(key[2])
+            else:
+                singles.add(base)
+
+        self._dirs: Dict[str, PayloadDir] = {}
+        self._singles: Dict[str, PayloadFile] = {}
+        self._files: Optional[Dict[str, PayloadFile]] = None
+        self._walk(trees, flat, threads)
+        old_singles = previous.singles() if previous is not None else {}
+        for path in sorted(singles):
+            file = _stat_file(self.fs, path, old_singles.get(path))
+            if file is not None:
+                self._singles[path] = file
+        self.stats["hashes_reused"] = sum(
+            1 for f in self.files.values() if f.known_sha256 is not None
+        )
+        self._previous = None
+
+    # ------------------------------------------------------------------
+    # Walk
+    # ------------------------------------------------------------------
+
+    def _walk(
+        self, trees: Dict[str, List[Optional[PayloadFilter]]], flat: Set[str], threads: Optional[int],
+    ) -> None:
+        # A tree below another tree is covered by the outer walk.
+        roots = sorted(trees)
+        tops = [r for i, r in enumerate(roots) if not any(_is_below(r, o) for o in roots[:i])]
+        inner = {d for d in flat | set(roots) if any(_is_below(d, t) for t in tops)}
+        flat = {d for d in flat if d not in inner and d not in trees}
+        if not tops and not flat:
+            return
+        # Directories leading to a nested source base are walked even if
+        # the outer sources exclude them.
+        anchors: Set[str] = set()
+        top_set = set(tops)
+        for path in inner:
+            while path not in anchors and path not in top_set:
+                anchors.add(path)
+                path = os.path.dirname(path)
+        previous = self._previous
+        fs = self.fs
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+
+            def submit(path: str, interests: Optional[_Interests]) -> Future:
+                return pool.submit(_scan_dir, fs, path, interests, previous)
+
+            pending: Set[Future] = set()
+            for path in tops:
+                pending.add(submit(path, []))
+            for path in flat:
+                pending.add(submit(path, None))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, listing, interests, reused = future.result()
+                    if listing is None:
+                        continue
+                    self._dirs[path] = listing
+                    self.stats["dirs_reused" if reused else "dirs_scanned"] += 1
+                    if interests is None:
+                        continue
+                    active = interests + [(f, "") for f in trees.get(path, ())]
+                    for name in listing.subdirs:
+                        child = os.path.join(path, name)
+                        below = [
+                            (f, f"{rel}/{name}" if rel else name)
+                            for f, rel in active
+                        ]
+                        below = [(f, rel) for f, rel in below if f is None or not f.excludes_dir(rel)]
+                        if below or child in anchors:
+                            pending.add(submit(child, below))
+                        else:
+                            self.stats["dirs_pruned"] += 1
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @property
+    def dirs(self) -> Dict[str, PayloadDir]:
+        """Every walked directory by absolute path."""
+        return self._dirs
+
+    @property
+    def singles(self) -> Dict[str, PayloadFile]:
+        """Files named directly by a source (outside any walked tree)."""
+        return self._singles
+
+    @property
+    def files(self) -> Dict[str, PayloadFile]:
+        """Every indexed file by absolute path."""
+        if self._files is None:
+            found = dict(self._singles)
+            for listing in self._dirs.values():
+                for file in listing.files.values():
+                    found[file.path] = file
+            self._files = found
+        return self._files
+
+    @property
+    def total_size(self) -> int:
+        return sum(f.size for f in self.files.values())
+
+    def expand(
+        self, source: str, recursive: bool = False, filters: Optional[PayloadFilter] = None,
+    ) -> List[PayloadMatch]:
+        """Files installed by *source* through *filters*, sorted by install-relative path.
+
+        The absolute path of an indexed file expands to that file.
+        Other sources that were not part of the walk (or that match
+        nothing) give an empty list.
+        """
+        spec = self._specs.get((source, recursive, filters or None))
+        if spec is None:
+            file = self.files.get(source)
+            return [(os.path.basename(source), file)] if file is not None else []
+        base, pattern, rec = spec
+        flt = filters or None
+        if not pattern:
+            single = self._singles.get(base)
+            if single is not None:
+                name = os.path.basename(base)
+                return [(name, single)] if flt is None or flt.accepts_file(name, single.size) else []
+            if base not in self._dirs:
+                return []
+            name = os.path.basename(os.path.normpath(base))
+            return [(f"{name}/{rel}", f) for rel, f in self._tree(base, flt)]
+        if base not in self._dirs:
+            return []
+        if rec:
+            matches = self._tree(base, flt)
+            if pattern == "*":
+                return matches
+            return [(rel, f) for rel, f in matches if fnmatch.fnmatch(rel.rsplit("/", 1)[-1], pattern)]
+        files = self._dirs[base].files
+        return [
+            (name, files[name]) for name in sorted(files)
+            if fnmatch.fnmatch(name, pattern) and (flt is None or flt.accepts_file(name, files[name].size))
+        ]
+
+    def covers(self, source: str, recursive: bool = False, filters: Optional[PayloadFilter] = None) -> bool:
+        """Whether the file or base directory of *source* exists (before filtering)."""
+        spec = self._specs.get((source, recursive, filters or None))
+        return spec is not None and (spec[0] in self._singles or spec[0] in self._dirs)
+
+    def hashes(
+        self,
+        algorithm: str = "sha256",
+        threads: Optional[int] = None,
+        cache: Optional[HashCache] = None,
+        paths: Optional[Iterable[str]] = None,
+    ) -> Dict[str, str]:
+        """Digests of every indexed file (or of the indexed *paths*) by absolute path.
+
+        See :func:`~.payload_hash.hash_files`.  SHA-256 digests already
+        known (computed earlier or carried over from a payload store) are
+        not recomputed, and new ones are kept.
+        """
+        from .payload_hash import hash_files
+        files = self.files
+        if paths is not None:
+            files = {p: files[p] for p in paths if p in files}
+        if algorithm != "sha256":
+            return hash_files(files, algorithm, threads, cache, self.fs)
+        known = {path: f.known_sha256 for path, f in files.items() if f.known_sha256 is not None}
+        digests = hash_files((p for p in files if p not in known), algorithm, threads, cache, self.fs)
+        for path, digest in digests.items():
+            files[path]._sha256 = digest
+        known.update(digests)
+        return known
+
+    def source_size(self, source: str, recursive: bool = False) -> int:
+        """Total bytes installed by *source*."""
+        return sum(f.size for _, f in self.expand(source, recursive))
+
+    def _tree(self, root: str, filters: Optional[PayloadFilter] = None) -> List[PayloadMatch]:
+        matches: List[PayloadMatch] = []
+        stack: List[Tuple[str, str]] = [(root, "")]
+        while stack:
+            path, rel = stack.pop()
+            listing = self._dirs.get(path)
+            if listing is None:
+                continue
+            prefix = f"{rel}/" if rel else ""
+            if filters is None:
+                matches.extend((prefix + name, f) for name, f in listing.files.items())
+                stack.extend((os.path.join(path, name), prefix + name) for name in listing.subdirs)
+                continue
+            matches.extend(
+                (prefix + name, f) for name, f in listing.files.items()
+                if filters.accepts_file(prefix + name, f.size)
+            )
+            stack.extend(
+                (os.path.join(path, name), prefix + name) for name in listing.subdirs
+                if not filters.excludes_dir(prefix + name)
+            )
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+
+def _is_below(path: str, root: str) -> bool:
+    return path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _stat_file(fs: FileSystem, path: str, old: Optional[PayloadFile]) -> Optional[PayloadFile]:
+    st = fs.stat(path)
+    if st is None or st.is_dir:
+        return None
+    return _carry(PayloadFile(path, st.size, st.mtime_ns), old)
+
+
+def _carry(file: PayloadFile, old: Optional[PayloadFile]) -> PayloadFile:
+    # Same size and mtime: trust the stored hash.
+    if old is not None and old.size == file.size and old.mtime_ns == file.mtime_ns:
+        file._sha256 = old.known_sha256
+    return file
+
+
+def _scan_dir(
+    fs: FileSystem, path: str, interests: Optional[_Interests], previous: Optional[PayloadStore],
+) -> Tuple[str, Optional[PayloadDir], Optional[_Interests], bool]:
+    st = fs.stat(path)
+    if st is None:
+        return path, None, interests, False
+    old = previous.directory(path) if previous is not None else None
+    files: Dict[str, PayloadFile] = {}
+    if old is not None and old.mtime_ns == st.mtime_ns:
+        # Entries unchanged; file contents may not be.
+        for name, old_file in old.files.items():
+            file = _stat_file(fs, os.path.join(path, name), old_file)
+            if file is not None:
+                files[name] = file
+        return path, PayloadDir(st.mtime_ns, files, list(old.subdirs)), interests, True
+
+    listing = fs.scan(path)
+    if listing is None:
+        return path, None, interests, False
+    subdirs, stats = listing
+    prefix = os.path.join(path, "")
+    for name, file_st in stats.items():
+        file = PayloadFile(prefix + name, file_st.size, file_st.mtime_ns)
+        files[name] = _carry(file, old.files.get(name) if old else None)
+    return path, PayloadDir(st.mtime_ns, files, subdirs), interests, False
@@ -0,0 +1,187 @@
+"""
+Payload filters — gitignore-style ``exclude`` / ``include`` patterns
+plus size limits.
+
+A :class:`PayloadFilter` compiles all of its patterns into one regular
+expression per question ("is this directory excluded?", "is this file
+excluded?", "is it included?") so a lookup is a single ``match`` call
+however many patterns there are.  Paths are ``/``-separated and relative
+to the base directory of the source being filtered.
+
+Pattern rules follow ``.gitignore``:
+
+* ``*.pdb`` — no slash: matches a name at any depth;
+* ``build/tmp``, ``/dist`` — a slash: anchored at the source base;
+* ``__pycache__/`` — trailing slash: directories only (and everything
+  below them);
+* ``**`` spans directories, ``*`` / ``?`` / ``[...]`` stay within one
+  name;
+* ``!pattern`` re-includes what an earlier exclude matched; the last
+  matching pattern wins.  As in git, a file below an excluded directory
+  cannot be re-included (the directory is never read).
+
+``include`` patterns, when given, restrict files to those matching at
+least one of them; directories are always descended.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable, Optional, Pattern, Sequence, Tuple
+
+from ..config import FilterConfig
+
+
+class PayloadFilter:
+    """Compiled exclude / include patterns and a ``[min_size, max_size]`` range.
+
+    Instances are immutable and hashable (by their rules), so they can
+    be part of a payload index key.  *max_size* ``0`` means no limit.
+    """
+
+    __slots__ = ("exclude", "include", "min_size", "max_size", "_dirs", "_files", "_include")
+
+    def __init__(
+        self,
+        exclude: Iterable[str] = (),
+        include: Iterable[str] = (),
+        min_size: int = 0,
+        max_size: int = 0,
+    ) -> None:
+        self.exclude: Tuple[str, ...] = tuple(p.strip() for p in exclude if p.strip() and not p.startswith("#"))
+        self.include: Tuple[str, ...] = tuple(p.strip() for p in include if p.strip() and not p.startswith("#"))
+        self.min_size = min_size
+        self.max_size = max_size
+        self._dirs = _compile_excludes(self.exclude, directories=True)
+        self._files = _compile_excludes(self.exclude, directories=False)
+        self._include = _compile_any(self.include)
+
+    @classmethod
+    def from_configs(cls, *configs: FilterConfig) -> Optional[PayloadFilter]:
+        """The combined filter of *configs* (outermost first), ``None`` when they set no rules."""
+        return cls.combine(*(cls(c.exclude, c.include, c.min_size, c.max_size) for c in configs))
+
+    @classmethod
+    def combine(cls, *filters: Optional[PayloadFilter]) -> Optional[PayloadFilter]:
+        """One filter applying all of *filters* (later excludes win); ``None`` if there are no rules."""
+        present = [f for f in filters if f]
+        if not present:
+            return None
+        if len(present) == 1:
+            return present[0]
+        max_sizes = [f.max_size for f in present if f.max_size]
+        return cls(
+            exclude=[p for f in present for p in f.exclude],
+            include=[p for f in present for p in f.include],
+            min_size=max(f.min_size for f in present),
+            max_size=min(max_sizes) if max_sizes else 0,
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.exclude or self.include or self.min_size or self.max_size)
+
+    def _key(self) -> Tuple[Tuple[str, ...], Tuple[str, ...], int, int]:
+        return self.exclude, self.include, self.min_size, self.max_size
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PayloadFilter) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"PayloadFilter(exclude={list(self.exclude)!r}, include={list(self.include)!r}, "
+            f"min_size={self.min_size}, max_size={self.max_size})"
+        )
+
+    def __reduce__(self) -> Tuple[type, Tuple[Tuple[str, ...], Tuple[str, ...], int, int]]:
+        # Compiled patterns are rebuilt, not pickled.
+        return PayloadFilter, self._key()
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def excludes_dir(self, rel: str) -> bool:
+        """Whether the directory at *rel* (and so everything below it) is excluded."""
+        return _excluded(self._dirs, rel)
+
+    def accepts_file(self, rel: str, size: int) -> bool:
+        """Whether the file at *rel* with *size* bytes passes every rule."""
+        if size < self.min_size or (self.max_size and size > self.max_size):
+            return False
+        if _excluded(self._files, rel):
+            return False
+        return self._include is None or self._include.match(rel) is not None
+
+
+def _excluded(pattern: Optional[Pattern[str]], rel: str) -> bool:
+    if pattern is None:
+        return False
+    match = pattern.match(rel)
+    # Alternatives are tried last pattern first, so the group that
+    # matched is the last matching pattern; "n" groups are negations.
+    return match is not None and match.lastgroup is not None and match.lastgroup[0] == "x"
+
+
+def _compile_excludes(patterns: Sequence[str], directories: bool) -> Optional[Pattern[str]]:
+    parts = []
+    for i in reversed(range(len(patterns))):
+        pattern = patterns[i]
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        dir_only = pattern.endswith("/")
+        if dir_only and not directories:
+            continue
+        parts.append(f"(?P<{'n' if negate else 'x'}{i}>{_translate(pattern.rstrip('/'))})")
+    if not parts:
+        return None
+    return re.compile(f"(?:{'|'.join(parts)})\\Z")
+
+
+def _compile_any(patterns: Sequence[str]) -> Optional[Pattern[str]]:
+    if not patterns:
+        return None
+    return re.compile(f"(?:{'|'.join(_translate(p.rstrip('/')) for p in patterns)})\\Z")
+
+
+def _translate(pattern: str) -> str:
+    """Regex source for one gitignore pattern (without ``!`` or trailing ``/``)."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    out = [] if anchored else ["(?:.*/)?"]
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
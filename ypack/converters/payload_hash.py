@@ -0,0 +1,188 @@
+"""
+Content hashes of local payload files.
+
+Checksums, dedupe and cache keys all need file hashes; :func:`hash_files`
+computes them on a thread pool with large-buffer reads (``hashlib``
+releases the GIL while it digests a buffer, so threads scale with the
+disk rather than with the interpreter).  A :class:`HashCache` keeps
+digests in a SQLite file keyed by ``(path, size, mtime_ns, inode)``, so
+a file is read again only when one of those changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, cast
+
+from .fs import FileStat, FileSystem, LocalFileSystem
+
+#: Supported algorithm names (``hashlib`` constructors).
+HASH_ALGORITHMS: Tuple[str, ...] = ("sha256", "sha1", "md5", "blake2b", "blake2s")
+
+_READ_BUFFER = 1 << 20
+
+#: ``(size, mtime_ns, inode)`` — a file is re-read when any of these change.
+FileKey = Tuple[int, int, int]
+
+
+def file_key(st: FileStat) -> FileKey:
+    return st.size, st.mtime_ns, st.ino
+
+
+def hash_file(path: str, algorithm: str = "sha256", fs: Optional[FileSystem] = None) -> str:
+    """Hex digest of the file at *path* (read through *fs*, the local disk by default)."""
+    digest = hashlib.new(_check(algorithm))
+    buffer = bytearray(_READ_BUFFER)
+    view = memoryview(buffer)
+    with (fs or LocalFileSystem()).open(path) as fh:
+        # FileSystem.open gives a raw or buffered binary file; both have
+        # readinto, which typing.BinaryIO does not declare.
+        readinto = cast(io.RawIOBase, fh).readinto
+        while True:
+            n = readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Digests by ``(path, algorithm)``, optionally persisted to SQLite.
+
+    Lookups only return a digest whose recorded :data:`FileKey` matches
+    the file's current one.  New digests are kept in memory until
+    :meth:`save`.  A *path* that is not a SQLite database is never
+    touched; the cache then only lives for this run.  Safe to use from
+    several threads.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Tuple[FileKey, str]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                self._db = _connect(path)
+            except sqlite3.DatabaseError:
+                # Not a hash cache (possibly a file the user pointed at by
+                # mistake): leave it alone and run uncached, as a bad
+                # payload store is ignored.
+                self._db = None
+
+    def lookup(self, path: str, algorithm: str, key: FileKey) -> Optional[str]:
+        """The cached digest of *path* if it was computed for the same *key*."""
+        with self._lock:
+            entry = self._pending.get((path, algorithm))
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT size, mtime_ns, inode, digest FROM hashes WHERE path = ? AND algorithm = ?",
+                    (path, algorithm),
+                ).fetchone()
+                if row is not None:
+                    entry = (tuple(row[:3]), row[3])
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def store(self, path: str, algorithm: str, key: FileKey, digest: str) -> None:
+        with self._lock:
+            self._pending[(path, algorithm)] = (key, digest)
+
+    def save(self) -> None:
+        """Write the digests computed in this run to :attr:`path`."""
+        with self._lock:
+            if self._db is None or not self._pending:
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                    [(p, a, *key, digest) for (p, a), (key, digest) in self._pending.items()],
+                )
+            self._pending.clear()
+
+    def close(self) -> None:
+        self.save()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self) -> HashCache:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def hash_files(
+    paths: Iterable[str],
+    algorithm: str = "sha256",
+    threads: Optional[int] = None,
+    cache: Optional[HashCache] = None,
+    fs: Optional[FileSystem] = None,
+) -> Dict[str, str]:
+    """Hex digests of *paths* (missing or unreadable files are left out)."""
+    _check(algorithm)
+    fs = fs if fs is not None else LocalFileSystem()
+    digests: Dict[str, str] = {}
+    todo: List[Tuple[str, FileKey]] = []
+    for path in dict.fromkeys(paths):
+        st = fs.stat(path)
+        if st is None or st.is_dir:
+            continue
+        key = file_key(st)
+        cached = cache.lookup(path, algorithm, key) if cache is not None else None
+        if cached is not None:
+            digests[path] = cached
+        else:
+            todo.append((path, key))
+    if not todo:
+        return digests
+
+    def work(item: Tuple[str, FileKey]) -> Tuple[str, FileKey, Optional[str]]:
+        try:
+            return item[0], item[1], hash_file(item[0], algorithm, fs)
+        except OSError:
+            return item[0], item[1], None
+
+    # Largest first, so one big file does not finish last on its own.
+    todo.sort(key=lambda item: -item[1][0])
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for path, key, digest in pool.map(work, todo):
+            if digest is None:
+                continue
+            digests[path] = digest
+            if cache is not None:
+                cache.store(path, algorithm, key, digest)
+    return digests
+
+
+def _check(algorithm: str) -> str:
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(
+            f"Unsupported hash algorithm '{algorithm}' (expected one of: {', '.join(HASH_ALGORITHMS)})"
+        )
+    return algorithm
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False)
+    try:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " path TEXT NOT NULL, algorithm TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL,"
+            " digest TEXT NOT NULL, PRIMARY KEY (path, algorithm))"
+        )
+    except sqlite3.DatabaseError:
+        db.close()
+        raise
+    return db
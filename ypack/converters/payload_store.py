@@ -0,0 +1,209 @@
+"""
+Persistent payload index — a compact binary file reused across builds.
+
+:func:`save_store` writes a :class:`PayloadIndex` as fixed-width
+directory and file records followed by one UTF-8 string table;
+:class:`PayloadStore` memory-maps it and decodes records only when they
+are asked for, so batch workers and variant builds can share one file
+without loading all of it.  Passing the store of the previous build to
+:class:`PayloadIndex` makes the next walk incremental.
+
+Layout (little-endian)::
+
+    header   magic "YPIX", version, #roots, #dirs, #files, string table size
+    dirs     #dirs  x (name, mtime_ns, first file, #files, first child, #children)
+    files    #files x (name, size, mtime_ns, has_sha256, sha256)
+    strings  UTF-8 names referenced by (offset, length)
+
+Directory 0 holds the files named directly by a source (absolute
+names); directories ``1 .. #roots`` are walk roots (absolute names);
+the rest are subdirectories, stored breadth-first so the children of
+every directory are contiguous.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .payload import PayloadDir, PayloadFile, PayloadIndex
+
+MAGIC = b"YPIX"
+STORE_VERSION = 1
+
+_HEADER = struct.Struct("<4sIIIIQ")
+_DIR = struct.Struct("<IIqIIII")
+_FILE = struct.Struct("<IIQqB32s")
+# mtime of a directory that is named but was never listed; never reused.
+_NOT_LISTED = -1
+
+
+class PayloadStore:
+    """Read-only, memory-mapped view of a saved payload index.
+
+    Raises :class:`ValueError` for files that are not a payload store of
+    the current version; callers treat that like a missing store.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"'{path}' is not a payload index")
+        magic, version, n_roots, n_dirs, n_files, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != STORE_VERSION:
+            raise ValueError(f"'{path}' is not a version {STORE_VERSION} payload index")
+        self._n_roots = n_roots
+        self._n_dirs = n_dirs
+        self._n_files: int = n_files
+        self._files_at = _HEADER.size + n_dirs * _DIR.size
+        self._strings_at = self._files_at + n_files * _FILE.size
+        # Directory path -> record number, decoded on first lookup (the
+        # directory table is small next to the file table).
+        self._paths: Optional[Dict[str, int]] = None
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> PayloadStore:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of stored files."""
+        return self._n_files
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def directory(self, path: str) -> Optional[PayloadDir]:
+        """The stored listing of the absolute directory *path*, if any."""
+        number = self._dir_paths().get(path)
+        if number is None:
+            return None
+        _, _, mtime_ns, first, count, child, children = self._dir(number)
+        if mtime_ns == _NOT_LISTED:
+            return None
+        prefix = os.path.join(path, "")
+        files = {}
+        for name, size, file_mtime, digest in self._files(first, count):
+            files[name] = PayloadFile(prefix + name, size, file_mtime, digest)
+        subdirs = [self._string(*self._dir(c)[:2]) for c in range(child, child + children)]
+        return PayloadDir(mtime_ns, files, subdirs)
+
+    def singles(self) -> Dict[str, PayloadFile]:
+        """Files stored outside any walked tree, by absolute path."""
+        if not self._n_dirs:
+            return {}
+        _, _, _, first, count, _, _ = self._dir(0)
+        return {
+            name: PayloadFile(name, size, mtime_ns, digest)
+            for name, size, mtime_ns, digest in self._files(first, count)
+        }
+
+    def _dir_paths(self) -> Dict[str, int]:
+        if self._paths is None:
+            # Breadth-first order: a directory's path is known before its
+            # children are reached.
+            paths: List[str] = [""] * self._n_dirs
+            for number in range(1, self._n_dirs):
+                name_off, name_len, _, _, _, child, children = self._dir(number)
+                if number <= self._n_roots:
+                    paths[number] = self._string(name_off, name_len)
+                for c in range(child, child + children):
+                    paths[c] = os.path.join(paths[number], self._string(*self._dir(c)[:2]))
+            self._paths = {path: number for number, path in enumerate(paths) if number}
+        return self._paths
+
+    def _dir(self, number: int) -> Tuple[int, int, int, int, int, int, int]:
+        return _DIR.unpack_from(self._map, _HEADER.size + number * _DIR.size)
+
+    def _files(self, first: int, count: int) -> Iterator[Tuple[str, int, int, Optional[str]]]:
+        """``(name, size, mtime_ns, sha256)`` of *count* file records from *first*."""
+        start = self._files_at + first * _FILE.size
+        strings = self._strings_at
+        data = self._map
+        for name_off, name_len, size, mtime_ns, has_hash, digest in _FILE.iter_unpack(
+            data[start:start + count * _FILE.size]
+        ):
+            name = data[strings + name_off:strings + name_off + name_len].decode("utf-8")
+            yield name, size, mtime_ns, digest.hex() if has_hash else None
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_at + offset
+        return self._map[start:start + length].decode("utf-8")
+
+
+def load_store(path: str) -> Optional[PayloadStore]:
+    """Open the store at *path*, or ``None`` when it is missing or unreadable."""
+    try:
+        return PayloadStore(path)
+    except (OSError, ValueError):
+        return None
+
+
+def save_store(index: PayloadIndex, path: str) -> None:
+    """Write *index* (including the hashes computed so far) to *path* atomically."""
+    strings = bytearray()
+    offsets: Dict[str, int] = {}
+
+    def string(text: str) -> Tuple[int, int]:
+        data = text.encode("utf-8")
+        offset = offsets.get(text)
+        if offset is None:
+            offset = offsets[text] = len(strings)
+            strings.extend(data)
+        return offset, len(data)
+
+    dirs = index.dirs
+    # Walk roots: directories whose parent was not walked.
+    roots = sorted(p for p in dirs if os.path.dirname(p) not in dirs or os.path.dirname(p) == p)
+    order: List[Tuple[str, str]] = [("", "")] + [(p, p) for p in roots]
+    empty = PayloadDir(_NOT_LISTED, {}, [])
+    dir_records: List[bytes] = []
+    file_records: List[bytes] = []
+
+    def add_files(files: Dict[str, PayloadFile], absolute: bool) -> Tuple[int, int]:
+        first = len(file_records)
+        for name in sorted(files):
+            file = files[name]
+            digest = file.known_sha256
+            file_records.append(_FILE.pack(
+                *string(file.path if absolute else name),
+                file.size, file.mtime_ns,
+                1 if digest else 0, bytes.fromhex(digest) if digest else b"",
+            ))
+        return first, len(file_records) - first
+
+    first, count = add_files(index.singles, True)
+    dir_records.append(_DIR.pack(0, 0, 0, first, count, 0, 0))
+    # Breadth-first: children are appended together, after their parent.
+    i = 1
+    while i < len(order):
+        dir_path, name = order[i]
+        # Subdirectories that were not walked are kept as empty records
+        # so the parent's listing stays complete.
+        listing = dirs.get(dir_path, empty)
+        first, count = add_files(listing.files, False)
+        children = [(os.path.join(dir_path, sub), sub) for sub in sorted(listing.subdirs)]
+        child = len(order)
+        order.extend(children)
+        dir_records.append(_DIR.pack(
+            *string(name), listing.mtime_ns, first, count, child, len(children),
+        ))
+        i += 1
+
+    header = _HEADER.pack(MAGIC, STORE_VERSION, len(roots), len(dir_records), len(file_records), len(strings))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(header)
+        fh.writelines(dir_records)
+        fh.writelines(file_records)
+        fh.write(strings)
+    os.replace(tmp, path)
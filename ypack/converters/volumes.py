@@ -0,0 +1,167 @@
+"""
+Payload files too large for the installer.
+
+makensis cannot store a file of 2 GB or more, nor a payload that large
+in total.  :meth:`~.context.SharedBuild.external_files` picks the files
+to leave out — every file over the limit, then the largest others until
+the rest fits — and :func:`ship_externally` turns their ``CopyFile``
+operations into :class:`~.ir.CopyExternal`.  :func:`write_volumes`
+splits each of those files into volumes of at most the limit under
+:data:`VOLUME_DIR` next to the script (where makensis writes the
+installer); at install time ``_JoinVolume`` (``ypack_volume.nsh``)
+concatenates them back into place and checks the SHA-256.
+
+Volumes are named after the content digest, so an unchanged file is not
+rewritten by the next build and identical files share their volumes.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Sequence, Tuple
+
+from .fs import FileSystem
+from .ir import CopyExternal, CopyFile, InstallerPlan, Op, iter_components
+
+#: Largest file, and total payload, kept inside an NSIS installer (leaves
+#: room below makensis' 2 GB limit for the stub and the script's own data).
+VOLUME_LIMIT = 2000 << 20
+
+#: Directory next to the installer that holds the volumes.
+VOLUME_DIR = "volumes"
+
+#: ``(absolute path, size, sha256)`` of one file shipped in volumes.
+ExternalFile = Tuple[str, int, str]
+
+_COPY_CHUNK = 1 << 20
+
+
+@dataclass
+class VolumeStats:
+    """What :func:`ship_externally` moved out of the installer."""
+    files: int = 0    # files reassembled from volumes at install time
+    bytes: int = 0    # their total size
+    volumes: int = 0  # volume files they are split into
+
+    def summary(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes:,} bytes) too large for the installer, "
+            f"shipped in {self.volumes} volumes under {VOLUME_DIR}\\ next to it"
+        )
+
+
+def pick_external(sizes: Dict[str, int], limit: int) -> List[str]:
+    """Paths to leave out of an installer holding at most *limit* bytes, sorted.
+
+    Every file larger than *limit* goes, then the largest of the others
+    until the remaining total fits.
+    """
+    total = sum(sizes.values())
+    picked: List[str] = []
+    for path in sorted(sizes, key=lambda p: (-sizes[p], p)):
+        if sizes[path] <= limit and total <= limit:
+            break
+        picked.append(path)
+        total -= sizes[path]
+    return sorted(picked)
+
+
+def volume_count(size: int, limit: int) -> int:
+    """Number of volumes of at most *limit* bytes holding *size* bytes."""
+    return max(1, -(-size // limit))
+
+
+def ship_externally(plan: InstallerPlan, external: Sequence[ExternalFile], limit: int) -> VolumeStats:
+    """Replace the copies of *external* files in *plan* (in place)."""
+    stats = VolumeStats()
+    by_path = {path: (size, sha256) for path, size, sha256 in external}
+    volumes = set()
+
+    def rewrite(ops: List[Op]) -> List[Op]:
+        out: List[Op] = []
+        for op in ops:
+            if isinstance(op, CopyFile) and not op.recursive and op.source in by_path:
+                size, sha256 = by_path[op.source]
+                op = CopyExternal(op.source, volume_prefix(sha256), volume_count(size, limit), size, sha256)
+                stats.files += 1
+                stats.bytes += size
+                volumes.update(volume_names(op))
+            out.append(op)
+        return out
+
+    plan.files = rewrite(plan.files)
+    for comp in iter_components(plan.components):
+        comp.ops = rewrite(comp.ops)
+    stats.volumes = len(volumes)
+    return stats
+
+
+def external_ops(plan: InstallerPlan) -> List[CopyExternal]:
+    """The :class:`~.ir.CopyExternal` operations of *plan*, in order."""
+    ops = plan.files + [op for comp in iter_components(plan.components) for op in comp.ops]
+    return [op for op in ops if isinstance(op, CopyExternal)]
+
+
+def volume_prefix(sha256: str) -> str:
+    """Installer-relative volume path stem of the file with digest *sha256*."""
+    return f"{VOLUME_DIR}\\{sha256[:16]}"
+
+
+def volume_names(op: CopyExternal) -> List[str]:
+    """Installer-relative paths of the volumes of *op*, in order."""
+    return [f"{op.volume}.{i:03d}" for i in range(1, op.volumes + 1)]
+
+
+def write_volumes(
+    fs: FileSystem, ops: Sequence[CopyExternal], limit: int, directory: str,
+) -> Tuple[List[str], List[str]]:
+    """Split the files of *ops* into volumes under *directory*.
+
+    Returns the volume paths ``(written, unchanged)``; a volume that
+    already exists with the expected size is left alone (its name is the
+    content digest).
+    """
+    written: List[str] = []
+    unchanged: List[str] = []
+    done = set()
+    for op in ops:
+        if op.volume in done:
+            continue
+        done.add(op.volume)
+        # (path, expected size) of each volume; only the last is short.
+        volumes = [
+            (os.path.join(directory, *name.split("\\")), min(limit, op.size - i * limit))
+            for i, name in enumerate(volume_names(op))
+        ]
+        if all(_size(path) == want for path, want in volumes):
+            unchanged.extend(path for path, _ in volumes)
+            continue
+        os.makedirs(os.path.dirname(volumes[0][0]), exist_ok=True)
+        with fs.open(op.source) as src:
+            for path, want in volumes:
+                _copy_volume(src, path, want)
+                written.append(path)
+    return written, unchanged
+
+
+def _size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return -1
+
+
+def _copy_volume(src: BinaryIO, path: str, size: int) -> None:
+    # Written under a temporary name so an interrupted build never
+    # leaves a short volume that looks complete.
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as dst:
+        left = size
+        while left:
+            chunk = src.read(min(_COPY_CHUNK, left))
+            if not chunk:
+                raise OSError(f"{path}: source file shrank while splitting it into volumes")
+            dst.write(chunk)
+            left -= len(chunk)
+    os.replace(tmp, path)
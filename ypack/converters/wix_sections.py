@@ -0,0 +1,482 @@
+"""
+WiX source generation — directory tree, components and features.
+
+:func:`build_layout` turns the :class:`InstallerPlan` (lowered for the
+``wix`` target, so ``$INSTDIR`` already reads ``[INSTALLDIR]``) into a
+:class:`WixLayout`: the ``Directory`` tree plus the ``Component``
+elements of every feature.  Component GUIDs and element IDs are derived
+from the install path, so the same configuration always produces the
+same bytes and a file keeps its component GUID across versions.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..variables import BUILTIN_VARIABLES
+from .context import BuildContext
+from .ir import (
+    ComponentGroup,
+    ComponentNode,
+    CopyFile,
+    CreateDirectory,
+    CreateShortcut,
+    Download,
+    Op,
+    SetOutPath,
+    Step,
+    UpdateEnvVar,
+    WriteRegistry,
+    iter_components,
+)
+from .payload import split_source
+
+#: Namespace for every GUID ypack derives (UpgradeCode, component GUIDs).
+YPACK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/Wang-Jianwei/xswl-YPack")
+
+MAIN_FEATURE = "Main"
+
+_LOCATION_RE = re.compile(r"^\[([A-Za-z_][A-Za-z0-9_.]*)\]\\?(.*)$")
+_DEFINE_RE = re.compile(r"\$\{([A-Z][A-Z0-9_]*)\}")
+#: Directory properties WiX predefines (``StandardDirectory`` IDs).
+STANDARD_DIRECTORIES = frozenset(
+    var.wix.strip("[]") for var in BUILTIN_VARIABLES.values() if var.wix and var.wix != "[INSTALLDIR]"
+)
+_PER_USER_ROOTS = ("AppDataFolder", "LocalAppDataFolder")
+_REG_TYPES = {"string": "string", "expand": "expandable", "dword": "integer"}
+# Start-menu step of the plan points at the NSIS uninstaller; an MSI
+# is removed through msiexec instead.
+_NSIS_UNINSTALLER = "[INSTALLDIR]Uninstall.exe"
+
+
+def xml_attr(value: str) -> str:
+    """Escape *value* for a double-quoted XML attribute."""
+    return (
+        value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    )
+
+
+def unsupported(feature: str) -> str:
+    return f"<!-- [UNSUPPORTED by wix] {feature.replace('--', '- -')} -->"
+
+
+def upgrade_code(ctx: BuildContext) -> uuid.UUID:
+    """Stable UpgradeCode: the same publisher and app name always upgrade in place."""
+    app = ctx.config.app
+    return uuid.uuid5(YPACK_NAMESPACE, f"{app.publisher}\\{app.name}".lower())
+
+
+def msi_version(version: str) -> str:
+    """The leading ``major.minor.build[.rev]`` numbers of *version* (MSI accepts nothing else)."""
+    match = re.match(r"\d+(?:\.\d+){0,3}", version.strip())
+    return match.group(0) if match else "0.0.0"
+
+
+def _digest(key: str) -> str:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=10).hexdigest()
+
+
+# -----------------------------------------------------------------------
+# Layout
+# -----------------------------------------------------------------------
+
+@dataclass
+class WixDirectory:
+    id: str
+    name: str
+    children: List[WixDirectory] = field(default_factory=list)
+
+
+@dataclass
+class WixLayout:
+    """Directory tree and per-feature component XML for one build."""
+    standard: Dict[str, WixDirectory] = field(default_factory=dict)
+    components: Dict[str, List[str]] = field(default_factory=dict)
+    # XML comments per feature (steps MSI cannot express).
+    notes: Dict[str, List[str]] = field(default_factory=dict)
+    file_count: int = 0
+    # ``SetDirectory`` value when install_dir is not below a standard folder.
+    install_dir_override: str = ""
+    per_user: bool = False
+
+
+class _LayoutBuilder:
+    def __init__(self, ctx: BuildContext) -> None:
+        self.ctx = ctx
+        self.layout = WixLayout()
+        self._dirs: Dict[str, WixDirectory] = {}
+        self._guid_ns = upgrade_code(ctx)
+        self._defines = {
+            "APP_NAME": ctx.config.app.name,
+            "APP_VERSION": ctx.config.app.version,
+            "APP_PUBLISHER": ctx.config.app.publisher,
+            "APP_DESCRIPTION": ctx.config.app.description,
+        }
+        self.reg_key = self.text(
+            ctx.config.install.registry_key
+            or f"Software\\{ctx.config.app.publisher}\\{ctx.config.app.name}"
+        )
+        # Install path key (lower-case) -> (feature, component XML); the
+        # last source for a path wins, as with makensis overwriting.
+        self._files: Dict[str, Tuple[str, str]] = {}
+
+    # -- text helpers ----------------------------------------------------
+
+    def text(self, value: str) -> str:
+        """Resolve *value* for WiX: variables, NSIS-style defines, ``[DIR]\\`` joins."""
+        value = self.ctx.resolve(value)
+        value = _DEFINE_RE.sub(lambda m: self._defines.get(m.group(1), m.group(0)), value)
+        return value.replace("]\\", "]")
+
+    def location(self, value: str) -> Optional[Tuple[str, List[str]]]:
+        """Split a resolved path into ``(root property, [segments])``."""
+        match = _LOCATION_RE.match(self.text(value))
+        if match is None or (match.group(1) != "INSTALLDIR" and match.group(1) not in STANDARD_DIRECTORIES):
+            return None
+        return match.group(1), [s for s in re.split(r"[\\/]", match.group(2)) if s]
+
+    # -- directories -----------------------------------------------------
+
+    def directory(self, root: str, segments: List[str]) -> WixDirectory:
+        key = root.lower()
+        node = self._dirs.get(key)
+        if node is None:
+            node = self.layout.standard.setdefault(root, WixDirectory(root, ""))
+            self._dirs[key] = node
+        for segment in segments:
+            key = f"{key}\\{segment.lower()}"
+            child = self._dirs.get(key)
+            if child is None:
+                child = WixDirectory(f"d{_digest(key)}", segment)
+                node.children.append(child)
+                self._dirs[key] = child
+            node = child
+        return node
+
+    def install_dir(self) -> None:
+        install = self.ctx.config.install
+        parsed = self.location(install.install_dir)
+        if parsed is None or parsed[0] == "INSTALLDIR":
+            self.layout.install_dir_override = self.text(install.install_dir)
+            parsed = ("ProgramFiles64Folder", [])
+        root, segments = parsed
+        if not segments:
+            segments = [self.ctx.config.app.name]
+        node = self.directory(root, segments)
+        node.id = "INSTALLDIR"
+        self._dirs["installdir"] = node
+        self.layout.per_user = root in _PER_USER_ROOTS
+
+    # -- components ------------------------------------------------------
+
+    def add(self, feature: str, lines: List[str]) -> None:
+        if lines:
+            self.layout.components.setdefault(feature, []).extend(lines)
+
+    def note(self, feature: str, line: str) -> None:
+        self.layout.notes.setdefault(feature, []).append(line)
+
+    def component(self, key: str, directory: str, body: List[str]) -> List[str]:
+        guid = str(uuid.uuid5(self._guid_ns, key)).upper()
+        return [
+            f'      <Component Id="c{_digest(key)}" Directory="{directory}" Guid="{{{guid}}}">',
+            *body,
+            "      </Component>",
+        ]
+
+    def keypath_value(self, name: str) -> str:
+        # Components without a file need a registry key path.
+        return (
+            f'        <RegistryValue Root="HKMU" Key="{xml_attr(self.reg_key)}" '
+            f'Name="{xml_attr(name)}" Type="integer" Value="1" KeyPath="yes" />'
+        )
+
+    def file_ops(self, feature: str, ops: List[Op]) -> None:
+        dest = "$INSTDIR"
+        for op in ops:
+            if isinstance(op, SetOutPath):
+                dest = op.path
+            elif isinstance(op, CopyFile):
+                self.copy(feature, dest, op)
+            elif isinstance(op, Download):
+                self.note(feature, unsupported(f"download {op.url} -> {op.destination}"))
+
+    def copy(self, feature: str, dest: str, op: CopyFile) -> None:
+        parsed = self.location(dest)
+        if parsed is None:
+            self.note(feature, unsupported(f"destination {dest} for {op.source}"))
+            return
+        root, segments = parsed
+        matches = self.ctx.payload.expand(op.source, op.recursive)
+        if matches:
+            # Every match path ends with its install-relative path; what
+            # precedes it is shared and converted to a script path once.
+            rel, first = matches[0]
+            source_base = self.ctx.relative_to_output(first.path[:-len(rel)] or ".")
+            names = [rel for rel, _ in matches]
+        else:
+            base, pattern, _ = split_source(op.source, op.recursive)
+            if pattern or self.ctx.exists(self.ctx.resolve_path(base)) or not os.path.basename(base):
+                self.note(feature, f"<!-- No files match {xml_attr(op.source)} -->")
+                return
+            # Missing plain file: reference it anyway so the WiX build
+            # reports it, like makensis does for File.
+            source_base, _, name = base.replace("/", "\\").rpartition("\\")
+            names = [name]
+
+        dir_cache: Dict[str, WixDirectory] = {}
+        root_key = "\\".join([root, *segments]).lower()
+        for rel in names:
+            rel_dir, _, filename = rel.rpartition("/")
+            directory = dir_cache.get(rel_dir)
+            if directory is None:
+                directory = self.directory(root, segments + (rel_dir.split("/") if rel_dir else []))
+                dir_cache[rel_dir] = directory
+            key = f"{root_key}\\{rel.replace('/', chr(92)).lower()}"
+            source = rel.replace("/", "\\")
+            if source_base and source_base != ".":
+                source = f"{source_base}\\{source}"
+            lines = self.component(key, directory.id, [
+                f'        <File Id="f{_digest(key)}" Source="{xml_attr(source)}" KeyPath="yes" />',
+            ])
+            self._files.pop(key, None)
+            self._files[key] = (feature, "\n".join(lines))
+
+    def registry(self, feature: str, key: str, ops: List[WriteRegistry]) -> None:
+        by_view: Dict[Optional[str], List[WriteRegistry]] = {}
+        for op in ops:
+            by_view.setdefault(op.view, []).append(op)
+        for view, values in by_view.items():
+            body = []
+            for i, op in enumerate(values):
+                name = f' Name="{xml_attr(op.name)}"' if op.name else ""
+                keypath = ' KeyPath="yes"' if i == 0 else ""
+                body.append(
+                    f'        <RegistryValue Root="{op.hive}" Key="{xml_attr(self.text(op.key))}"{name} '
+                    f'Type="{_REG_TYPES.get(op.type, "string")}" Value="{xml_attr(self.text(op.value))}"{keypath} />'
+                )
+            component = self.component(f"{key}\\{view or 'default'}", "INSTALLDIR", body)
+            if view is not None:
+                component[0] = component[0][:-1] + f' Bitness="always{view}">'
+            self.add(feature, component)
+
+    def environment(self, feature: str, ops: List[UpdateEnvVar]) -> None:
+        if not ops:
+            return
+        keep = {env.name: not env.remove_on_uninstall for env in self.ctx.config.install.env_vars}
+        body = [self.keypath_value("Environment")]
+        ids: Set[str] = set()
+        for i, op in enumerate(ops):
+            # Several entries may append to one variable (PATH): the value
+            # keeps their Ids apart, the index only repeats of one value.
+            key = "\\".join([op.scope, op.name, op.value])
+            env_id = f"e{_digest(key)}"
+            if env_id in ids:
+                env_id = f"e{_digest(f'{key}#{i}')}"
+            ids.add(env_id)
+            body.append(
+                f'        <Environment Id="{env_id}" Name="{xml_attr(op.name)}" '
+                f'Value="{xml_attr(self.text(op.value))}" Action="set" Part="{"last" if op.append else "all"}" '
+                f'System="{"yes" if op.hive == "HKLM" else "no"}" Permanent="{"yes" if keep.get(op.name) else "no"}" />'
+            )
+        self.add(feature, self.component("environment", "INSTALLDIR", body))
+
+    def shortcuts(self, feature: str, steps: List[Step]) -> None:
+        for step in steps:
+            body = [self.keypath_value(step.title)]
+            for op in step.ops:
+                if isinstance(op, CreateDirectory):
+                    parsed = self.location(op.path)
+                    if parsed is None or not parsed[1]:
+                        continue
+                    directory = self.directory(*parsed)
+                    body.append(
+                        f'        <RemoveFolder Id="r{directory.id[1:]}" Directory="{directory.id}" On="uninstall" />'
+                    )
+                elif isinstance(op, CreateShortcut):
+                    body.extend(self.shortcut(op))
+            self.add(feature, self.component(f"shortcut\\{step.title}", "INSTALLDIR", body))
+
+    def shortcut(self, op: CreateShortcut) -> List[str]:
+        parsed = self.location(op.link)
+        if parsed is None or not parsed[1]:
+            return ["  " + unsupported(f"shortcut {op.link}")]
+        root, segments = parsed
+        directory = self.directory(root, segments[:-1])
+        name = segments[-1]
+        if name.lower().endswith(".lnk"):
+            name = name[:-4]
+        target = self.text(op.target)
+        attrs = f'Name="{xml_attr(name)}"'
+        if target == _NSIS_UNINSTALLER:
+            attrs += ' Target="[SystemFolder]msiexec.exe" Arguments="/x [ProductCode]"'
+        else:
+            attrs += f' Target="{xml_attr(target)}"'
+            if target.startswith("[INSTALLDIR]"):
+                attrs += ' WorkingDirectory="INSTALLDIR"'
+        key = "\\".join([root, *segments]).lower()
+        return [f'        <Shortcut Id="s{_digest(key)}" Directory="{directory.id}" {attrs} />']
+
+    def finish(self) -> WixLayout:
+        for feature, xml in self._files.values():
+            self.layout.components.setdefault(feature, []).append(xml)
+        self.layout.file_count = len(self._files)
+        return self.layout
+
+
+def build_layout(ctx: BuildContext) -> WixLayout:
+    """Harvest the payload and lay out directories and components."""
+    plan = ctx.plan
+    builder = _LayoutBuilder(ctx)
+    builder.install_dir()
+    builder.file_ops(MAIN_FEATURE, plan.files)
+    builder.registry(MAIN_FEATURE, "registry", plan.registry)
+    builder.environment(MAIN_FEATURE, plan.env_vars)
+    builder.shortcuts(MAIN_FEATURE, plan.shortcuts)
+    for step in plan.associations:
+        registry = [op for op in step.ops if isinstance(op, WriteRegistry)]
+        builder.registry(MAIN_FEATURE, f"association\\{step.title}", registry)
+    for component in iter_components(plan.components):
+        builder.file_ops(component.section_id, component.ops)
+        for exec_op in component.post_install:
+            builder.note(component.section_id, unsupported(f"post_install {exec_op.command}"))
+    return builder.finish()
+
+
+# -----------------------------------------------------------------------
+# Rendering
+# -----------------------------------------------------------------------
+
+def generate_package(ctx: BuildContext, layout: WixLayout) -> List[str]:
+    """XML prolog and the ``Package`` element with upgrade and media settings."""
+    app = ctx.config.app
+    scope = "perUser" if layout.per_user else "perMachine"
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        "<!-- WiX source generated by xswl-YPack -->",
+        "<!-- Do not edit manually — regenerate from YAML configuration -->",
+        '<Wix xmlns="http://wixtoolset.org/schemas/v4/wxs">',
+        f'  <Package Name="{xml_attr(app.name)}" Manufacturer="{xml_attr(app.publisher)}" '
+        f'Version="{msi_version(app.version)}" UpgradeCode="{{{str(upgrade_code(ctx)).upper()}}}" '
+        f'Scope="{scope}" Compressed="yes">',
+    ]
+    if app.description:
+        lines.append(f'    <SummaryInformation Description="{xml_attr(app.description)}" />')
+    lines.extend([
+        '    <MajorUpgrade DowngradeErrorMessage="A newer version of [ProductName] is already installed." />',
+        '    <MediaTemplate EmbedCab="yes" />',
+    ])
+    if app.install_icon:
+        icon = ctx.relative_to_output(app.install_icon)
+        lines.extend([
+            f'    <Icon Id="AppIcon.ico" SourceFile="{xml_attr(icon)}" />',
+            '    <Property Id="ARPPRODUCTICON" Value="AppIcon.ico" />',
+        ])
+    if layout.install_dir_override:
+        lines.append(f'    <SetDirectory Id="INSTALLDIR" Value="{xml_attr(layout.install_dir_override)}" />')
+    lines.append("")
+    return lines
+
+
+def generate_directories(ctx: BuildContext, layout: WixLayout) -> List[str]:
+    """``StandardDirectory`` roots with nested ``Directory`` elements."""
+    lines: List[str] = []
+    for root in sorted(layout.standard):
+        if not layout.standard[root].children:
+            lines.append(f'    <StandardDirectory Id="{root}" />')
+            continue
+        lines.append(f'    <StandardDirectory Id="{root}">')
+        # None closes a directory; children are pushed reversed so they
+        # come out in creation order.
+        stack: List[Tuple[Optional[WixDirectory], int]] = [
+            (child, 3) for child in reversed(layout.standard[root].children)
+        ]
+        while stack:
+            node, depth = stack.pop()
+            indent = "  " * depth
+            if node is None:
+                lines.append(f"{indent}</Directory>")
+                continue
+            attrs = f'Id="{node.id}" Name="{xml_attr(node.name)}"'
+            if not node.children:
+                lines.append(f"{indent}<Directory {attrs} />")
+                continue
+            lines.append(f"{indent}<Directory {attrs}>")
+            stack.append((None, depth))
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        lines.append("    </StandardDirectory>")
+    lines.append("")
+    return lines
+
+
+def generate_components(ctx: BuildContext, layout: WixLayout) -> List[str]:
+    """One ``ComponentGroup`` per feature that has components.
+
+    A feature whose only content is notes gets no (empty) group; its
+    notes are kept as top-level comments.
+    """
+    lines: List[str] = []
+    for feature in dict.fromkeys([*layout.components, *layout.notes]):
+        notes = layout.notes.get(feature, [])
+        if feature not in layout.components:
+            lines.extend(f"    {note}" for note in notes)
+            continue
+        lines.append(f'    <ComponentGroup Id="CG_{feature}">')
+        lines.extend(f"      {note}" for note in notes)
+        lines.extend(layout.components[feature])
+        lines.append("    </ComponentGroup>")
+    lines.append("")
+    return lines
+
+
+def generate_features(ctx: BuildContext, layout: WixLayout) -> List[str]:
+    """The main feature plus one (nested) feature per package."""
+    app = ctx.config.app
+    lines = [
+        f'    <Feature Id="{MAIN_FEATURE}" Title="{xml_attr(app.name)}" Level="1" AllowAbsent="no">',
+    ]
+    if MAIN_FEATURE in layout.components:
+        lines.append(f'      <ComponentGroupRef Id="CG_{MAIN_FEATURE}" />')
+    lines.append("    </Feature>")
+
+    groups = 0
+    stack: List[Tuple[Optional[ComponentNode], int]] = [
+        (node, 2) for node in reversed(ctx.plan.components)
+    ]
+    while stack:
+        node, depth = stack.pop()
+        indent = "  " * depth
+        if node is None:
+            lines.append(f"{indent}</Feature>")
+            continue
+        if isinstance(node, ComponentGroup):
+            groups += 1
+            lines.append(f'{indent}<Feature Id="GRP_{groups}" Title="{xml_attr(node.name)}" Level="1">')
+            stack.append((None, depth))
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+            continue
+        attrs = f'Id="{node.section_id}" Title="{xml_attr(node.name)}"'
+        if node.description:
+            attrs += f' Description="{xml_attr(node.description)}"'
+        # Level 2 is above the default INSTALLLEVEL: off unless selected.
+        attrs += ' Level="2"' if node.optional and not node.default else ' Level="1"'
+        if not node.optional:
+            attrs += ' AllowAbsent="no"'
+        if node.section_id in layout.components:
+            lines.extend([
+                f"{indent}<Feature {attrs}>",
+                f'{indent}  <ComponentGroupRef Id="CG_{node.section_id}" />',
+                f"{indent}</Feature>",
+            ])
+        else:
+            lines.append(f"{indent}<Feature {attrs} />")
+    lines.extend([
+        "  </Package>",
+        "</Wix>",
+    ])
+    return lines
@@ -8,7 +8,11 @@ Handles resolution of:
 """
 
 import re
-from typing import Any, Dict, Set, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+#: Phase-1 results shared between resolvers of different target tools:
+#: ``text -> (text with ${...} resolved, [(ref_path, value), ...])``.
+ReferenceCache = Dict[str, Tuple[str, List[Tuple[str, Any]]]]
 
 
 class CircularReferenceError(Exception):
@@ -21,16 +25,26 @@ class VariableResolver:
     
     MAX_DEPTH = 10  # Maximum recursion depth to prevent infinite loops
     
-    def __init__(self, config_dict: Dict[str, Any], variable_registry):
+    def __init__(self, config_dict: Dict[str, Any], variable_registry,
+                 reference_cache: Optional[ReferenceCache] = None):
         """Initialize the resolver.
         
         Args:
             config_dict: The full configuration dictionary (parsed YAML)
             variable_registry: VariableRegistry instance for built-in variable mapping
+            reference_cache: Optional cache of resolved ``${...}`` references.
+                Config references do not depend on the target tool, so
+                resolvers for several tools over the same config can share it
+                and only translate ``$VAR`` built-ins themselves.
         """
         self.config = config_dict
         self.registry = variable_registry
+        self.reference_cache = reference_cache
         self._resolving_stack: Set[str] = set()
+        self._lookups: Optional[List[Tuple[str, Any]]] = None
+        # Optional callback ``(ref_path, value)`` invoked for every config
+        # reference looked up; used to record what a generator depended on.
+        self.on_lookup: Optional[Callable[[str, Any], None]] = None
     
     def resolve(self, text: str, depth: int = 0) -> str:
         """Resolve all variable references in text.
@@ -71,6 +85,9 @@ class VariableResolver:
     def _resolve_config_references(self, text: str, depth: int) -> str:
         """Resolve ${path.to.value} style references.
         
+        Top-level results are memoised in :attr:`reference_cache` (when
+        set); a cache hit replays the lookups to :attr:`on_lookup`.
+
         Args:
             text: Text containing ${...} references
             depth: Current recursion depth
@@ -78,6 +95,29 @@ class VariableResolver:
         Returns:
             Text with ${...} references resolved
         """
+        if depth or self.reference_cache is None:
+            return self._substitute_references(text, depth)
+        cached = self.reference_cache.get(text)
+        if cached is not None:
+            if self.on_lookup is not None:
+                for ref_path, value in cached[1]:
+                    self.on_lookup(ref_path, value)
+            return cached[0]
+        self._lookups = []
+        try:
+            result = self._substitute_references(text, depth)
+            self.reference_cache[text] = (result, self._lookups)
+        finally:
+            self._lookups = None
+        return result
+
+    def _substitute_references(self, text: str, depth: int) -> str:
+        if depth > self.MAX_DEPTH:
+            raise RecursionError(
+                f"Variable resolution exceeded max depth ({self.MAX_DEPTH}). "
+                "Possible circular reference or overly complex nesting."
+            )
+
         pattern = r'\$\{([^}]+)\}'
         
         def replace_match(match):
@@ -95,13 +135,17 @@ class VariableResolver:
             try:
                 # Get value from config
                 value = self._get_value_by_path(ref_path)
+                if self._lookups is not None:
+                    self._lookups.append((ref_path, value))
+                if self.on_lookup is not None:
+                    self.on_lookup(ref_path, value)
                 if value is None:
                     # Reference not found - keep original
                     return match.group(0)
                 
-                # Recursively resolve (value might contain more references)
-                resolved = self.resolve(str(value), depth + 1)
-                return resolved
+                # Recursively resolve (value might contain more references);
+                # built-ins are translated once, over the whole result.
+                return self._resolve_config_references(str(value), depth + 1)
             finally:
                 # Remove from stack
                 self._resolving_stack.discard(ref_path)
@@ -202,12 +246,14 @@ class VariableResolver:
         return unknown
 
 
-def create_resolver(config_dict: Dict[str, Any], target_tool: str = "nsis"):
+def create_resolver(config_dict: Dict[str, Any], target_tool: str = "nsis",
+                    reference_cache: Optional[ReferenceCache] = None):
     """Factory function to create a VariableResolver.
     
     Args:
         config_dict: Parsed YAML configuration dictionary
         target_tool: Target installer tool ('nsis', 'wix', 'inno')
+        reference_cache: Optional ``${...}`` cache shared with other resolvers
         
     Returns:
         Configured VariableResolver instance
@@ -223,4 +269,4 @@ def create_resolver(config_dict: Dict[str, Any], target_tool: str = "nsis"):
             if isinstance(value, str):
                 registry.add_custom_variable(name, value)
     
-    return VariableResolver(config_dict, registry)
+    return VariableResolver(config_dict, registry, reference_cache)
@@ -80,6 +80,18 @@ _SHORTCUT = {
     ],
 }
 
+_PATTERNS = {"oneOf": [_STRING, {"type": "array", "items": _STRING}]}
+_SIZE = {"oneOf": [_INT, _STRING]}
+
+# Payload filter keys, accepted globally (``filters``), on file entries
+# and on packages.
+_FILTER_PROPERTIES = {
+    "exclude": _PATTERNS,
+    "include": _PATTERNS,
+    "min_size": _SIZE,
+    "max_size": _SIZE,
+}
+
 _FILE_ENTRY = {
     "oneOf": [
         _STRING,
@@ -93,6 +105,7 @@ _FILE_ENTRY = {
                 "checksum_type": _STRING,
                 "checksum_value": _STRING,
                 "decompress": _BOOL,
+                **_FILTER_PROPERTIES,
             },
             "required": ["source"],
         },
@@ -192,6 +205,7 @@ CONFIG_SCHEMA: Dict[str, Any] = {
         "languages": {"type": "array", "items": _STRING},
         "variables": {"type": "object"},
         "custom_includes": {"type": "object"},
+        "filters": {"type": "object", "properties": _FILTER_PROPERTIES},
     },
 }
 